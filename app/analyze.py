@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from models.diagram_model import load_diagram_model
+from utils.diagram_io import find_diagram_files, REPORT_SUFFIX
+from models.threat_model import create_threat_model_from_shapes, SeverityLevel
+from errorLogging import getLogger
+
+# Headless batch analyzer for CI. Runs the STRIDE analysis on every diagram
+# under the given paths and writes a <diagram>.json.threats.json report for each,
+# without starting the GUI. Diagrams are spread over a process pool.
+#
+#   python analyze.py diagrams/ -o reports/ --fail-on High
+
+logger = getLogger("analyze")
+
+SEVERITY_ORDER = [level.value for level in SeverityLevel] # Low .. Critical
+
+
+def report_path_for(path, output_dir, base_dir):
+    # the diagram's own extension stays in the name, d.json and d.sadb mustn't share a report
+    if output_dir is None:
+        return path + REPORT_SUFFIX
+    relative = os.path.relpath(os.path.abspath(path), base_dir)
+    return os.path.join(output_dir, relative + REPORT_SUFFIX)
+
+
+def analyze_diagram(job):
+    """Runs in a worker process; returns a plain summary dict (never raises)"""
+    path, report_path = job
+    started = time.perf_counter()
+    result = {"diagram": path, "report": report_path}
+    try:
+        shapes, connectors = load_diagram_model(path)
+        tm = create_threat_model_from_shapes(shapes, connectors, name=os.path.splitext(os.path.basename(path))[0])
+        if tm.run_threat_analysis() is None:
+            raise RuntimeError("threat analysis failed, see log")
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        tm.export_report(report_path)
+        summary = tm.get_threat_summary()
+        result.update(ok=True, total=summary["total"], by_severity=summary["by_severity"])
+    except Exception as e:
+        result.update(ok=False, error=str(e))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_batch(diagrams, output_dir=None, jobs=None):
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in diagrams]) if diagrams else "."
+    work = [(path, report_path_for(path, output_dir, base_dir)) for path in diagrams]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(work) == 1:
+        return [analyze_diagram(job) for job in work]
+    # lots of small diagrams: hand them out in chunks so pickling/IPC doesn't dominate
+    chunksize = max(1, len(work) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+        return list(pool.map(analyze_diagram, work, chunksize=chunksize))
+
+
+def severity_at_least(result, threshold):
+    levels = SEVERITY_ORDER[SEVERITY_ORDER.index(threshold):]
+    return sum(result.get("by_severity", {}).get(level, 0) for level in levels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run STRIDE threat analysis on saved SADB diagrams without the GUI.")
+    parser.add_argument("paths", nargs="+", help="diagram files or directories to search")
+    parser.add_argument("-o", "--output-dir", help="where to write reports (default: next to each diagram)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--summary", help="also write the per-diagram results as one json file")
+    parser.add_argument("--fail-on", choices=SEVERITY_ORDER,
+                        help="exit with status 2 if any diagram has threats of this severity or worse")
+    args = parser.parse_args(argv)
+
+    diagrams = find_diagram_files(args.paths, exclude=(REPORT_SUFFIX,))
+    if not diagrams:
+        print("No diagrams found", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    results = run_batch(diagrams, args.output_dir, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in results if not r["ok"]]
+    for r in results:
+        if r["ok"]:
+            print(f"{r['total']:6d} threats  {r['diagram']}")
+        else:
+            print(f" ERROR         {r['diagram']}: {r['error']}")
+    print(f"Analyzed {len(results) - len(failed)}/{len(results)} diagrams in {elapsed:.2f}s")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if failed:
+        return 1
+    if args.fail_on and any(severity_at_least(r, args.fail_on) for r in results):
+        print(f"Threats at or above {args.fail_on} severity found", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import os
+import random
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QColor
+
+# Frame time benchmark for the item render cache modes. Builds a synthetic
+# diagram (or loads one), then times forced repaints while panning across it
+# and zooming in and out, once per cache mode.
+#
+#   python benchmark_render.py --shapes 5000
+#   QT_QPA_PLATFORM=offscreen python benchmark_render.py --diagram big.json
+
+SHAPE_TYPES = [("rect", 100, 60), ("circle", 60, 60), ("diamond", 80, 80), ("hexagon", 90, 90),
+               ("cylinder", 100, 80), ("star", 90, 90), ("cloud", 120, 80), ("arrow", 100, 60)]
+COLORS = [QColor(135, 206, 250), QColor(144, 238, 144), QColor(255, 182, 193), QColor(255, 215, 0)]
+
+
+def build_synthetic(editor, count, seed=1):
+    from models.shape_item import ShapeItem
+    rng = random.Random(seed)
+    columns = max(1, int(count ** 0.5))
+    shapes = []
+    for i in range(count):
+        item_type, w, h = SHAPE_TYPES[i % len(SHAPE_TYPES)]
+        shape = ShapeItem(item_type, (i % columns) * 160, (i // columns) * 130, w, h)
+        shape.color = COLORS[i % len(COLORS)]
+        if i % 3 == 0:
+            shape.label = f"Service {i}"
+        editor.scene.addItem(shape)
+        editor.shapes.append(shape)
+        shapes.append(shape)
+    for i in range(1, count):
+        # a neighbour link for most shapes, plus the odd long one across the diagram
+        other = shapes[i - 1] if i % columns else shapes[i - columns]
+        if rng.random() < 0.1:
+            other = rng.choice(shapes)
+        if other is shapes[i]:
+            continue
+        conn = editor.connector_manager.create_connector(other, shapes[i])
+        if i % 5 == 0:
+            conn.metadata['label'] = "HTTPS"
+            conn.refresh_decorations()
+        editor.connectors.append(conn)
+
+
+def load_file(app, editor, path):
+    editor.file_manager.load_diagram_file(path)
+    while editor.file_manager.loader is not None and editor.file_manager.loader.active:
+        app.processEvents()
+
+
+def frame_stats(times):
+    times = sorted(times)
+    return sum(times) / len(times) * 1000, times[int(len(times) * 0.95) - 1] * 1000
+
+
+def time_frames(app, view, steps):
+    viewport = view.viewport()
+    times = []
+    for step in steps:
+        step()
+        app.processEvents()
+        started = time.perf_counter()
+        viewport.repaint() # synchronous, so this is the whole frame
+        times.append(time.perf_counter() - started)
+    return frame_stats(times)
+
+
+def pan_steps(view, frames):
+    bar = view.horizontalScrollBar()
+    span = max(1, bar.maximum() - bar.minimum())
+    step = max(1, span // frames)
+    bar.setValue(bar.minimum())
+    return [lambda: bar.setValue(bar.value() + step)] * frames
+
+
+def zoom_steps(view, frames):
+    half = frames // 2
+    return [lambda: view.scale(0.9, 0.9)] * half + [lambda: view.scale(1 / 0.9, 1 / 0.9)] * (frames - half)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare pan/zoom frame times for each item cache mode.")
+    parser.add_argument("--shapes", type=int, default=5000, help="synthetic diagram size (default: 5000)")
+    parser.add_argument("--diagram", help="benchmark a saved diagram instead of a synthetic one")
+    parser.add_argument("--frames", type=int, default=60, help="frames per pan/zoom run")
+    parser.add_argument("--modes", nargs="+", default=["off", "item", "device"])
+    parser.add_argument("--zoom", type=float, default=0.6, help="starting view scale")
+    args = parser.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    from ui.diagram_editor import DiagramEditor
+    editor = DiagramEditor()
+    editor.resize(1280, 900)
+    editor.show()
+    editor.file_manager.autosave.enabled = False # leave any real crash recovery file alone
+    editor.file_manager.autosave.idle_timer.stop()
+    started = time.perf_counter()
+    if args.diagram:
+        load_file(app, editor, args.diagram)
+    else:
+        build_synthetic(editor, args.shapes)
+    editor.update_scene_rect() # normally on the next event loop pass
+    print(f"{len(editor.shapes)} shapes, {len(editor.connectors)} connectors ready in {time.perf_counter() - started:.2f}s")
+
+    view = editor.view
+    print(f"{'mode':8s} {'pan avg':>9s} {'pan p95':>9s} {'zoom avg':>9s} {'zoom p95':>9s}")
+    for mode in args.modes:
+        editor.set_item_cache_mode(mode)
+        view.resetTransform()
+        view.scale(args.zoom, args.zoom)
+        view.centerOn(editor.scene.sceneRect().topLeft())
+        view.viewport().repaint() # warm up, fills the caches
+        pan_avg, pan_p95 = time_frames(app, view, pan_steps(view, args.frames))
+        zoom_avg, zoom_p95 = time_frames(app, view, zoom_steps(view, args.frames))
+        print(f"{mode:8s} {pan_avg:7.1f}ms {pan_p95:7.1f}ms {zoom_avg:7.1f}ms {zoom_p95:7.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,4 +15,60 @@ BACKGROUND_COLOR = QColor(0, 0, 0)
 GRID_COLOR = QColor(40, 40, 40)
 DEFAULT_SHAPE_COLOR = QColor(Qt.GlobalColor.lightGray)
 CONNECTOR_COLOR = QColor(Qt.GlobalColor.white)
-PENDING_COLOR = QColor(Qt.GlobalColor.red)
\ No newline at end of file
+PENDING_COLOR = QColor(Qt.GlobalColor.red)
+#Loading
+LOAD_CHUNK_SIZE = 500 # records handed from the parse thread per chunk
+LOAD_BATCH_MS = 30 # GUI time spent building items before yielding to the event loop
+#Saving
+JOURNAL_COMPACT_RECORDS = 2000 # journal records before the next save rewrites a full snapshot
+#Autosave
+AUTOSAVE_FILE = os.path.join(SAVE_DIR, ".autosave.json") # crash recovery snapshot, edits go to its .journal
+AUTOSAVE_INTERVAL_MS = 30000 # how long an edit may sit before it is autosaved
+AUTOSAVE_MIN_INTERVAL_MS = 5000 # earliest autosave after a burst of edits
+AUTOSAVE_EDIT_THRESHOLD = 200 # edited items that bring the next autosave forward
+AUTOSAVE_BATCH_MS = 8 # GUI time spent serializing before yielding to the event loop
+AUTOSAVE_MAX_RECORDS = 2000 # records written per autosave, the rest wait for the next one
+AUTOSAVE_RETRY_MS = 1000 # retry delay while the user is dragging or a write is running
+#Compressed archives (.sadz)
+ARCHIVE_CODEC = "zlib" # "zlib" or "lzma" (smaller, slower to write)
+ARCHIVE_LEVEL = 6 # zlib level / lzma preset
+#Diagram repository
+STORE_PATH = os.path.join(SAVE_DIR, "diagrams.db") # sqlite database for stored diagrams
+#Spatial index
+SPATIAL_INDEX_CELL_SIZE = 200 # scene units per grid cell, a few typical shapes across
+#Rendering
+VIEWPORT_UPDATE_MODE = "minimal" # "minimal", "bounding-rect", "smart" or "full"
+ITEM_CACHE_MODE = "off" # "off", "item" (cached in item coordinates) or "device" (cached at screen resolution)
+ITEM_CACHE_LIMIT_KB = 131072 # pixmap cache size while item caching is on, Qt's 10MB default thrashes on big diagrams
+OUTLINE_CACHE_SIZE = 512 # distinct (type, width, height) outlines kept for reuse
+LOD_DETAIL = 0.5 # zoom below which labels, handles, connection points and flow arrows are skipped
+LOD_SIMPLE = 0.2 # zoom below which shapes are flat filled rects and connectors plain lines
+LABEL_POINT_SIZE = 9 # shape label font
+LABEL_PADDING = 4 # space kept between a label and its shape's edge
+#Canvas
+SCENE_MIN_RECT = (-1000, -750, 2000, 1500) # x, y, w, h the scene never shrinks below
+SCENE_MARGIN = 1000 # room to scroll past the outermost shapes
+SCENE_GROW_STEP = 500 # scene rect edges snap to this, so small moves don't resize it (Qt rebuilds its index on every resize)
+BSP_TREE_DEPTH = 0 # QGraphicsScene BSP index depth, 0 lets Qt pick from the item count
+CONTENT_MARGIN = 50 # around the shapes for fit/export, curved connectors bow up to 50 past them
+#Connector routing
+ROUTER_MARGIN = 10 # clearance elbow routes keep from shapes
+ROUTER_CORRIDOR = 100 # how far past its two shapes an elbow route may detour (4x on a second try)
+ROUTER_BEND_PENALTY = 40 # extra length a bend costs, higher means fewer bends and longer detours
+ROUTER_MAX_OBSTACLES = 40 # shapes in a corridor past which the route is a plain elbow
+ROUTER_MAX_STEPS = 800 # states an elbow's route search may visit before it gives up, a few ms
+#Minimap
+MINIMAP_UPDATE_MS = 200 # changed regions are repainted into the minimap at most this often
+MINIMAP_MAX_DIRTY_RECTS = 32 # more changed regions than this are repainted as one rect around them
+MINIMAP_VIEWPORT_COLOR = QColor(255, 200, 0) # frame showing what the view can see
+#Shape types
+SHAPE_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shape_packs") # extra shape types, see models/shape_types.py
+#Export
+EXPORT_PADDING = 20 # scene units around the shapes in exported images
+EXPORT_SCALE = 1.0 # raster pixels per scene unit at 96 dpi
+EXPORT_DPI = 96 # raster resolution, 192 doubles the pixels and prints at the same size
+EXPORT_TILE_PIXELS = 4194304 # pixels per rendered band (12MB as RGB), bounds memory on huge exports
+EXPORT_THREADS = os.cpu_count() or 1 # band rendering and compression workers
+EXPORT_PNG_LEVEL = 6 # zlib level for PNG bands
+EXPORT_PDF_RESOLUTION = 1200 # PDF device resolution, same as a high resolution QPrinter
+EXPORT_FORMATS = ("png", "svg", "pdf") # what a batch export writes for each diagram by default
@@ -4,7 +4,7 @@ import traceback
 import functools
 from pathlib import Path
 from datetime import datetime
-from PyQt6.QtWidgets import QMessageBox
+from PyQt6.QtWidgets import QApplication, QMessageBox
 import os
 
 class PygramLogger: # logging shit!
@@ -67,6 +67,9 @@ def logException(logger, exception, context=""):
     logger.error(f"Trackeback:\n{traceback.format_exc()}")
 
 def showErrorDialog(title, message, details=None):
+    if QApplication.instance() is None: # headless (cli/worker process), no widgets allowed
+        print(f"{title} {message}", file=sys.stderr)
+        return
     try:
         msg_box = QMessageBox()
         msg_box.setIcon(QMessageBox.Icon.Critical)
@@ -216,11 +219,11 @@ class PerformanceMonitor:
         self.operationName = operationName
         self.logger = logger or getLogger("performance")
         self.startTime = None
-    def enter(self):
+    def __enter__(self):
         self.startTime = datetime.now()
         self.logger.debug(f"Performance monitoring started for: {self.operationName}")
         return self
-    def exit(self, exc_type, exc_val, exc_tb):
+    def __exit__(self, exc_type, exc_val, exc_tb):
         endTime = datetime.now()
         duration = (endTime - self.startTime).total_seconds()
         if duration > 1.0:
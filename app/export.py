@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen") # no display needed
+from PyQt6.QtWidgets import QApplication
+from config import EXPORT_DPI, EXPORT_SCALE, EXPORT_THREADS, EXPORT_FORMATS
+from utils.diagram_io import find_diagram_files, REPORT_SUFFIX
+from utils.batch_export import ExportJob, run_export_job
+
+# Headless batch export. Writes every diagram under the given paths to each
+# format as <diagram file>.<format> (d.json.png), e.g. for release reviews:
+#
+#   python export.py diagrams/ -o exports/ --formats png svg pdf --dpi 192
+
+EXPORT_EXTENSIONS = ("png", "jpg", "svg", "pdf")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export saved SADB diagrams to images and documents without the GUI.")
+    parser.add_argument("paths", nargs="+", help="diagram files or directories to search")
+    parser.add_argument("-o", "--output-dir", help="where to write the exports (default: next to each diagram)")
+    parser.add_argument("-f", "--formats", nargs="+", choices=EXPORT_EXTENSIONS, default=list(EXPORT_FORMATS))
+    parser.add_argument("--dpi", type=int, default=EXPORT_DPI, help=f"PNG/JPEG resolution (default: {EXPORT_DPI})")
+    parser.add_argument("--scale", type=float, default=EXPORT_SCALE, help="PNG/JPEG size relative to the diagram")
+    parser.add_argument("-j", "--jobs", type=int, default=EXPORT_THREADS, help="writer threads (default: all cores)")
+    parser.add_argument("--summary", help="also write the per-diagram results as one json file")
+    args = parser.parse_args(argv)
+
+    diagrams = find_diagram_files(args.paths, exclude=(REPORT_SUFFIX,))
+    if not diagrams:
+        print("No diagrams found", file=sys.stderr)
+        return 1
+    app = QApplication(sys.argv[:1])
+    job = ExportJob(diagrams, args.formats, args.output_dir, args.scale, args.dpi, args.jobs)
+    started = time.perf_counter()
+    results = run_export_job(job)
+    elapsed = time.perf_counter() - started
+
+    failed = [r for r in results if not r["ok"]]
+    for r in results:
+        if r["ok"]:
+            print(f"{len(r['outputs']):3d} files  {r['diagram']}")
+        else:
+            print(f" ERROR     {r['diagram']}: {'; '.join(r['errors'])}")
+    print(f"Exported {len(results) - len(failed)}/{len(results)} diagrams in {elapsed:.2f}s")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
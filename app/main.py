@@ -1,9 +1,23 @@
 import sys
-from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWidgets import QApplication, QMessageBox
 from ui.diagram_editor import DiagramEditor
+from utils.autosave import has_recovery, discard_recovery
 from errorLogging import (getLogger, erorrHandler, FileOperationHandler, gui_safe_execute, safe_execute, PerformanceMonitor, validate_file_path, initialize_error_handling)
 from errorLogging import initialize_error_handling, setup_qt_error_handing
 
+def offer_recovery(window, logger):
+    if not has_recovery():
+        return
+    logger.warning("Found an autosave left by a session that didn't exit cleanly")
+    answer = QMessageBox.question(
+        window, "Recover Diagram",
+        "The last session didn't close properly.\nRecover the autosaved diagram?"
+    )
+    if answer == QMessageBox.StandardButton.Yes:
+        window.file_manager.recover_diagram()
+    else:
+        discard_recovery()
+
 @safe_execute
 def main():
     logger = initialize_error_handling()
@@ -14,6 +28,8 @@ def main():
         with erorrHandler("application setup", Critical=True):
             window = DiagramEditor()
             window.show()
+        with erorrHandler("crash recovery"):
+            offer_recovery(window, logger)
         logger.info("Application GUI initialized successfully")
         result = app.exec()
         logger.info(f"Application exited with code: {result}")
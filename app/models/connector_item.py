@@ -1,8 +1,14 @@
 from PyQt6.QtWidgets import QGraphicsItem,QGraphicsPathItem, QInputDialog
-from PyQt6.QtGui import QPen, QPainter, QPolygonF, QColor, QPainterPath
-from PyQt6.QtCore import Qt, QPointF
-from config import CONNECTOR_COLOR
+from PyQt6.QtGui import QPen, QPainter, QPolygonF, QColor, QPainterPath, QFont, QFontMetricsF
+from PyQt6.QtCore import Qt, QPointF, QTimer
+from config import CONNECTOR_COLOR, LOD_DETAIL, LOD_SIMPLE
+from models.shape_types import CARDINAL_POINTS
+from utils.connector_router import ConnectorRouter
 import math
+import uuid
+
+DECORATION_MARGIN = 10 # data flow arrows (8) and the selected pen reach past the path
+LABEL_POINT_SIZE = 8
 
 class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended, copying drawio bar for bar and just being worse is new best friend
     def __init__(self, start, end, connectorType="line"):
@@ -21,9 +27,18 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
             'frequency': 'As needed'
         }
 
+        self.dirty = True # not saved yet
+        self.element_id = uuid.uuid4().hex
         self.line_width = 2
         self.line_color = QColor(Qt.GlobalColor.white)
         self.selected_color = QColor(Qt.GlobalColor.blue)
+        # decorations, worked out in update_decorations when the path or the
+        # metadata changes so paint only draws them
+        self.label_rect = None # label box plus margin, part of boundingRect
+        self.label_box = None # white box behind the label
+        self.label_text_rect = None
+        self.flow_arrows = [] # data flow indicator polygons
+        self.router = None # routes elbows around shapes, set by the ConnectorManager
 
         self.setPen(QPen(self.line_color, self.line_width))
         self.setFlags(
@@ -52,14 +67,61 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
         if self.connector_type == "line":
             self.create_straight_line(path, start_local, end_local)
         elif self.connector_type == "elbow":
-            self.create_elbow_line(path, start_local, end_local)
+            points = self.route_points()
+            if points:
+                self.create_routed_line(path, points)
+            else:
+                self.create_elbow_line(path, start_local, end_local) # no router, or no way round
         elif self.connector_type == "curved":
             self.create_curved_line(path, start_local, end_local)
         elif self.connector_type == "arrow":
             self.create_arrow_line(path, start_local, end_local)
 
+        self.prepareGeometryChange() # the label moves with the path, before setPath records the old bounds
+        self.update_decorations(path)
         self.setPath(path)
 
+    shared_label_font = None # one for every connector, built on first use once the QApplication is up
+
+    def label_font(self):
+        if ConnectorItem.shared_label_font is None:
+            ConnectorItem.shared_label_font = QFont()
+            ConnectorItem.shared_label_font.setPointSize(LABEL_POINT_SIZE)
+        return ConnectorItem.shared_label_font
+
+    def update_decorations(self, path):
+        # path.length() and pointAtPercent walk the whole curve, do it once here not on every paint
+        length = path.length()
+        self.label_rect = self.label_box = self.label_text_rect = None
+        text = self.metadata.get('label')
+        if text and length > 0:
+            rect = QFontMetricsF(self.label_font()).boundingRect(text)
+            rect.moveCenter(path.pointAtPercent(0.5))
+            self.label_text_rect = rect
+            self.label_box = rect.adjusted(-2, -1, 2, 1)
+            self.label_rect = rect.adjusted(-3, -2, 3, 2)
+
+        self.flow_arrows = []
+        if length < 40:
+            return # sub-40ers stay big buddy
+        data_flow = self.metadata.get('data_flow', 'Bidirectional')
+        if data_flow in ("Forward", "Bidirectional"):
+            self.flow_arrows.append(self.small_arrow(path, 0.75))
+        if data_flow in ("Backward", "Bidirectional"):
+            self.flow_arrows.append(self.small_arrow(path, 0.25))
+
+    def refresh_decorations(self):
+        """Call after changing the label or data flow in metadata, the label's area is part of the bounds"""
+        self.prepareGeometryChange()
+        self.update_decorations(self.path())
+        self.update()
+
+    def boundingRect(self):
+        rect = super().boundingRect().adjusted(-DECORATION_MARGIN, -DECORATION_MARGIN, DECORATION_MARGIN, DECORATION_MARGIN)
+        if self.label_rect is not None:
+            rect = rect.united(self.label_rect)
+        return rect
+
     def get_connection_point(self, shape, target_center):
 
         if hasattr(shape, 'get_best_connection_point'):
@@ -84,6 +146,23 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
         path.lineTo(mid_point)
         path.lineTo(end)
 
+    def route_end(self, shape):
+        """(shape, scene rect, connection points) for the router"""
+        left, top, right, bottom = bounds = shape_outline(shape)
+        points = [(p.x, p.y, p.direction) for p in getattr(shape, 'connection_points', ())] or CARDINAL_POINTS
+        ports = [(left + x * (right - left), top + y * (bottom - top), d) for x, y, d in points]
+        return shape, bounds, ports
+
+    def route_points(self):
+        if self.router is None:
+            return None
+        return self.router.route(self, self.route_end(self.start_shape), self.route_end(self.end_shape))
+
+    def create_routed_line(self, path, points):
+        path.moveTo(self.mapFromScene(QPointF(*points[0])))
+        for point in points[1:]:
+            path.lineTo(self.mapFromScene(QPointF(*point)))
+
     def create_curved_line(self,path,start,end):
         path.moveTo(start)
 
@@ -131,6 +210,15 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
         path.lineTo(arrow_point2)
 
     def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        color = self.selected_color if self.isSelected() else self.line_color
+        if lod < LOD_SIMPLE:
+            # zoomed way out: one pixel wide, no antialiasing, no decorations
+            pen = QPen(color, 0)
+            painter.setPen(pen)
+            painter.drawPath(self.path())
+            return
+
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
 
         if self.isSelected():
@@ -140,47 +228,31 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
         
         painter.setPen(pen)
         painter.drawPath(self.path())
+        if lod < LOD_DETAIL:
+            return
 
-        if self.metadata.get('label'):
+        if self.label_text_rect is not None:
             self.draw_label(painter)
         
         self.draw_data_flow_indicator(painter)
 
     def draw_label(self, painter):
-        path = self.path()
-        if path.length() > 0:
-            midPoint = path.pointAtPercent(0.5)
-            painter.setPen(QPen(Qt.GlobalColor.black))
-            font = painter.font()
-            font.setPointSize(8)
-            painter.setFont(font)
-            text = self.metadata['label']
-            text_rect = painter.fontMetrics().boundingRect(text)
-            text_rect.moveCenter(midPoint.toPoint())
-            painter.fillRect(text_rect.adjusted(-2, -1, 2, 1), Qt.GlobalColor.white)
-            painter.drawText(text_rect, Qt.AlignmentFlag.AlignCenter, text)
+        painter.fillRect(self.label_box, Qt.GlobalColor.white)
+        painter.setPen(QPen(Qt.GlobalColor.black))
+        painter.setFont(self.label_font())
+        painter.drawText(self.label_text_rect, Qt.AlignmentFlag.AlignCenter, self.metadata['label'])
     
     def draw_data_flow_indicator(self, painter):
-        data_flow = self.metadata.get('data_flow', 'Bidirectional')
-        path = self.path()
-        if path.length() < 40:
-            return # sub-40ers stay big buddy
-
+        if not self.flow_arrows:
+            return
         painter.setPen(QPen(self.line_color, 1))
         painter.setBrush(self.line_color)
-        arrow_size = 8
-
-        if data_flow in ("Forward", "Bidirectional"):
-            point = path.pointAtPercent(0.75)
-            angle = -math.radians(path.angleAtPercent(0.75))
-            self.draw_small_arrow(painter, point, angle, arrow_size)
-        
-        if data_flow in ("Backward", "Bidirectional"):
-            point = path.pointAtPercent(0.25)
-            angle = -math.radians(path.angleAtPercent(0.25))
-            self.draw_small_arrow(painter, point, angle, arrow_size)
+        for arrow in self.flow_arrows:
+            painter.drawPolygon(arrow)
 
-    def draw_small_arrow(self, painter, point, angle, size):
+    def small_arrow(self, path, percent, size=8):
+            point = path.pointAtPercent(percent)
+            angle = -math.radians(path.angleAtPercent(percent))
             arrow_angle = math.pi / 6
 
             p1 = QPointF(
@@ -191,8 +263,7 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
                 point.x() + size * math.cos(angle + arrow_angle),
                 point.y() + size * math.sin(angle + arrow_angle)
             )
-            arrow = QPolygonF([point, p1, p2])
-            painter.drawPolygon(arrow)
+            return QPolygonF([point, p1, p2])
 
     def edit_properties(self):
             text, ok = QInputDialog.getText(
@@ -200,7 +271,8 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
             )
             if ok:
                 self.metadata['label'] = text
-                self.update()
+                self.mark_dirty()
+                self.refresh_decorations()
         
     def mouseDoubleClickEvent(self, event):
             self.edit_properties()
@@ -244,20 +316,34 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
 
     def set_connector_type(self, conn_type):
         self.connector_type = conn_type
+        self.mark_dirty()
         self.update_path()
     
     def set_data_flow(self, flow):
         self.metadata['data_flow'] = flow
-        self.update()
+        self.mark_dirty()
+        self.refresh_decorations()
+
+    def mark_dirty(self):
+        # always tell the file manager, autosave tracks edits separately from
+        # the dirty flag (which an explicit save clears)
+        self.dirty = True
+        if self.scene() and self.scene().views():
+            main_window = self.scene().views()[0].parent()
+            if hasattr(main_window, 'file_manager'):
+                main_window.file_manager.mark_dirty(self)
     
     def delete_connector(self):
         if self.scene():
-            self.scene().removeItem(self)
+            scene = self.scene()
+            scene.removeItem(self)
 
-            if hasattr(self.scene(), 'views') and self.scene().views():
-                main_window = self.scene().views()[0].parent()
+            if scene.views(): # self.scene() is None from here on
+                main_window = scene.views()[0].parent()
                 if hasattr(main_window, 'connectors') and self in main_window.connectors:
                     main_window.connectors.remove(self)
+                if hasattr(main_window, 'connector_manager'):
+                    main_window.connector_manager.remove_connector(self)
 
     def update_position(self):
         self.update_path()
@@ -265,6 +351,11 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
     def itemChange(self, change, value):
         if change == QGraphicsItem.GraphicsItemChange.ItemPositionChange:
             self.update_path()
+        elif change == QGraphicsItem.GraphicsItemChange.ItemSceneHasChanged:
+            if self.scene() and self.scene().views():
+                main_window = self.scene().views()[0].parent()
+                if hasattr(main_window, 'apply_item_cache_mode'):
+                    main_window.apply_item_cache_mode(self)
         return super().itemChange(change, value)
     def get_metadata_summary(self):
         summary = []
@@ -290,38 +381,108 @@ class ConnectorItem(QGraphicsPathItem): #friendship with supergluing has ended,
             return self.start_shape
         return None
     
+def shape_outline(shape):
+    """Scene rect of the shape itself, what elbow routes keep clear of"""
+    rect = shape.mapRectToScene(shape.shape_rect()) if hasattr(shape, 'shape_rect') else shape.sceneBoundingRect()
+    return (rect.left(), rect.top(), rect.right(), rect.bottom())
+
 class ConnectorManager:
-    def __init__(self, scene):
+    # every connector in the diagram, plus which connectors touch each shape so
+    # a shape's connectors are found without scanning all of them (a drag asks
+    # on every mouse move). Anything that adds or drops connectors goes through
+    # add_connector / remove_connector / clear to keep the two in step.
+    #
+    # Moved shapes don't re-route their connectors straight away, the
+    # connectors are queued and re-routed once per event loop pass, so a
+    # connector whose both ends moved (ctrl-drag, several shapes dragged)
+    # only gets its path rebuilt once.
+    #
+    # With a spatial index of the shapes, elbow connectors are routed around
+    # them (see utils/connector_router.py). A moved shape then also queues the
+    # elbows it now blocks or stopped blocking
+    def __init__(self, scene, index=None):
         self.scene = scene
-        self.connectors = []
+        self.router = ConnectorRouter(index, shape_outline) if index is not None else None
+        self.connectors = {} # connector -> None, a set that keeps creation order
+        self.by_shape = {} # shape -> set of connectors starting or ending there
+        self.pending = {} # connectors waiting for flush_updates, ordered set again
+        self.update_timer = QTimer()
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(0) # once per event loop pass, before the view repaints
+        self.update_timer.timeout.connect(self.flush_updates)
     
     def create_connector(self, start_shape, end_shape, connector_type = "line"):
         connector = ConnectorItem(start_shape, end_shape, connector_type)
-        self.connectors.append(connector)
+        self.add_connector(connector)
         self.scene.addItem(connector)
         return connector
+
+    def add_connector(self, connector):
+        """Track a connector made elsewhere (e.g. by the loader)"""
+        self.connectors[connector] = None
+        for shape in (connector.start_shape, connector.end_shape):
+            self.by_shape.setdefault(shape, set()).add(connector)
+        connector.router = self.router
+        if self.router is not None and connector.connector_type == "elbow":
+            connector.update_path() # made before it had a router
+
+    def remove_connector(self, connector):
+        """Stop tracking a connector, taking it out of the scene is up to the caller"""
+        self.connectors.pop(connector, None)
+        self.pending.pop(connector, None)
+        if self.router is not None:
+            self.router.forget(connector)
+        for shape in (connector.start_shape, connector.end_shape):
+            connectors = self.by_shape.get(shape)
+            if connectors is not None:
+                connectors.discard(connector)
+                if not connectors:
+                    del self.by_shape[shape]
     
     def update_connectors_for_shape(self, shape):
-        for connector in self.connectors:
-            if connector.is_connected_to_shape(shape):
-                connector.update_position()
+        """Queue the shape's connectors to be re-routed, and the elbow routes
+        it gets in or out of the way of. See flush_updates"""
+        connectors = list(self.by_shape.get(shape, ()))
+        if self.router is not None:
+            connectors.extend(self.router.invalidate(shape))
+        if not connectors:
+            return
+        self.pending.update(dict.fromkeys(connectors))
+        if not self.update_timer.isActive():
+            self.update_timer.start()
+
+    def flush_updates(self):
+        """Re-route every queued connector now, each once however many of its ends moved"""
+        self.update_timer.stop()
+        pending = self.pending
+        self.pending = {}
+        for connector in pending:
+            connector.update_position()
     
     def remove_connectors_for_shape(self, shape):
-        connectors_to_remove = []
-        for connector in self.connectors:
-            if connector.is_connected_to_shape(shape):
-                connectors_to_remove.append(connector)
+        """Take a shape's connectors out of the scene, returns them"""
+        connectors_to_remove = list(self.by_shape.get(shape, ()))
         for connector in connectors_to_remove:
-            self.scene.removeItem(connector)
-            self.connectors.remove(connector)
+            if connector.scene() is not None:
+                self.scene.removeItem(connector)
+            self.remove_connector(connector)
+        return connectors_to_remove
     
     def get_connectors_for_shape(self, shape):
-        return [conn for conn in self.connectors if conn.is_connected_to_shape(shape)]
+        return list(self.by_shape.get(shape, ()))
+
+    def clear(self):
+        """Forget every connector, for when the scene is being cleared anyway"""
+        self.connectors.clear()
+        self.by_shape.clear()
+        self.pending.clear()
+        if self.router is not None:
+            self.router.clear()
     
     def clear_all_connectors(self):
         for connector in self.connectors:
             self.scene.removeItem(connector)
-        self.connectors.clear()
+        self.clear()
 
              
     
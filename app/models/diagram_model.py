@@ -0,0 +1,80 @@
+import sys, os
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.diagram_io import read_diagram, normalize_shape, normalize_connector, resolve_endpoints
+from errorLogging import getLogger
+
+# Widget-free stand-ins for ShapeItem/ConnectorItem. Attribute names match the
+# scene items so ThreatModel works on either; used by headless tools.
+
+logger = getLogger("diagram_model")
+
+
+@dataclass(eq=False)
+class DiagramShape:
+    element_id: str
+    item_type: str
+    x: float
+    y: float
+    w: float
+    h: float
+    label: str = ""
+    color: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    shape_category: Optional[str] = None
+    shape_subtype: Optional[str] = None
+
+
+@dataclass(eq=False)
+class DiagramConnector:
+    element_id: str
+    start_shape: DiagramShape
+    end_shape: DiagramShape
+    connector_type: str = "line"
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_diagram_model(path) -> Tuple[List[DiagramShape], List[DiagramConnector]]:
+    """Read a saved diagram (json or .sadb, journal included) into plain model objects"""
+    data = read_diagram(path)
+    shapes, shapes_by_index, shapes_by_id = [], {}, {}
+    for i, record in enumerate(data.get("shapes", [])):
+        try:
+            shape_data = normalize_shape(record)
+        except Exception as e:
+            logger.error(f"Skipping malformed shape {i} in {path}: {e}")
+            continue
+        shape = DiagramShape(
+            element_id=shape_data["id"] or f"shape-{i}",
+            item_type=shape_data["type"],
+            x=shape_data["x"], y=shape_data["y"],
+            w=shape_data["width"], h=shape_data["height"],
+            label=shape_data["label"] or "",
+            color=shape_data["color"],
+            metadata=shape_data["metadata"] or {},
+            shape_category=shape_data["shape_category"],
+            shape_subtype=shape_data["shape_subtype"],
+        )
+        shapes.append(shape)
+        shapes_by_index[i] = shape
+        shapes_by_id.setdefault(shape.element_id, shape)
+    connectors = []
+    for i, record in enumerate(data.get("connectors", [])):
+        try:
+            conn_data = normalize_connector(record)
+        except Exception as e:
+            logger.error(f"Skipping malformed connector {i} in {path}: {e}")
+            continue
+        start, end = resolve_endpoints(conn_data, shapes_by_index, shapes_by_id)
+        if start is None or end is None:
+            logger.warning(f"Connector {i} in {path} references unknown shapes")
+            continue
+        connectors.append(DiagramConnector(
+            element_id=conn_data["id"] or f"connector-{i}",
+            start_shape=start,
+            end_shape=end,
+            connector_type=conn_data["type"],
+            metadata=conn_data["metadata"] or {},
+        ))
+    return shapes, connectors
@@ -0,0 +1,68 @@
+import sys, os
+from PyQt6.QtGui import QFont, QFontMetricsF, QStaticText, QTextLayout, QTextOption
+from PyQt6.QtCore import Qt, QPointF
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import LABEL_POINT_SIZE, LABEL_PADDING
+
+# Shape labels, wrapped to the shape's width and elided when they run out of
+# height. The layout is worked out once and kept as QStaticText lines, so a
+# repaint is a few drawStaticText calls instead of laying the text out again.
+
+
+def label_font():
+    font = QFont()
+    font.setPointSize(LABEL_POINT_SIZE)
+    return font
+
+
+def wrap_lines(text, font, width):
+    """Lines QTextLayout breaks text into at the given width"""
+    layout = QTextLayout(text.replace("\n", "\u2028"), font) # line separator forces a break
+    option = QTextOption()
+    option.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
+    layout.setTextOption(option)
+    # line positions are in UTF-16 units, slice the same encoding so emoji don't shift them
+    encoded = layout.text().encode('utf-16-le')
+    lines = []
+    layout.beginLayout()
+    while True:
+        line = layout.createLine()
+        if not line.isValid():
+            break
+        line.setLineWidth(width)
+        start, length = line.textStart(), line.textLength()
+        lines.append(encoded[2 * start:2 * (start + length)].decode('utf-16-le'))
+    layout.endLayout()
+    return [line.replace("\u2028", "").strip() for line in lines]
+
+
+class LabelLayout:
+    """A label laid out for one (text, width, height), ready to paint"""
+
+    def __init__(self, text, width, height, font=None):
+        self.key = (text, width, height)
+        self.font = font or label_font()
+        self.lines = [] # (top left, QStaticText)
+        metrics = QFontMetricsF(self.font)
+        text_width = max(1.0, width - 2 * LABEL_PADDING)
+        line_height = metrics.lineSpacing()
+        max_lines = max(1, int((height - 2 * LABEL_PADDING) // line_height))
+
+        lines = wrap_lines(text, self.font, text_width)
+        if len(lines) > max_lines:
+            rest = " ".join(lines[max_lines - 1:])
+            lines = lines[:max_lines - 1] + [metrics.elidedText(rest, Qt.TextElideMode.ElideRight, text_width)]
+
+        top = (height - len(lines) * line_height) / 2
+        for i, line in enumerate(lines):
+            static = QStaticText(line)
+            static.setTextFormat(Qt.TextFormat.PlainText)
+            static.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+            static.prepare(font=self.font)
+            x = (width - metrics.horizontalAdvance(line)) / 2
+            self.lines.append((QPointF(x, top + i * line_height), static))
+
+    def paint(self, painter):
+        painter.setFont(self.font)
+        for position, static in self.lines:
+            painter.drawStaticText(position, static)
@@ -0,0 +1,102 @@
+import math
+from PyQt6.QtGui import QPainterPath, QPolygonF
+from PyQt6.QtCore import QPointF, QRectF
+
+# Shape outlines in item coordinates (0, 0, w, h). Which type uses which
+# outline lives in models/shape_types.py, whose outline_path() hands every
+# shape of a given (type, w, h) the same QPainterPath instead of rebuilding it
+# on each repaint.
+
+
+def create_diamond(w, h):
+    polygon = QPolygonF()
+    polygon.append(QPointF(w/2, 0))
+    polygon.append(QPointF(w, h/2))
+    polygon.append(QPointF(w/2, h))
+    polygon.append(QPointF(0, h/2))
+    return polygon
+
+def create_triangle(w, h):
+    polygon = QPolygonF()
+    polygon.append(QPointF(w/2, 0))
+    polygon.append(QPointF(w, h))
+    polygon.append(QPointF(0, h))
+    return polygon
+
+def create_hexagon(w, h):
+    polygon = QPolygonF()
+    center_x, center_y = w/2, h/2
+    radius = min(w, h) / 2
+    for i in range(6):
+        angle = i*math.pi / 3
+        x = center_x + radius * math.cos(angle)
+        y = center_y + radius * math.sin(angle)
+        polygon.append(QPointF(x, y))
+    return polygon
+
+def create_star(w, h):
+    polygon = QPolygonF()
+    center_x, center_y = w/2, h/2
+    outer_radius = min(w, h) / 2.2
+    inner_radius = outer_radius * 0.4
+
+    for i in range(10):
+        angle = i * math.pi / 5 - math.pi / 2
+        if i % 2 == 0:
+            x = center_x + outer_radius * math.cos(angle)
+            y = center_y + outer_radius * math.sin(angle)
+        else:
+            x = center_x + inner_radius * math.cos(angle)
+            y = center_y + inner_radius * math.sin(angle)
+        polygon.append(QPointF(x, y))
+    return polygon
+
+def create_arrow(w, h):
+    polygon = QPolygonF()
+    h_third = h / 3
+    w_80 = w * 0.8
+
+    polygon.append(QPointF(0, h_third))
+    polygon.append(QPointF(w_80, h_third))
+    polygon.append(QPointF(w_80, 0))
+    polygon.append(QPointF(w, h/2))
+    polygon.append(QPointF(w_80, h))
+    polygon.append(QPointF(w_80, 2*h_third))
+    polygon.append(QPointF(0, 2*h_third))
+    return polygon
+
+def create_cloud(w, h):
+    path = QPainterPath()
+    path.addEllipse(w*0.2, h*0.3, w*0.3, h*0.4)
+    path.addEllipse(w*0.35, h*0.2, w*0.3, h*0.5)
+    path.addEllipse(w*0.5, h*0.3, w*0.3, h*0.4)
+    path.addEllipse(w*0.25, h*0.45, w*0.5, h*0.3)
+    return path
+
+def create_cylinder(w, h):
+    path = QPainterPath()
+    ellipse_height = h * 0.2
+    path.addEllipse(0, 0, w, ellipse_height)
+    path.addEllipse(0, h - ellipse_height, w, ellipse_height)
+    path.addRect(0, ellipse_height/2, w, h - ellipse_height)
+    return path
+
+
+def rect_path(w, h):
+    path = QPainterPath()
+    path.addRect(QRectF(0, 0, w, h))
+    return path
+
+def ellipse_path(w, h):
+    path = QPainterPath()
+    path.addEllipse(QRectF(0, 0, w, h))
+    return path
+
+def polygon_path(create):
+    def build(w, h):
+        path = QPainterPath()
+        path.addPolygon(create(w, h))
+        path.closeSubpath()
+        return path
+    return build
+
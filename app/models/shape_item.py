@@ -1,14 +1,25 @@
-from PyQt6.QtWidgets import (QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem,QGraphicsTextItem, QInputDialog, QColorDialog, QMenu
+from PyQt6.QtWidgets import (QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem, QInputDialog, QColorDialog, QMenu
 )
 from PyQt6.QtGui import QPen, QBrush, QColor, QPainterPath, QPolygonF
 from PyQt6.QtCore import Qt, QRectF, QPointF
-from config import HANDLE_SIZE, DEFAULT_SHAPE_COLOR, PENDING_COLOR
+from config import HANDLE_SIZE, DEFAULT_SHAPE_COLOR, PENDING_COLOR, LOD_DETAIL, LOD_SIMPLE
 from models.connector_item import ConnectorItem
 import sys, os
-import math
+import uuid
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import (GRID_SIZE)
 from errorLogging import getLogger, safe_execute, erorrHandler
+from utils.diagram_io import unpack_metadata, snapshot_metadata
+from models.shape_types import outline_path, connection_points_for
+from models.label_layout import LabelLayout
+
+POINT_RADIUS = 3 # connection point dots
+PEN_MARGIN = 3 # half the widest outline pen (pending is 4) plus antialiasing
+
+
+def new_element_id():
+    return uuid.uuid4().hex
+
 
 class ConnectionPoint:
     def __init__(self, x, y, direction="auto"):
@@ -45,7 +56,10 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
             'trust_level': 'Trusted',
         }
         self.connection_points = self.create_connection_points()
+        self._outline = None # shared path from outline_path(), dropped on resize
         self.connection_pending = False
+        self.dirty = True # not saved yet
+        self.element_id = new_element_id() # persistent, connectors reference shapes by this
 
 
         self.setPos(x, y)
@@ -55,64 +69,12 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
         self.setAcceptHoverEvents(True)
         self.setAcceptedMouseButtons(Qt.MouseButton.LeftButton | Qt.MouseButton.RightButton)
 
-        self.text_item = QGraphicsTextItem(self.label, parent=self)
-        self.update_text_position()
+        self.label_font = None # None is the default label font
+        self.label_layout = None # LabelLayout, rebuilt when label, font or size change
     
     def create_connection_points(self):
-        if self.item_type in ["rect", "process", "datastore", "external", "server", "database"]:
-            return [
-                ConnectionPoint(0.5, 0, "top"),
-                ConnectionPoint(1, 0.5, "right"),
-                ConnectionPoint(0.5, 1, "bottom"),
-                ConnectionPoint(0, 0.5, "left")
-            ]
-        elif self.item_type in ["circle", "user"]:
-            return [
-                ConnectionPoint(0.5, 0.15, "top"),
-                ConnectionPoint(0.85, 0.5, "right"),
-                ConnectionPoint(0.5, 0.85, "bottom"),
-                ConnectionPoint(0.15, 0.5, "left")
-            ]
-        elif self.item_type in ["diamond", "threat", "decision"]:
-            return [
-                ConnectionPoint(0.5, 0, "top"),
-                ConnectionPoint(1, 0.5, "right"),
-                ConnectionPoint(0.5, 1, "bottom"),
-                ConnectionPoint(0, 0.5, "left")
-            ]
-        elif self.item_type in ["hexagon", "network"]:
-            return [
-                ConnectionPoint(0.75, 0.05, "top"),
-                ConnectionPoint(0.95, 0.35, "right"),
-                ConnectionPoint(0.95, 0.65, "right"),
-                ConnectionPoint(0.76, 0.85, "bottom"),
-                ConnectionPoint(0.25, 0.95, "bottom"),
-                ConnectionPoint(0.05, 0.35, "left"),
-                ConnectionPoint(0.25, 0.05, "top"),
-            ]
-        elif self.item_type == "arrow":
-            return [
-                ConnectionPoint(0, 0.5, "left"),
-                ConnectionPoint(1, 0.5, "right")
-            ]
-        elif self.item_type == "star":
-            points = []
-            for i in range(10):
-                angle = i * math.pi/5
-                if i % 2 == 0:
-                    points.append(ConnectionPoint(
-                        0.5 + 0.4 *math.cos(angle - math.pi/2),
-                        0.5 + 0.4 * math.sin(angle - math.pi / 2),
-                        "auto"
-                    ))
-            return points
-        else:
-            return [
-                ConnectionPoint(0.5, 0, "top"),
-                ConnectionPoint(1, 0.5, "right"),
-                ConnectionPoint(0.5, 1, "bottom"),
-                ConnectionPoint(0, 0.5, "left")
-            ]
+        return [ConnectionPoint(x, y, direction) for x, y, direction in connection_points_for(self.item_type)]
+
     def itemChange(self, change, value):
         if change == QGraphicsItem.GraphicsItemChange.ItemPositionChange and self.scene():
             if self.scene().views():
@@ -125,15 +87,83 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
         elif change == QGraphicsItem.GraphicsItemChange.ItemSelectedChange:
             self.selected = value
             self.update()
-        if self.scene() and hasattr(self.scene(), 'views') and self.scene().views():
+        elif change == QGraphicsItem.GraphicsItemChange.ItemPositionHasChanged:
+            self.mark_dirty()
+            self.update_spatial_index()
+            self.update_connectors()
+        elif change == QGraphicsItem.GraphicsItemChange.ItemSceneChange:
+            index = self.spatial_index() # still the old scene here
+            if index is not None:
+                index.remove(self)
+                self.update_connectors() # elbows that went around it can go straight through now
+        elif change == QGraphicsItem.GraphicsItemChange.ItemSceneHasChanged:
+            self.update_spatial_index()
+            self.update_connectors() # and ones it lands on have to go round
+            if self.scene() and self.scene().views():
+                main_window = self.scene().views()[0].parent()
+                if hasattr(main_window, 'apply_item_cache_mode'):
+                    main_window.apply_item_cache_mode(self)
+        return super().itemChange(change, value)
+
+    def update_connectors(self):
+        # only after a move, resize, add or remove, selection and other changes don't move anything
+        if self.scene() and self.scene().views():
             main_window = self.scene().views()[0].parent()
             if hasattr(main_window, 'connector_manager'):
                 main_window.connector_manager.update_connectors_for_shape(self)
-        return super().itemChange(change, value)
 
+    @property
+    def metadata(self):
+        if self._metadata_raw is not None:
+            # first real use, decode and keep the dict from now on
+            self._metadata = unpack_metadata(self._metadata_raw)
+            self._metadata_raw = None
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+        self._metadata_raw = None
+
+    def set_packed_metadata(self, raw):
+        """Keep metadata as a pack_metadata blob until something needs the dict"""
+        self._metadata = None
+        self._metadata_raw = raw
+
+    def read_metadata(self):
+        """Metadata for read-only use, packed metadata is decoded without being kept"""
+        if self._metadata_raw is not None:
+            return unpack_metadata(self._metadata_raw)
+        return self._metadata
+
+    def metadata_snapshot(self):
+        """Copy of the metadata the GUI won't mutate, for saving"""
+        if self._metadata_raw is not None:
+            return unpack_metadata(self._metadata_raw)
+        return snapshot_metadata(self._metadata or {})
+
+    def spatial_index(self):
+        if self.scene() and self.scene().views():
+            return getattr(self.scene().views()[0].parent(), 'spatial_index', None)
+        return None
+
+    def update_spatial_index(self):
+        index = self.spatial_index()
+        if index is not None:
+            rect = self.sceneBoundingRect()
+            index.insert(self, rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def mark_dirty(self):
+        # always tell the file manager, autosave tracks edits separately from
+        # the dirty flag (which an explicit save clears)
+        self.dirty = True
+        if self.scene() and self.scene().views():
+            main_window = self.scene().views()[0].parent()
+            if hasattr(main_window, 'file_manager'):
+                main_window.file_manager.mark_dirty(self)
 
     def get_best_connection_point(self, target_point):
-        rect = self.boundingRect()
+        rect = self.shape_rect()
         center = rect.center()
 
         if isinstance(target_point, QPointF):
@@ -172,155 +202,35 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
             self.create_arrow_line(path, start_point, end_point)
         self.setPath(path)
 
-    def update_text_position(self):
-        if self.text_item:
-            text_rect = self.text_item.boundingRect()
-            x = (self.w - text_rect.width()) / 2
-            y = (self.h - text_rect.height()) / 2
-            self.text_item.setPos(x, y)
-
-    def create_diamond(self):
-        polygon = QPolygonF()
-        polygon.append(QPointF(self.w, self.h/2))
-        polygon.append(QPointF(self.w/2, self.h))
-        polygon.append(QPointF(0, self.h/2))
-        return polygon
-    
-    def create_triangle(self):
-        polygon = QPolygonF()
-        polygon.append(QPointF(self.w/2, 0))
-        polygon.append(QPointF(self.w, self.h))
-        polygon.append(QPointF(0, self.h))
-        return polygon
-
-    def create_hexagon(self):
-        polygon = QPolygonF()
-        center_x, center_y = self.w/2, self.h/2
-        radius = min(self.w, self.h) / 2
-        for i in range(6):
-            angle = i*math.pi / 3
-            x = center_x + radius * math.cos(angle)
-            y = center_y + radius * math.sin(angle)
-            polygon.append(QPointF(x, y))
-        return polygon
-    def create_star(self):
-        polygon = QPolygonF()
-        center_x, center_y = self.w/2, self.h/2
-        outer_radius = min(self.w, self.h) / 2.2
-        inner_radius = outer_radius * 0.4
-
-        for i in range(10):
-            angle = i * math.pi / 5 - math.pi / 2
-            if i % 2 == 0:
-                x = center_x + outer_radius * math.cos(angle)
-                y = center_y + outer_radius * math.sin(angle)
-            else:
-                x = center_x + inner_radius * math.cos(angle)
-                y = center_y + inner_radius * math.sin(angle)
-            polygon.append(QPointF(x, y))
-        return polygon
-    
-    def create_arrow(self):
-        polygon = QPolygonF()
-        h_third = self.h / 3
-        w_80 = self.w * 0.8
-
-        polygon.append(QPointF(0, h_third))
-        polygon.append(QPointF(w_80, h_third))
-        polygon.append(QPointF(w_80, 0))
-        polygon.append(QPointF(self.w, self.h/2))
-        polygon.append(QPointF(w_80, self.h))
-        polygon.append(QPointF(w_80, 2*h_third))
-        polygon.append(QPointF(0, 2*h_third))
-        return polygon
-
-    def create_cloud(self):
-        path = QPainterPath()
-        w, h = self.w, self.h
-        path.addEllipse(w*0.2, h*0.3, w*0.3, h*0.4)
-        path.addEllipse(w*0.35, h*0.2, w*0.3, h*0.5)
-        path.addEllipse(w*0.5, h*0.3, w*0.3, h*0.4)
-        path.addEllipse(w*0.25, h*0.45, w*0.5, h*0.3)
+    def set_label_font(self, font):
+        self.label_font = font
+        self.label_layout = None
+        self.update()
 
-        return path
-    
-    def create_cylinder(self):
-        path = QPainterPath()
-        ellipse_height = self.h * 0.2
-        path.addEllipse(0, 0, self.w, ellipse_height)
-        path.addEllipse(0, self.h - ellipse_height, self.w, ellipse_height)
-        path.addRect(0, ellipse_height/2, self.w, self.h - ellipse_height)
-        return path
+    def paint_label(self, painter):
+        key = (self.label, self.w, self.h)
+        if self.label_layout is None or self.label_layout.key != key:
+            self.label_layout = LabelLayout(self.label, self.w, self.h, self.label_font)
+        painter.setPen(Qt.GlobalColor.black)
+        self.label_layout.paint(painter)
 
     def paint(self, painter, option, widget=None):
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < LOD_SIMPLE:
+            # a few pixels across, outline and text wouldn't be visible anyway
+            painter.fillRect(self.shape_rect(), self.color)
+            return
         pen_color = Qt.GlobalColor.red if self.connection_pending else Qt.GlobalColor.black
         pen_width = 4 if self.connection_pending else 2
         painter.setPen(QPen(pen_color, pen_width))
         painter.setBrush(QBrush(self.color))
-        shape_rect = self.boundingRect()
-        if self.item_type == "rect":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "circle":
-            painter.drawEllipse(shape_rect)
-        elif self.item_type == "diamond":
-            polygon = self.create_diamond()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "triangle":
-            polygon = self.create_triangle()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "hexagon":
-            polygon = self.create_hexagon()
-            painter.drawPolygon(polygon)   
-        elif self.item_type == "star":
-            polygon = self.create_star()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "arrow":
-            polygon = self.create_arrow()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "cloud":
-            path = self.create_cloud()
-            painter.drawPath(path)
-        elif self.item_type == "cylinder":
-            path = self.create_cylinder()
-            painter.drawPath(path)
-        elif self.item_type == "server":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "database":
-            path = self.create_cylinder() 
-            painter.drawPath(path)
-        elif self.item_type == "network":
-            painter.drawEllipse(shape_rect)
-        elif self.item_type == "user":
-            painter.drawEllipse(shape_rect) 
-        elif self.item_type == "process":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "datastore":
-            path = self.create_cylinder()
-            painter.drawPath(path)
-        elif self.item_type == "external":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "threat":
-            polygon = self.create_diamond()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "boundary":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "decision":
-            polygon = self.create_diamond()
-            painter.drawPolygon(polygon)
-        elif self.item_type == "start_end":
-            painter.drawEllipse(shape_rect)
-        elif self.item_type == "document":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "data":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "manual_input":
-            painter.drawRect(shape_rect)
-        elif self.item_type == "predefined":
-            painter.drawRect(shape_rect)
+        outline = self.outline()
+        if outline is not None:
+            painter.drawPath(outline)
+        if lod < LOD_DETAIL:
+            return
         if self.label:
-            painter.setPen(Qt.GlobalColor.black)
-            for i, label in enumerate(self.label):
-                painter.drawText(self.boundingRect().adjusted(0, i*20, 0, 0), Qt.AlignmentFlag.AlignTop, self.label)
+            self.paint_label(painter)
 
 
         if self.isSelected() and hasattr(self, 'show_connection_points') and self.show_connection_points:
@@ -333,10 +243,10 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
         painter.setPen(QPen(Qt.GlobalColor.blue, 1))
         painter.setBrush(QBrush(Qt.GlobalColor.lightGray))
 
-        shape_rect = self.boundingRect()
+        shape_rect = self.shape_rect()
         for point in self.connection_points:
             abs_pos = point.get_absolute_pos(shape_rect)
-            painter.drawEllipse(int(abs_pos.x() - 3), int(abs_pos.y() - 3), 6, 6)
+            painter.drawEllipse(int(abs_pos.x() - POINT_RADIUS), int(abs_pos.y() - POINT_RADIUS), 2 * POINT_RADIUS, 2 * POINT_RADIUS)
 
 
     def contextMenuEvent(self, event):
@@ -350,6 +260,7 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
             color = QColorDialog.getColor()
             if color.isValid():
                 self.color = color
+                self.mark_dirty()
                 self.update()
         elif action == metadata_action:
             self.edit_metadata()
@@ -360,6 +271,7 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
         text, ok = QInputDialog.getText(None, "Edit Label", "Text:", text=self.label)
         if ok:
             self.label = text
+            self.mark_dirty()
             self.update()
     def mouseMoveEvent(self, event): 
         if self.resizing and self.resize_handle != -1:
@@ -393,8 +305,33 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
             if self.get_handle_rect(i).contains(pos):
                 return True
         return False
-    def boundingRect(self):
+    def shape_rect(self):
+        """The shape itself in item coordinates, use this for geometry"""
         return QRectF(0, 0, self.w, self.h)
+
+    def boundingRect(self):
+        # everything paint() can touch: resize handles straddle the edges,
+        # connection point dots and the thick pending pen stick out a bit
+        margin = max(self.handle_size / 2, POINT_RADIUS) + PEN_MARGIN
+        return QRectF(-margin, -margin, self.w + 2 * margin, self.h + 2 * margin)
+
+    def outline(self):
+        """Cached outline path for this type and size (shared, don't modify)"""
+        if self._outline is None:
+            self._outline = outline_path(self.item_type, self.w, self.h)
+        return self._outline
+
+    def shape(self):
+        # hit-testing covers the whole shape rect like it always has (clicks in a
+        # diamond's or star's corners still pick it), not the grown boundingRect.
+        # Plus the handles while they're showing
+        path = QPainterPath()
+        path.setFillRule(Qt.FillRule.WindingFill) # where the handles overlap the rect is still inside
+        path.addRect(self.shape_rect())
+        if self.isSelected():
+            for i in range(8):
+                path.addRect(self.get_handle_rect(i))
+        return path
     
     def get_handle_at(self, pos):
         for i in range(8):
@@ -405,7 +342,7 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
     def get_handle_rect(self, handle_index):
         handle_size = self.handle_size
         half = handle_size / 2
-        rect = self.boundingRect()
+        rect = self.shape_rect()
 
         if handle_index == 0:
             return QRectF(rect.left() - half, rect.top() - half, handle_size, handle_size)
@@ -431,7 +368,7 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
        painter.setBrush(QBrush(Qt.GlobalColor.white))
        
        h_size = self.handle_size
-       rect = self.boundingRect()
+       rect = self.shape_rect()
 
        handles = [
         QRectF(rect.left() - h_size/2, rect.top() - h_size/2, h_size, h_size),
@@ -449,7 +386,7 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
 
     def get_handle_positions(self):
         h_size = self.handle_size
-        rect = self.boundingRect()
+        rect = self.shape_rect()
         handles = []
 
         handles.append(QRectF(-h_size/2, -h_size/2, h_size, h_size))
@@ -500,7 +437,8 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
                         main_window.toolbar_manager.set_tool("select")
                 return
         if self.scene():
-            for item in self.scene().items():
+            # only what's actually selected, not every item in the scene
+            for item in self.scene().selectedItems():
                 if isinstance(item, ShapeItem) and item != self:
                     item.setSelected(False)
         
@@ -563,13 +501,12 @@ class ShapeItem(QGraphicsItem): #THE CIRCLE GOES IN... THE SQUARE HOLE!
                     new_w = max(min_size, self.resize_orig_w + delta_x)
         self.w = new_w
         self.h = new_h
+        self._outline = None
         self.setPos(new_x, new_y)
-        self.update_text_position()
+        self.update_spatial_index() # size changed even if the position didn't
+        self.mark_dirty()
         self.update()
-        if self.scene() and hasattr(self.scene(), 'views') and self.scene().views():
-            main_window = self.scene().views()[0].parent()
-            if hasattr(main_window, 'connector_manager'):
-                main_window.connector_manager.update_connectors_for_shape(self)     
+        self.update_connectors()
 
              #please work
     def mouseReleaseEvent(self, event):
@@ -0,0 +1,156 @@
+import importlib.util
+import math
+import sys, os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+from PyQt6.QtGui import QColor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import OUTLINE_CACHE_SIZE, SHAPE_PACK_DIR
+from errorLogging import getLogger
+from models.shape_geometry import (create_diamond, create_triangle, create_hexagon, create_star, create_arrow,
+                                   create_cloud, create_cylinder, rect_path, ellipse_path, polygon_path)
+
+# Every shape type in one table: what it looks like, how big a new one is,
+# where connectors attach and what STRIDE element it stands for. The editor,
+# the shapes and the threat analysis all look types up here instead of each
+# keeping their own if/elif chain.
+#
+# Shape packs add types without touching this file: any .py in SHAPE_PACK_DIR
+# is imported on first lookup and calls register_shape_type(), e.g.
+#
+#   from models.shape_types import ShapeType, register_shape_type
+#   register_shape_type(ShapeType("queue", outline=rect_path, size=(120, 40),
+#                                 element_type="datastore", palette="Messaging"))
+
+logger = getLogger("shape_types")
+
+# connection points as (x, y, direction), x and y relative to the shape's width and height
+CARDINAL_POINTS = ((0.5, 0, "top"), (1, 0.5, "right"), (0.5, 1, "bottom"), (0, 0.5, "left"))
+ROUND_POINTS = ((0.5, 0.15, "top"), (0.85, 0.5, "right"), (0.5, 0.85, "bottom"), (0.15, 0.5, "left"))
+HEXAGON_POINTS = ((0.75, 0.05, "top"), (0.95, 0.35, "right"), (0.95, 0.65, "right"), (0.76, 0.85, "bottom"),
+                  (0.25, 0.95, "bottom"), (0.05, 0.35, "left"), (0.25, 0.05, "top"))
+ARROW_POINTS = ((0, 0.5, "left"), (1, 0.5, "right"))
+STAR_POINTS = tuple((0.5 + 0.4 * math.cos(i * math.pi / 5 - math.pi / 2),
+                     0.5 + 0.4 * math.sin(i * math.pi / 5 - math.pi / 2), "auto")
+                    for i in range(0, 10, 2)) # the five tips
+
+
+@dataclass
+class ShapeType:
+    name: str
+    outline: Optional[Callable] = None # (w, h) -> QPainterPath in item coordinates
+    size: Tuple[int, int] = (100, 60) # new shapes from the tool
+    color: Optional[QColor] = None # None keeps the shape default
+    points: tuple = CARDINAL_POINTS
+    element_type: str = "process" # STRIDE element the analysis treats it as
+    draws_as: Optional[str] = None # item type the tool creates, if not this one
+    category: Optional[str] = None # tools with a category tag new shapes with it and their subtype
+    palette: Optional[str] = None # toolbar category for pack types (built-ins are listed there already)
+    label: str = ""
+    icon: str = "◻"
+    description: str = ""
+
+    def __post_init__(self):
+        if self.draws_as is None:
+            self.draws_as = self.name
+        if not self.label:
+            self.label = self.name.replace("_", " ").title()
+
+
+SHAPE_TYPES = {} # name -> ShapeType
+packs_loaded = False
+
+
+def register_shape_type(shape_type):
+    """Add a type, or replace the one with the same name"""
+    SHAPE_TYPES[shape_type.name] = shape_type
+    outline_path.cache_clear() # a replaced type may outline differently
+    return shape_type
+
+
+def shape_type(name):
+    """The registered type called name, or None"""
+    if not packs_loaded:
+        load_shape_packs()
+    return SHAPE_TYPES.get(name)
+
+
+def shape_types():
+    if not packs_loaded:
+        load_shape_packs()
+    return list(SHAPE_TYPES.values())
+
+
+def element_type_for(name):
+    """STRIDE element type for a shape type or subtype, unknown names are passed through"""
+    registered = shape_type(name)
+    return registered.element_type if registered is not None else name
+
+
+def connection_points_for(name):
+    registered = shape_type(name)
+    return registered.points if registered is not None else CARDINAL_POINTS
+
+
+@lru_cache(maxsize=OUTLINE_CACHE_SIZE)
+def outline_path(item_type, w, h):
+    """Outline for a shape type at a size, or None if the type draws no outline.
+    Shared between shapes, never modify the returned path (copy it first)"""
+    registered = shape_type(item_type)
+    if registered is None or registered.outline is None:
+        return None
+    return registered.outline(w, h)
+
+
+def load_shape_packs(directory=SHAPE_PACK_DIR):
+    """Import every shape pack in directory, a broken pack is logged and skipped"""
+    global packs_loaded
+    packs_loaded = True
+    if not os.path.isdir(directory):
+        return
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".py") or filename.startswith("_"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            spec = importlib.util.spec_from_file_location(f"shape_packs.{filename[:-3]}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            logger.info(f"Loaded shape pack {filename}")
+        except Exception as e:
+            logger.error(f"Shape pack {filename} failed to load: {e}")
+
+
+diamond_path = polygon_path(create_diamond)
+
+for builtin in [
+    # basic shapes
+    ShapeType("rect", rect_path, (100, 60)),
+    ShapeType("circle", ellipse_path, (60, 60), points=ROUND_POINTS),
+    ShapeType("diamond", diamond_path, (80, 80)),
+    ShapeType("triangle", polygon_path(create_triangle), (80, 80)),
+    ShapeType("hexagon", polygon_path(create_hexagon), (90, 90), points=HEXAGON_POINTS),
+    ShapeType("star", polygon_path(create_star), (90, 90), points=STAR_POINTS),
+    ShapeType("arrow", polygon_path(create_arrow), (100, 60), points=ARROW_POINTS),
+    ShapeType("cloud", create_cloud, (120, 80)),
+    ShapeType("cylinder", create_cylinder, (100, 80)),
+    # threat modeling, the tools draw them as a basic shape tagged with the subtype
+    ShapeType("user", ellipse_path, (80, 80), QColor(135, 206, 250), ROUND_POINTS, "user", "circle", "threat_modeling"),
+    ShapeType("process", rect_path, (100, 60), QColor(144, 238, 144), CARDINAL_POINTS, "process", "rect", "threat_modeling"),
+    ShapeType("datastore", create_cylinder, (120, 40), QColor(255, 182, 193), CARDINAL_POINTS, "datastore", "rect", "threat_modeling"),
+    ShapeType("external", rect_path, (90, 70), QColor(255, 255, 224), CARDINAL_POINTS, "external", "rect", "threat_modeling"),
+    ShapeType("threat", diamond_path, (80, 80), QColor(255, 99, 71), CARDINAL_POINTS, "process", "diamond", "threat_modeling"),
+    ShapeType("boundary", rect_path, (150, 100), QColor(211, 211, 211), CARDINAL_POINTS, "boundary", "rect", "threat_modeling"),
+    ShapeType("decision", diamond_path, (70, 70), QColor(255, 215, 0), CARDINAL_POINTS, "process", "diamond", "threat_modeling"),
+    ShapeType("network", ellipse_path, (90, 90), QColor(175, 238, 238), HEXAGON_POINTS, "process", "hexagon", "threat_modeling"),
+    ShapeType("server", rect_path, (90, 70), QColor(152, 251, 152), CARDINAL_POINTS, "server", "rect", "threat_modeling"),
+    ShapeType("database", create_cylinder, (100, 60), QColor(255, 182, 193), CARDINAL_POINTS, "database", "rect", "threat_modeling"),
+    # flow & UML
+    ShapeType("start_end", ellipse_path, (80, 50)),
+    ShapeType("document", rect_path, (100, 70)),
+    ShapeType("data", rect_path, (90, 60)),
+    ShapeType("manual_input", rect_path, (100, 60)),
+    ShapeType("predefined", rect_path, (110, 60)),
+]:
+    register_shape_type(builtin)
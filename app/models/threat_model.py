@@ -1,19 +1,25 @@
 import sys
 import json
+import zlib
 from typing import List, Dict, Any, Optional, Tuple, Set
 
 from datetime import datetime
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from enum import Enum
 from errorLogging import getLogger, safe_execute, gui_safe_execute, erorrHandler
+from models.shape_types import element_type_for
 
 try:
     from pytm import TM, Server, Actor, Dataflow, Boundary, Element, Process, Datastore, Lambda
-    pytm_available = True
+    PYTM_AVAILABLE = True
 except ImportError:
-    pytm_available = False
+    PYTM_AVAILABLE = False
     print("PyTM not installed. Using build-in threat analysis engine!")
 
+def stable_hash(text: str) -> int:
+    # hash() of a str is salted per process, ids have to match across runs
+    return zlib.crc32(text.encode('utf-8'))
+
 class ThreatType(Enum):
     spoofing = "Spoofing"
     tampering = "Tampering"
@@ -45,7 +51,7 @@ class ThreatInfo: # this is the danger.
     element_type: str
     threat_type: str
     severity: str
-    desccription: str
+    description: str
     condition: str
     likelihood: str = "Medium"
     impact: str = "Medium"
@@ -58,7 +64,11 @@ class ThreatInfo: # this is the danger.
         if self.references is None:
             self.references = []
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        # every field is a str or a list of str, asdict's deepcopy is wasted on them
+        data = dict(vars(self))
+        data["mitigations"] = list(self.mitigations)
+        data["references"] = list(self.references)
+        return data
 
 @dataclass
 class ElementSecurityProperties:
@@ -72,7 +82,7 @@ class ElementSecurityProperties:
     has_monitoring: bool = False
     is_hardened: bool = False
     is_internet_facing: bool = False
-    handels_pii: bool = False
+    handles_pii: bool = False
     data_classification: str = "Public"
     trust_level: str = "Low"
 
@@ -83,7 +93,7 @@ class ElementSecurityProperties:
         if not self.has_encrypted_transit: score +=1
         if not self.has_input_validation: score += 3
         if self.is_internet_facing: score += 2
-        if self.handels_pii: score += 2
+        if self.handles_pii: score += 2
         if self.data_classification in ["Confidential", "Restricted"]: score +=1
         return min(score, 10)
 
@@ -117,8 +127,8 @@ class BuiltInThreatEngine:
                 threats.append(threat)
         return threats
     
-    def create_threat(self, element_name: str, element_type: ElementType, threat_type: ThreatType, security_props: ElementSecurityProperties) -> Optional[ThreatInfo]:
-        threat_id = f"T{hash(f'{element_name}{threat_type.value}')%1000:03d}"
+    def _create_threat(self, element_name: str, element_type: ElementType, threat_type: ThreatType, security_props: ElementSecurityProperties) -> Optional[ThreatInfo]:
+        threat_id = f"T{stable_hash(f'{element_name}{threat_type.value}')%1000:03d}"
         severity = self._calculate_severity(threat_type, security_props)
         description, condition = self._get_threat_details(element_type, threat_type, security_props)
         mitigations = self._get_mitigations(threat_type, element_type)
@@ -137,7 +147,7 @@ class BuiltInThreatEngine:
             mitigations=mitigations,
         )
     
-    def calculate_severity(self, threat_type:ThreatType, security_props: ElementSecurityProperties) -> str:
+    def _calculate_severity(self, threat_type:ThreatType, security_props: ElementSecurityProperties) -> str:
         base_severity = {
             ThreatType.spoofing: 2,
             ThreatType.tampering: 3,
@@ -167,7 +177,7 @@ class BuiltInThreatEngine:
         else:
             return SeverityLevel.low.value
     
-    def calculate_likelihood(self, threat_type: ThreatType, security_props: ElementSecurityProperties) -> str:
+    def _calculate_likelihood(self, threat_type: ThreatType, security_props: ElementSecurityProperties) -> str:
         if security_props.is_internet_facing:
             return "High"
         elif security_props.get_risk_score() >= 6:
@@ -175,7 +185,7 @@ class BuiltInThreatEngine:
         else:
             return "Low"
     
-    def calculate_impact(self, threat_type: ThreatType, security_props: ElementSecurityProperties) -> str:
+    def _calculate_impact(self, threat_type: ThreatType, security_props: ElementSecurityProperties) -> str:
         if security_props.handles_pii or security_props.data_classification in ["Confidential", "Restricted"]:
             return "High"
         elif threat_type in [ThreatType.information_disclosure, ThreatType.elevation_of_privilege]:
@@ -183,22 +193,22 @@ class BuiltInThreatEngine:
         else:
             return "Low"
     
-    def get_threat_details(self, element_type: ElementType, threat_type: ThreatType, security_props: ElementSecurityProperties) -> Tuple[str, str]:
+    def _get_threat_details(self, element_type: ElementType, threat_type: ThreatType, security_props: ElementSecurityProperties) -> Tuple[str, str]:
         descriptions = {
             (ElementType.actor, ThreatType.spoofing): (
                 "An attacker could impersonate this user or system!",
                 "No strong authentication mechanism is in place."
             ),
             (ElementType.process, ThreatType.tampering): (
-                "Process data or code could be modified by an attacker!"
+                "Process data or code could be modified by an attacker!",
                 "Insufficient integrity protection mechanisms."
             ),
             (ElementType.datastore, ThreatType.information_disclosure): (
-                "Sensitive data could be accessed by unauthorized parties!"
+                "Sensitive data could be accessed by unauthorized parties!",
                 "Inadequate acess controls or encryption."
             ),
             (ElementType.server, ThreatType.denial_of_service): (
-                "Server availability could be comprised by resource exhaustion!"
+                "Server availability could be comprised by resource exhaustion!",
                 "No rate limiting or DDoS protection is in place."
             )
         }
@@ -209,7 +219,7 @@ class BuiltInThreatEngine:
         generic_descriptions = {
             ThreatType.spoofing: (
                 f"Identity spoofing attack against {element_type.value}.",
-                "eak or missing authentication controls."
+                "Weak or missing authentication controls."
             ),
             ThreatType.tampering: (
                 f"Data or system tampering attack against {element_type.value}.",
@@ -220,7 +230,7 @@ class BuiltInThreatEngine:
                 "Inadequate logging and audit trails."
             ),
             ThreatType.information_disclosure: (
-                f"Sensitive information could be exposed from {element_type.value}."
+                f"Sensitive information could be exposed from {element_type.value}.",
                 "Weak access controls or encryption."
             ),
             ThreatType.denial_of_service: (
@@ -233,7 +243,7 @@ class BuiltInThreatEngine:
             )
         }
         return generic_descriptions.get(threat_type, ("Unknown Threat", "Unknown condition"))
-    def get_mitigations(self, threat_type: ThreatType, element_type: ElementType) -> List[str]:
+    def _get_mitigations(self, threat_type: ThreatType, element_type: ElementType) -> List[str]:
         mitigations = {
             ThreatType.spoofing: [
                 "Implement strong authentication (multi-factor preferred)",
@@ -284,11 +294,12 @@ class ThreatModel:
         self.logger = getLogger("threat_model")
         self.shapes = []
         self.connectors = []
+        self.members = set() # shapes/connectors already added, list lookups are O(n)
         self.threats = []
         self.created_at = datetime.now()
         self.builtin_engine = BuiltInThreatEngine()
         self.pytm_integration = None
-        if pytm_available:
+        if PYTM_AVAILABLE:
             try:
                 self.pytm_integration = PyTMAdapter()
                 self.logger.info("PyTM integration enabled")
@@ -297,18 +308,21 @@ class ThreatModel:
     @gui_safe_execute
     def add_shape(self, shape):
         with erorrHandler("add shape to threat model", self.logger):
-            if shape not in self.shapes:
+            if shape not in self.members:
+                self.members.add(shape)
                 self.shapes.append(shape)
                 self.logger.debug(f"Added shape: {getattr(shape, 'label', 'unlabeled')}")
     @gui_safe_execute
     def add_connector(self, connector):
         with erorrHandler("add connector to threat model", self.logger):
-            if connector not in self.connectors:
+            if connector not in self.members:
+                self.members.add(connector)
                 self.connectors.append(connector)
                 self.logger.debug("Added connector")
     @gui_safe_execute
-    def extract_security_propertiess(self, shape) -> ElementSecurityProperties:
-        metadata = getattr(shape, 'metadata', {})
+    def extract_security_properties(self, shape) -> ElementSecurityProperties:
+        # read_metadata doesn't leave every shape's metadata decoded in memory
+        metadata = shape.read_metadata() if hasattr(shape, 'read_metadata') else getattr(shape, 'metadata', {})
         security = metadata.get('security', {})
         technical = metadata.get('technical', {})
         trust = metadata.get('trust', {})
@@ -321,7 +335,7 @@ class ThreatModel:
             has_input_validation=trust.get('logging_enabled', False),
             has_monitoring=trust.get('monitoring_enabled', False),
             is_internet_facing=trust.get('network_zone', '')== 'Internet',
-            handels_pii=security.get('data_classification', 'Public') in ['Confidential', 'Restricted'],
+            handles_pii=security.get('data_classification', 'Public') in ['Confidential', 'Restricted'],
             data_classification=security.get('data_classification', 'Public'),
             trust_level=trust.get('trust_level', 'Low'),
         )
@@ -340,8 +354,8 @@ class ThreatModel:
            # built in type shit
             if not self.threats:  ##
                 for shape in self.shapes:
-                    element_name = getattr(shape, 'label', f'Element_{id(shape)}')
-                    element_type = getattr(shape, 'shape_subtype', getattr(shape, 'item_type', 'process'))
+                    element_name = getattr(shape, 'label', None) or f"Element_{getattr(shape, 'element_id', id(shape))}"
+                    element_type = element_type_for(getattr(shape, 'shape_subtype', None) or getattr(shape, 'item_type', None) or 'process')
                     security_props = self.extract_security_properties(shape)
                     shape_threats = self.builtin_engine.analyze_element(element_name, element_type, security_props)
                     self.threats.extend(shape_threats)
@@ -362,7 +376,7 @@ class ThreatModel:
                     connector_metadata = getattr(connector, 'metadata', {})
                     if not connector_metadata.get('encrypted', False):
                         threat = ThreatInfo(
-                            id=f"DF{hash(f'{start_name}{end_name}') % 1000:03d}",
+                            id=f"DF{stable_hash(f'{start_name}{end_name}') % 1000:03d}",
                             element_name=f"{start_name} -> {end_name}",
                             element_type="dataflow",
                             threat_type="Information Disclosure",
@@ -1,38 +1,73 @@
-from PyQt6.QtWidgets import (QMainWindow, QGraphicsView, QGraphicsScene, QDockWidget, QInputDialog, QSplitter, QFileDialog, QMessageBox)
-from PyQt6.QtGui import QBrush, QColor, QPixmap, QPainter, QPen
-from PyQt6.QtCore import Qt, QRectF, QPointF
-from PyQt6.QtPrintSupport import QPrinter
-from PyQt6.QtSvg import QSvgGenerator
+from PyQt6.QtWidgets import (QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsItem, QDockWidget, QInputDialog, QSplitter, QFileDialog, QMessageBox, QProgressBar, QRubberBand, QApplication)
+from PyQt6.QtGui import QBrush, QColor, QPixmap, QPainter, QPen, QPixmapCache
+from PyQt6.QtCore import Qt, QRectF, QPointF, QRect, QEvent, QTimer
 from metadata import MetadataPanel
 from models.threat_model import create_threat_model_from_shapes, quick_threat_analysis
 import math
 
 from models.shape_item import ShapeItem
+from models.shape_types import shape_type
 from models.connector_item import ConnectorItem, ConnectorManager
 from ui.toolbar import ToolbarManager
+from ui.minimap import Minimap
 from utils.file_manager import FileManager
-from config import (BACKGROUND_COLOR, GRID_COLOR, GRID_SIZE, DEFAULT_SHAPE_WIDTH, DEFAULT_CIRCLE_SIZE, DEFAULT_SHAPE_HEIGHT
+from utils.spatial_index import SpatialIndex
+from utils.diagram_export import export_raster, record_scene, write_svg, write_pdf
+from utils.batch_export import ExportJob, run_export_job
+from utils.diagram_io import DIAGRAM_FILE_FILTER
+from config import (BACKGROUND_COLOR, GRID_COLOR, GRID_SIZE, DEFAULT_SHAPE_WIDTH, DEFAULT_CIRCLE_SIZE, DEFAULT_SHAPE_HEIGHT,
+    VIEWPORT_UPDATE_MODE, ITEM_CACHE_MODE, ITEM_CACHE_LIMIT_KB, SCENE_MIN_RECT, SCENE_MARGIN, SCENE_GROW_STEP,
+    BSP_TREE_DEPTH, CONTENT_MARGIN, EXPORT_PADDING, EXPORT_DPI, EXPORT_SCALE, EXPORT_FORMATS, SAVE_DIR
 )
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+VIEWPORT_UPDATE_MODES = {
+    "minimal": QGraphicsView.ViewportUpdateMode.MinimalViewportUpdate, # just the dirty item rects
+    "bounding-rect": QGraphicsView.ViewportUpdateMode.BoundingRectViewportUpdate, # one rect around all of them
+    "smart": QGraphicsView.ViewportUpdateMode.SmartViewportUpdate, # Qt picks per frame
+    "full": QGraphicsView.ViewportUpdateMode.FullViewportUpdate, # whole viewport every time
+}
+
+# Item render caches. Cached items only run paint() when they call update()
+# or change geometry. "item" keeps one pixmap per item at its logical size
+# (cheap zooming, blurry when zoomed in, no level of detail), "device" caches
+# what's on screen and re-renders on zoom but makes panning cheap.
+ITEM_CACHE_MODES = {
+    "off": QGraphicsItem.CacheMode.NoCache,
+    "item": QGraphicsItem.CacheMode.ItemCoordinateCache,
+    "device": QGraphicsItem.CacheMode.DeviceCoordinateCache,
+}
+
 class DiagramEditor(QMainWindow):
     def __init__(self):
         super().__init__()
         
         self.scene = QGraphicsScene()
-        #coordinates
-        self.scene_width = 2000
-        self.scene_height = 1500 
-        self.scene.setSceneRect(-self.scene_width//2, -self.scene_height//2, self.scene_width, self.scene_height)        
+        self.scene.setBspTreeDepth(BSP_TREE_DEPTH)
         self.view = QGraphicsView(self.scene)
-        self.view.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+        self.viewport_update_mode = None
+        self.set_viewport_update_mode(VIEWPORT_UPDATE_MODE)
+        self.spatial_index = SpatialIndex() # shapes keep themselves in here, see ShapeItem.itemChange
+        #coordinates, the scene rect follows the diagram's bounds
+        self.scene_rect_timer = QTimer(self)
+        self.scene_rect_timer.setSingleShot(True)
+        self.scene_rect_timer.setInterval(0) # once per event loop pass, however many items moved
+        self.scene_rect_timer.timeout.connect(self.update_scene_rect)
+        self.spatial_index.changed = self.scene_rect_timer.start
+        self.update_scene_rect()
+        self.rubber_band = None
+        self.rubber_band_origin = None
         self.toolbar_manager = ToolbarManager(self)
         self.file_manager = FileManager(self)
-        self.connector_manager = ConnectorManager(self.scene)
+        self.connector_manager = ConnectorManager(self.scene, self.spatial_index) # elbows route around the indexed shapes
         self.grid_snapping_enabled = False
         self.shapes = []
         self.connectors = []
+        self.item_cache_mode = "off"
+        self.set_item_cache_mode(ITEM_CACHE_MODE)
+        self.export_dpi = EXPORT_DPI
+        self.export_scale = EXPORT_SCALE
         self.current_tool = "select"
         self.pending_connector = None
         self.grid_enabled = True
@@ -50,6 +85,8 @@ class DiagramEditor(QMainWindow):
         self.toolbar_manager.create_toolbar()
         self.setup_top_toolbar()
         self.setup_metadata_panel()
+        self.setup_minimap()
+        self.setup_status_bar()
 
     def setup_main_layout(self):
        from ui.shape_palette import ShapePalette
@@ -83,16 +120,22 @@ class DiagramEditor(QMainWindow):
         top_toolbar.setMovable(True)
         save_action = top_toolbar.addAction("💾 Save")
         save_action.triggered.connect(self.file_manager.save_diagram)
+        save_as_action = top_toolbar.addAction("💾 Save As")
+        save_as_action.triggered.connect(self.file_manager.save_diagram_as)
         load_action = top_toolbar.addAction("📁 Load")
         load_action.triggered.connect(self.file_manager.load_diagram)
         export_action = top_toolbar.addAction("📤 Export")
         export_action.triggered.connect(self.export_diagram)
+        batch_export_action = top_toolbar.addAction("📦 Batch Export")
+        batch_export_action.triggered.connect(self.batch_export)
         grid_action = top_toolbar.addAction("🌐 Grid")
         grid_action.triggered.connect(self.toggle_grid)
         snap_action = top_toolbar.addAction("🫰 Snap")
         snap_action.triggered.connect(self.toggle_grid_snapping)
         props_action = top_toolbar.addAction("🤔 Properties")
         props_action.triggered.connect(self.toolbar_manager.toggle_properties_panel)
+        minimap_action = top_toolbar.addAction("🗺️ Overview")
+        minimap_action.triggered.connect(self.toolbar_manager.toggle_minimap)
 
     def setup_metadata_panel(self):
         self.meta_panel = MetadataPanel(self)
@@ -107,8 +150,29 @@ class DiagramEditor(QMainWindow):
         self.properties_dock = dock
         dock.setVisible(False)
 
+    def setup_minimap(self):
+        self.minimap = Minimap(self.view, self)
+        dock = QDockWidget("Overview", self)
+        dock.setWidget(self.minimap)
+        dock.setFeatures(QDockWidget.DockWidgetFeature.DockWidgetMovable | QDockWidget.DockWidgetFeature.DockWidgetFloatable | QDockWidget.DockWidgetFeature.DockWidgetClosable)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, dock)
+        self.minimap_dock = dock
+
+    def setup_status_bar(self):
+        self.save_progress = QProgressBar()
+        self.save_progress.setRange(0, 100)
+        self.save_progress.setMaximumWidth(150)
+        self.save_progress.setVisible(False)
+        self.statusBar().addPermanentWidget(self.save_progress)
+
+    def closeEvent(self, event):
+        self.file_manager.wait_for_save() # don't kill a half written save
+        self.file_manager.autosave.shutdown()
+        super().closeEvent(event)
+
     def setup_connections(self):
         self.scene.selectionChanged.connect(self.on_selection_changed)
+        self.view.viewport().installEventFilter(self)
     
     def draw_grid_background(self):
         if self.grid_enabled:
@@ -124,6 +188,33 @@ class DiagramEditor(QMainWindow):
         else:
             self.view.setBackgroundBrush(QBrush(BACKGROUND_COLOR))
     
+    def set_viewport_update_mode(self, mode):
+        if mode not in VIEWPORT_UPDATE_MODES:
+            print(f"Unknown viewport update mode {mode}, using minimal")
+            mode = "minimal"
+        self.viewport_update_mode = mode
+        self.view.setViewportUpdateMode(VIEWPORT_UPDATE_MODES[mode])
+        self.view.viewport().update()
+
+    def set_item_cache_mode(self, mode):
+        if mode not in ITEM_CACHE_MODES:
+            print(f"Unknown item cache mode {mode}, using off")
+            mode = "off"
+        self.item_cache_mode = mode
+        if mode != "off" and QPixmapCache.cacheLimit() < ITEM_CACHE_LIMIT_KB:
+            QPixmapCache.setCacheLimit(ITEM_CACHE_LIMIT_KB)
+        for item in self.shapes + self.connectors:
+            self.apply_item_cache_mode(item)
+
+    def apply_item_cache_mode(self, item):
+        # items call this when they're added to the scene
+        mode = ITEM_CACHE_MODES[self.item_cache_mode]
+        if mode == QGraphicsItem.CacheMode.ItemCoordinateCache and isinstance(item, ConnectorItem):
+            # a connector's item pixmap covers its whole bounding rect, mostly
+            # empty and huge for long ones, so connectors cache at screen resolution
+            mode = QGraphicsItem.CacheMode.DeviceCoordinateCache
+        item.setCacheMode(mode)
+
     def toggle_grid(self):
         self.grid_enabled = not self.grid_enabled
         self.draw_grid_background()
@@ -183,18 +274,22 @@ class DiagramEditor(QMainWindow):
                 shape.metadata['basic'] = {}
             shape.metadata['basic']['modified'] = current_time
             self.meta_panel.modified_date_edit.setText(current_time)
+            if hasattr(shape, 'mark_dirty'):
+                shape.mark_dirty()
 
     def on_metadata_changed(self, metadata):
         if hasattr(self, 'selected_shape') and self.selected_shape:
             if not hasattr(self.selected_shape, 'metadata'):
                 self.selected_shape.metadata = {}
             self.selected_shape.metadata.update(metadata)
+            self.selected_shape.mark_dirty()
             print(f"Updated metadata for shape: {self.selected_shape}")
 
 
     def set_shape_label(self, text):
         if self.selected_shape:
             self.selected_shape.label = text
+            self.selected_shape.mark_dirty()
             self.selected_shape.update()
     
     def set_shape_description(self, text):
@@ -203,119 +298,131 @@ class DiagramEditor(QMainWindow):
     
 
 
+    def content_rect(self):
+        """Scene area the diagram covers, from the spatial index's bounds (no item scan)"""
+        bounds = self.spatial_index.bounds()
+        if bounds is None:
+            return QRectF()
+        left, top, right, bottom = bounds
+        return QRectF(left, top, right - left, bottom - top).adjusted(-CONTENT_MARGIN, -CONTENT_MARGIN, CONTENT_MARGIN, CONTENT_MARGIN)
+
+    def update_scene_rect(self):
+        rect = QRectF(*SCENE_MIN_RECT)
+        content = self.content_rect()
+        if not content.isNull():
+            step = SCENE_GROW_STEP
+            content = content.adjusted(-SCENE_MARGIN, -SCENE_MARGIN, SCENE_MARGIN, SCENE_MARGIN)
+            left = math.floor(content.left() / step) * step
+            top = math.floor(content.top() / step) * step
+            right = math.ceil(content.right() / step) * step
+            bottom = math.ceil(content.bottom() / step) * step
+            rect = rect.united(QRectF(left, top, right - left, bottom - top))
+        if rect != self.scene.sceneRect():
+            self.scene.setSceneRect(rect)
+
+    def zoom_to_fit(self):
+        rect = self.content_rect()
+        if not rect.isNull():
+            self.view.fitInView(rect, Qt.AspectRatioMode.KeepAspectRatio)
+
+    #Hit testing, goes through the spatial index instead of scanning the scene
+    def shape_at(self, pos):
+        """Topmost shape under a scene position, or None"""
+        best = None
+        for item in self.spatial_index.query_point(pos.x(), pos.y()): # newest first
+            if not item.isVisible() or not item.contains(item.mapFromScene(pos)):
+                continue
+            if best is None or item.zValue() > best.zValue():
+                best = item
+        return best
+
+    def shapes_in_rect(self, rect):
+        """Shapes whose hit area (see ShapeItem.shape) intersects a scene rect"""
+        hits = []
+        for item in self.spatial_index.query(rect.left(), rect.top(), rect.right(), rect.bottom()):
+            if item.isVisible() and item.mapToScene(item.shape()).intersects(rect):
+                hits.append(item)
+        return hits
+
+    def eventFilter(self, obj, event):
+        # rubber band selection on the view's viewport, select tool only
+        if obj is self.view.viewport():
+            if event.type() == QEvent.Type.MouseButtonPress:
+                self.start_rubber_band(event)
+            elif event.type() == QEvent.Type.MouseMove and self.rubber_band is not None:
+                if self.scene.mouseGrabberItem() is not None:
+                    self.cancel_rubber_band() # the press went to an item (a connector), it's not a band
+                else:
+                    self.rubber_band.setGeometry(QRect(self.rubber_band_origin, event.position().toPoint()).normalized())
+            elif event.type() == QEvent.Type.MouseButtonRelease and self.rubber_band is not None:
+                self.finish_rubber_band(event)
+        return super().eventFilter(obj, event)
+
+    def start_rubber_band(self, event):
+        if self.current_tool != "select" or event.button() != Qt.MouseButton.LeftButton:
+            return
+        point = event.position().toPoint()
+        if self.shape_at(self.view.mapToScene(point)) is not None:
+            return # pressing on a shape drags it
+        self.rubber_band_origin = point
+        if self.rubber_band is None:
+            self.rubber_band = QRubberBand(QRubberBand.Shape.Rectangle, self.view.viewport())
+        self.rubber_band.setGeometry(QRect(point, point))
+        self.rubber_band.show()
+
+    def cancel_rubber_band(self):
+        self.rubber_band.hide()
+        self.rubber_band = None
+
+    def finish_rubber_band(self, event):
+        band = QRect(self.rubber_band_origin, event.position().toPoint()).normalized()
+        self.cancel_rubber_band()
+        if band.width() < 3 and band.height() < 3:
+            return # just a click
+        rect = self.view.mapToScene(band).boundingRect()
+        hits = self.shapes_in_rect(rect)
+        keep = event.modifiers() & Qt.KeyboardModifier.ControlModifier
+        self.scene.blockSignals(True) # one selectionChanged at the end, not one per shape
+        try:
+            if not keep:
+                hit_set = set(hits)
+                for item in self.scene.selectedItems():
+                    if item not in hit_set:
+                        item.setSelected(False)
+            for item in hits:
+                item.setSelected(True)
+        finally:
+            self.scene.blockSignals(False)
+        self.on_selection_changed()
+
     #Mouse event stuff
+    def create_shape(self, tool_shape, pos):
+        """New shape of a registered type centred on pos"""
+        width, height = tool_shape.size
+        shape = ShapeItem(tool_shape.draws_as, pos.x() - width//2, pos.y() - height//2, width, height)
+        if tool_shape.color is not None:
+            shape.color = QColor(tool_shape.color)
+        if tool_shape.category is not None:
+            shape.shape_category = tool_shape.category
+            shape.shape_subtype = tool_shape.name
+        # No automatic label
+        self.scene.addItem(shape)
+        self.shapes.append(shape)
+        self.update_metadata(shape)
+        return shape
+
     def mousePressEvent(self, event):
         print(f"Mouse pressed! Current tool: {self.current_tool}")
         if event.button() == Qt.MouseButton.LeftButton:
             view_pos = self.view.mapFromParent(event.pos())
             pos = self.view.mapToScene(view_pos)
+            item = self.shape_at(pos) # hit test where the user clicked, not the snapped point
             if self.grid_snapping_enabled:
                 pos = self.snap_to_grid(pos)
-            item = self.scene.itemAt(pos, self.view.transform())
-            print(f"Raw item at position: {item}")
-            all_items = self.scene.items(pos)
-            print(f"All items at position: {all_items}")
-
-            if hasattr(item, 'parentItem') and item.parentItem():
-                item = item.parentItem()
-                print(f"Using parent item instead: {item}")
-            
-            threat_modeling_shapes = {
-                "user": ("circle", 80,80, QColor(135, 206, 250)),
-                "process": ("rect", 100, 60, QColor(144, 238, 144)),
-                "datastore": ("rect", 120, 40, QColor(255, 182, 193)),
-                "external": ("rect", 90, 70, QColor(255, 255, 224)),
-                "threat": ("diamond", 80, 80, QColor(255, 99, 71)),
-                "boundary": ("rect", 150, 100, QColor(211, 211, 211)),
-                "decision": ("diamond", 70, 70, QColor(255, 215, 0)),
-                "decision": ("diamond", 70, 70, QColor(255, 215, 0)),  # Fix typo
-                "network": ("hexagon", 90, 90, QColor(175, 238, 238)),
-                "server": ("rect", 90, 70, QColor(152, 251, 152)),
-                "database": ("rect", 100, 60, QColor(255, 182, 193)),
-            }
-
-            if self.current_tool in threat_modeling_shapes:
-                shape_type, width, height, color = threat_modeling_shapes[self.current_tool]
-                shape = ShapeItem(shape_type, pos.x() - width//2, pos.y() - height//2, width, height)
-                shape.color = color
-                shape.shape_category = getattr(self, 'current category', 'threat_modeling')
-                shape.shape_subtype = self.current_tool
-                # No automatic label
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-                # 
-            elif self.current_tool == "rect":
-                shape = ShapeItem("rect", pos.x() - 50, pos.y() - 30, 100, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "circle":
-                shape = ShapeItem("circle", pos.x() - 30, pos.y() - 30, 60, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "diamond":
-                shape = ShapeItem("diamond", pos.x() - 40, pos.y() - 40, 80, 80)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "hexagon":
-                shape = ShapeItem("hexagon", pos.x() - 45, pos.y() - 45, 90, 90)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "triangle":
-                shape = ShapeItem("triangle", pos.x() - 40, pos.y() - 40, 80, 80)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "star":
-                shape = ShapeItem("star", pos.x() - 45, pos.y() - 45, 90, 90)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "arrow":
-                shape = ShapeItem("arrow", pos.x() - 50, pos.y() - 30, 100, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "cloud":
-                shape = ShapeItem("cloud", pos.x() - 60, pos.y() - 40, 120, 80)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "cylinder":
-                shape = ShapeItem("cylinder", pos.x() - 50, pos.y() - 40, 100, 80)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            # Flow et UML shapes
-            elif self.current_tool == "start_end":
-                shape = ShapeItem("start_end", pos.x() - 40, pos.y() - 25, 80, 50)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "document":
-                shape = ShapeItem("document", pos.x() - 50, pos.y() - 35, 100, 70)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "data":
-                shape = ShapeItem("data", pos.x() - 45, pos.y() - 30, 90, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "manual_input":
-                shape = ShapeItem("manual_input", pos.x() - 50, pos.y() - 30, 100, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
-            elif self.current_tool == "predefined":
-                shape = ShapeItem("predefined", pos.x() - 55, pos.y() - 30, 110, 60)
-                self.scene.addItem(shape)
-                self.shapes.append(shape)
-                self.update_metadata(shape)
+
+            tool_shape = shape_type(self.current_tool)
+            if tool_shape is not None:
+                self.create_shape(tool_shape, pos)
             elif self.current_tool == "connector":
                 print(f"In connector mode, item clicked: {item}, type: {type(item)}")
                 if isinstance(item, ShapeItem):
@@ -354,20 +461,30 @@ class DiagramEditor(QMainWindow):
                 text, ok = QInputDialog.getText(self, "Enter Label", "Label:")
                 if ok and text:
                     shape.label = text
+                    if hasattr(shape, 'mark_dirty'):
+                        shape.mark_dirty()
                     shape.update()
         if event.key() == Qt.Key.Key_Delete:
             for item in self.scene.selectedItems():
+                if item.scene() is None:
+                    continue # a connector that went with its shape
                 self.scene.removeItem(item)
                 if isinstance(item, ShapeItem):
                     self.shapes.remove(item)
+                    removed = set(self.connector_manager.remove_connectors_for_shape(item)) # don't leave them dangling
+                    if removed:
+                        self.connectors[:] = [conn for conn in self.connectors if conn not in removed]
                 elif isinstance(item, ConnectorItem):
                     self.connectors.remove(item)
+                    self.connector_manager.remove_connector(item)
         super().keyPressEvent(event)
     def export_diagram(self):
         file_path, file_filter = QFileDialog.getSaveFileName(
-            self, "Export Diagram", "threat_model", "PNG Image (*.png);SVG Vector (*.svg);PDF Document (*.pdf);JPEG Image (*.jpg)"
+            self, "Export Diagram", "threat_model", "PNG Image (*.png);;SVG Vector (*.svg);;PDF Document (*.pdf);;JPEG Image (*.jpg)"
         )
         if file_path:
+            if '.' not in os.path.basename(file_path) and "(*." in file_filter:
+                file_path += file_filter[file_filter.index("(*.") + 2:-1] # "PNG Image (*.png)" -> ".png"
             try:
                 file_ext = file_path.split('.') [-1].lower()
                 if file_ext == 'png':
@@ -385,59 +502,55 @@ class DiagramEditor(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Error!!", f"Failed to export diagam:\n{str(e)}!!!")
     
+    def batch_export(self):
+        diagrams, _ = QFileDialog.getOpenFileNames(self, "Batch Export", SAVE_DIR, DIAGRAM_FILE_FILTER)
+        if not diagrams:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Export To", os.path.dirname(diagrams[0]))
+        if not output_dir:
+            return
+        job = ExportJob(diagrams, list(EXPORT_FORMATS), output_dir, self.export_scale, self.export_dpi)
+        self.statusBar().showMessage(f"Exporting {len(diagrams)} diagrams...")
+        try:
+            results = run_export_job(job, self.on_batch_export_progress)
+        finally:
+            self.save_progress.setVisible(False)
+            self.statusBar().clearMessage()
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            errors = "\n".join(error for r in failed for error in r["errors"])
+            QMessageBox.warning(self, "Export finished", f"{len(failed)} of {len(results)} diagrams failed:\n{errors}")
+        else:
+            QMessageBox.information(self, "Export finished!", f"Exported {len(results)} diagrams to {output_dir}")
+
+    def on_batch_export_progress(self, done, total):
+        self.save_progress.setVisible(True)
+        self.save_progress.setValue(int(100 * done / max(total, 1)))
+        QApplication.processEvents() # recording runs on this thread, keep the window painting
+
+    def export_rect(self):
+        return self.content_rect().adjusted(-EXPORT_PADDING, -EXPORT_PADDING, EXPORT_PADDING, EXPORT_PADDING)
+
     def export_to_png(self, file_path):
-        scene_rect = self.scene.itemsBoundingRect()
-        padding = 20
-        export_rect = scene_rect.adjusted(-padding, -padding, padding, padding)
-        pixmap = QPixmap(int(export_rect.width()), int(export_rect.height()))
-        pixmap.fill()
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        self.scene.render(painter, QRectF(), export_rect)
-        painter.end()
-        pixmap.save(file_path, "PNG")
+        export_raster(self.scene, self.export_rect(), file_path, self.export_scale, self.export_dpi)
 
     def export_to_jpg(self, file_path):
-        scene_rect = self.scene.itemsBoundingRect()
-        padding = 20
-        export_rect = scene_rect.adjusted(-padding, -padding, padding, padding)
-        pixmap = QPixmap(int(export_rect.width()), int(export_rect.height()))
-        pixmap.fill()
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        self.scene.render(painter, QRectF(), export_rect)
-        painter.end()
-        pixmap.save(file_path, "JPG")
-    
+        export_raster(self.scene, self.export_rect(), file_path, self.export_scale, self.export_dpi)
 
-    def export_to_svg(self, file_path):
-        scene_rect = self.scene.itemsBoundingRect()
-        padding = 20
-        export_rect = scene_rect.adjusted(-padding, -padding, padding, padding)
-        svg_gen = QSvgGenerator()
-        svg_gen.setFileName(file_path)
-        svg_gen.setSize(export_rect.size().toSize())
-        svg_gen.setViewBox(QRectF(0, 0, export_rect.width(), export_rect.height()))
-        svg_gen = QSvgGenerator()
-        painter = QPainter(svg_gen)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        self.scene.render(painter, QRectF(), export_rect)
-        painter.end()
+    def set_export_dpi(self, dpi):
+        self.export_dpi = dpi
 
+    def set_export_scale(self, scale):
+        self.export_scale = scale
+
+    def export_to_svg(self, file_path):
+        export_rect = self.export_rect()
+        write_svg(file_path, record_scene(self.scene, export_rect), export_rect.size())
 
     def export_to_pdf(self, file_path):
-        scene_rect = self.scene.itemsBoundingRect()
-        padding = 20
-        export_rect = scene_rect.adjusted(-padding, -padding, padding, padding)
-        printer = QPrinter(QPrinter.PrinterMode.HighResolution)
-        printer.setOutputFormat(QPrinter.OutputFormat.PdfFormat)
-        printer.setOutputFileName(file_path)
-        printer.setPageSize(QPrinter.PageSize.A4)
-        painter = QPainter(printer)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        self.scene.render(painter)
-        painter.end()
-    
+        export_rect = self.export_rect()
+        write_pdf(file_path, record_scene(self.scene, export_rect), export_rect.size())
+
     def run_threat_analysis(self):
         threats, summary = quick_threat_analysis(self.shapes, self.connectors)
         self.threats_panel.update_threats(threats)
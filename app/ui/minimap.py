@@ -0,0 +1,144 @@
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QRectF, QRect, QPointF, QTimer
+from PyQt6.QtGui import QImage, QPainter, QPen, QColor
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import BACKGROUND_COLOR, MINIMAP_UPDATE_MS, MINIMAP_MAX_DIRTY_RECTS, MINIMAP_VIEWPORT_COLOR
+
+# Overview of the whole scene with the view's visible area on top. The scene
+# is painted once into a small image, after that only the regions the scene
+# reports as changed are repainted into it, so editing costs a few tiny
+# renders every MINIMAP_UPDATE_MS. The whole image is only redrawn when the
+# scene rect changes (in SCENE_GROW_STEP steps) or the minimap is resized.
+
+class Minimap(QWidget):
+    def __init__(self, view, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.scene = view.scene()
+        self.image = None
+        self.image_rect = QRectF() # where the image sits in the widget
+        self.scale = 1.0 # image pixels per scene unit
+        self.dirty = []
+        self.dragging = False
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(MINIMAP_UPDATE_MS) # a drag repaints the image a few times a second, not every frame
+        self.update_timer.timeout.connect(self.flush_dirty)
+        self.setMinimumSize(160, 120)
+
+        self.scene.changed.connect(self.on_scene_changed)
+        self.scene.sceneRectChanged.connect(self.invalidate)
+        # the viewport rect moves with scrolling and zooming
+        for bar in (view.horizontalScrollBar(), view.verticalScrollBar()):
+            bar.valueChanged.connect(self.update)
+            bar.rangeChanged.connect(self.update)
+
+    def invalidate(self, *args):
+        """Throw the image away, it's redrawn from the whole scene on the next paint"""
+        self.image = None
+        self.dirty = []
+        self.update()
+
+    #mapping between the scene and the image
+    def layout_image(self):
+        scene_rect = self.scene.sceneRect()
+        if scene_rect.isEmpty():
+            return False
+        self.scale = min(self.width() / scene_rect.width(), self.height() / scene_rect.height())
+        w = max(1, int(scene_rect.width() * self.scale))
+        h = max(1, int(scene_rect.height() * self.scale))
+        self.image_rect = QRectF((self.width() - w) / 2, (self.height() - h) / 2, w, h)
+        self.image = QImage(w, h, QImage.Format.Format_RGB32)
+        self.render_region(QRect(0, 0, w, h))
+        return True
+
+    def to_image(self, rect):
+        """Image pixels covering a scene rect, rounded outwards"""
+        origin = self.scene.sceneRect().topLeft()
+        left = int((rect.left() - origin.x()) * self.scale) - 1
+        top = int((rect.top() - origin.y()) * self.scale) - 1
+        right = int((rect.right() - origin.x()) * self.scale) + 2
+        bottom = int((rect.bottom() - origin.y()) * self.scale) + 2
+        return QRect(left, top, right - left, bottom - top).intersected(self.image.rect())
+
+    def to_scene(self, pixels):
+        origin = self.scene.sceneRect().topLeft()
+        return QRectF(origin.x() + pixels.x() / self.scale, origin.y() + pixels.y() / self.scale,
+                      pixels.width() / self.scale, pixels.height() / self.scale)
+
+    def render_region(self, pixels):
+        if pixels.isEmpty():
+            return
+        painter = QPainter(self.image)
+        painter.setClipRect(pixels)
+        painter.fillRect(pixels, BACKGROUND_COLOR) # the scene has no background of its own, the grid lives on the view
+        self.scene.render(painter, QRectF(pixels), self.to_scene(pixels), Qt.AspectRatioMode.IgnoreAspectRatio)
+        painter.end()
+
+    #incremental updates
+    def on_scene_changed(self, regions):
+        if self.image is None or not self.isVisible():
+            return # redrawn in full when it's next shown
+        self.dirty.extend(regions)
+        if not self.update_timer.isActive():
+            self.update_timer.start()
+
+    def flush_dirty(self):
+        if self.image is None:
+            return
+        dirty = self.dirty
+        self.dirty = []
+        if len(dirty) > MINIMAP_MAX_DIRTY_RECTS:
+            # lots of small changes, one render of what they cover is cheaper
+            bounds = QRectF()
+            for rect in dirty:
+                bounds = bounds.united(rect)
+            dirty = [bounds]
+        for rect in dirty:
+            self.render_region(self.to_image(rect))
+        self.update()
+
+    def showEvent(self, event):
+        self.invalidate() # changes made while hidden weren't tracked
+        super().showEvent(event)
+
+    def resizeEvent(self, event):
+        self.invalidate()
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND_COLOR)
+        if self.image is None and not self.layout_image():
+            return
+        painter.drawImage(self.image_rect.topLeft(), self.image)
+        visible = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        origin = self.scene.sceneRect().topLeft()
+        frame = QRectF(self.image_rect.x() + (visible.x() - origin.x()) * self.scale,
+                       self.image_rect.y() + (visible.y() - origin.y()) * self.scale,
+                       visible.width() * self.scale, visible.height() * self.scale)
+        painter.setPen(QPen(MINIMAP_VIEWPORT_COLOR, 1))
+        painter.setBrush(QColor(MINIMAP_VIEWPORT_COLOR.red(), MINIMAP_VIEWPORT_COLOR.green(), MINIMAP_VIEWPORT_COLOR.blue(), 40))
+        painter.drawRect(frame.intersected(self.image_rect))
+        painter.end()
+
+    #click or drag to move the view
+    def center_view(self, pos):
+        if self.image is None:
+            return
+        origin = self.scene.sceneRect().topLeft()
+        self.view.centerOn(QPointF(origin.x() + (pos.x() - self.image_rect.x()) / self.scale,
+                                   origin.y() + (pos.y() - self.image_rect.y()) / self.scale))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.dragging = True
+            self.center_view(event.position())
+
+    def mouseMoveEvent(self, event):
+        if self.dragging:
+            self.center_view(event.position())
+
+    def mouseReleaseEvent(self, event):
+        self.dragging = False
@@ -1,6 +1,7 @@
-from PyQt6.QtWidgets import (QToolBar, QLabel, QVBoxLayout, QWidget, QComboBox, QScrollArea, QPushButton, QHBoxLayout, QGroupBox, QCheckBox, QSpinBox, QTabWidget)
+from PyQt6.QtWidgets import (QToolBar, QLabel, QVBoxLayout, QWidget, QComboBox, QScrollArea, QPushButton, QHBoxLayout, QGroupBox, QCheckBox, QSpinBox, QDoubleSpinBox, QTabWidget)
 from PyQt6.QtGui import QActionGroup
 from PyQt6.QtCore import Qt
+from models.shape_types import shape_types
 
 class CollapsibleGroupBox(QGroupBox):
     def __init__(self, title="", parent=None):
@@ -79,6 +80,15 @@ class ToolbarManager:
                 ]
             }
         }
+        self.add_shape_pack_tools()
+
+    def add_shape_pack_tools(self):
+        # types registered by shape packs get a tool in their palette category
+        for pack_type in shape_types():
+            if pack_type.palette is None or self.find_tool_info(pack_type.name) is not None:
+                continue
+            category = self.shape_categories.setdefault(pack_type.palette, {"description": "Shape pack", "tools": []})
+            category["tools"].append((pack_type.name, pack_type.label, pack_type.icon, pack_type.description))
 
     def create_toolbar(self): # FATHER TOOLBAR BESTOW ONTO ME, SO THAT YOU MAY VANQUISH MY SINS
         toolbar_widget = QWidget()
@@ -275,14 +285,19 @@ class ToolbarManager:
         action_groups = {
             "File Operations": [
                 ("💾", "Save Diagram", self.main_window.file_manager.save_diagram),
+                ("💾", "Save Diagram As", self.main_window.file_manager.save_diagram_as),
                 ("📁", "Load Diagram", self.main_window.file_manager.load_diagram),
+                ("🗄", "Save to Repository", self.main_window.file_manager.save_to_store),
+                ("🗄", "Load from Repository", self.main_window.file_manager.load_from_store),
                 ("📤", "Export Diagram", self.main_window.export_diagram),
+                ("📦", "Batch Export", self.main_window.batch_export),
             ],
             "View Controls": [
                 ("🔍", "Zoom Fit", self.zoom_to_fit),
                 ("🌐", "Toggle Grid", self.main_window.toggle_grid),
                 ("🫰", "Toggle Snapping", self.main_window.toggle_grid_snapping),
                 ("🤔", "Shape Properties", self.toggle_properties_panel),
+                ("🗺️", "Overview", self.toggle_minimap),
             ],
             "Analysis": [
                 ("💥", "Clear All", self.clear_diagram),
@@ -345,6 +360,57 @@ class ToolbarManager:
         ui_layout.addWidget(show_tooltips)
         
         layout.addWidget(ui_group)
+
+        render_group = CollapsibleGroupBox("Rendering")
+        render_layout = QVBoxLayout(render_group)
+
+        update_layout = QHBoxLayout()
+        update_layout.addWidget(QLabel("Repaint:"))
+        update_combo = QComboBox()
+        update_combo.addItems(["minimal", "bounding-rect", "smart", "full"])
+        update_combo.setCurrentText(getattr(self.main_window, 'viewport_update_mode', None) or "minimal")
+        update_combo.setToolTip("How much of the view is redrawn when something changes")
+        update_combo.currentTextChanged.connect(self.main_window.set_viewport_update_mode)
+        update_layout.addWidget(update_combo)
+        render_layout.addLayout(update_layout)
+
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(QLabel("Item cache:"))
+        cache_combo = QComboBox()
+        cache_combo.addItems(["off", "item", "device"])
+        cache_combo.setCurrentText(getattr(self.main_window, 'item_cache_mode', None) or "off")
+        cache_combo.setToolTip("Keep rendered shapes and connectors as pixmaps between repaints")
+        cache_combo.currentTextChanged.connect(self.main_window.set_item_cache_mode)
+        cache_layout.addWidget(cache_combo)
+        render_layout.addLayout(cache_layout)
+
+        layout.addWidget(render_group)
+
+        export_group = CollapsibleGroupBox("Export")
+        export_layout = QVBoxLayout(export_group)
+
+        dpi_layout = QHBoxLayout()
+        dpi_layout.addWidget(QLabel("DPI:"))
+        dpi_spin = QSpinBox()
+        dpi_spin.setRange(24, 1200)
+        dpi_spin.setValue(getattr(self.main_window, 'export_dpi', 96))
+        dpi_spin.setToolTip("PNG/JPEG resolution, 96 is one pixel per diagram unit")
+        dpi_spin.valueChanged.connect(self.main_window.set_export_dpi)
+        dpi_layout.addWidget(dpi_spin)
+        export_layout.addLayout(dpi_layout)
+
+        scale_layout = QHBoxLayout()
+        scale_layout.addWidget(QLabel("Scale:"))
+        scale_spin = QDoubleSpinBox()
+        scale_spin.setRange(0.1, 10.0)
+        scale_spin.setSingleStep(0.25)
+        scale_spin.setValue(getattr(self.main_window, 'export_scale', 1.0))
+        scale_spin.setToolTip("Size of exported images relative to the diagram")
+        scale_spin.valueChanged.connect(self.main_window.set_export_scale)
+        scale_layout.addWidget(scale_spin)
+        export_layout.addLayout(scale_layout)
+
+        layout.addWidget(export_group)
     
     def select_tool(self, tool_id, button):
         for child in self.toolbar.findChildren(QPushButton):
@@ -444,12 +510,14 @@ class ToolbarManager:
             dock = self.main_window.properties_dock
             dock.setVisible(not dock.isVisible())
     
+    def toggle_minimap(self):
+        if hasattr(self.main_window, 'minimap_dock'):
+            dock = self.main_window.minimap_dock
+            dock.setVisible(not dock.isVisible())
+
     def zoom_to_fit(self):
-        if hasattr(self.main_window, 'view'):
-            self.main_window.view.fitInView(
-                self.main_window.scene.itemsBoundingRect(),
-                Qt.AspectRatioMode.KeepAspectRatio
-            )
+        if hasattr(self.main_window, 'zoom_to_fit'):
+            self.main_window.zoom_to_fit()
     
     def clear_diagram(self):
         from PyQt6.QtWidgets import QMessageBox
@@ -463,6 +531,8 @@ class ToolbarManager:
 
         if reply == QMessageBox.StandardButton.Yes:
             self.main_window.scene.clear()
+            self.main_window.spatial_index.clear() # scene.clear() doesn't tell the items
+            self.main_window.connector_manager.clear()
             self.main_window.shapes.clear()
             self.main_window.connectors.clear()
     
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import lzma
+import struct
+import zlib
+
+# .sadz compressed diagram archive
+#
+#   header  MAGIC, format version, codec id
+#   body    compressed compact JSON:
+#           {"blocks": {key: {...}}, "shapes": [...], "connectors": [...], ...}
+#
+# Metadata sections (the dict values of a record's "metadata", e.g. the
+# security/technical/trust sections) that occur more than once are stored
+# once in "blocks" under a content hash. The record keeps the key in place of
+# the section and lists the replaced sections in "metadata_refs", so key
+# order and everything else in the record survive unchanged.
+
+MAGIC = b"SADZ"
+VERSION = 1
+HEADER = struct.Struct("<4sBB")
+
+CODECS = {
+    "zlib": (1, lambda data, level: zlib.compress(data, level), zlib.decompress),
+    "lzma": (2, lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+CODEC_IDS = {codec_id: name for name, (codec_id, _, _) in CODECS.items()}
+
+REFS_KEY = "metadata_refs"
+
+
+def is_archive_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def block_key(canonical):
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def dedup_records(records, blocks):
+    """Copies of records with repeated metadata sections swapped for block keys"""
+    sections = [] # (record index, section name, canonical json)
+    counts = {}
+    for i, record in enumerate(records):
+        metadata = record.get("metadata") if isinstance(record, dict) else None
+        if not isinstance(metadata, dict) or REFS_KEY in record:
+            continue
+        for name, section in metadata.items():
+            if isinstance(section, dict) and section:
+                canonical = json.dumps(section, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+                sections.append((i, name, canonical))
+                counts[canonical] = counts.get(canonical, 0) + 1
+    out = list(records)
+    for i, name, canonical in sections:
+        if counts[canonical] < 2:
+            continue
+        key = block_key(canonical)
+        blocks.setdefault(key, records[i]["metadata"][name])
+        if out[i] is records[i]:
+            out[i] = dict(records[i], metadata=dict(records[i]["metadata"]))
+            out[i][REFS_KEY] = []
+        out[i]["metadata"][name] = key
+        out[i][REFS_KEY].append(name)
+    return out
+
+
+def expand_records(records, blocks):
+    for record in records:
+        if not isinstance(record, dict) or REFS_KEY not in record:
+            continue
+        metadata = record["metadata"]
+        for name in record.pop(REFS_KEY):
+            # per record copy so editing one shape can't leak into the others
+            metadata[name] = dict(blocks[metadata[name]])
+    return records
+
+
+def encode_archive(data, codec="zlib", level=6):
+    """Encode diagram data into .sadz bytes"""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown archive codec {codec}")
+    codec_id, compress, _ = CODECS[codec]
+    blocks = {}
+    body = {key: value for key, value in data.items() if key not in ("shapes", "connectors")}
+    body["shapes"] = dedup_records(data.get("shapes", []), blocks)
+    if "connectors" in data:
+        body["connectors"] = dedup_records(data["connectors"], blocks)
+    body["blocks"] = blocks
+    payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(MAGIC, VERSION, codec_id) + compress(payload, level)
+
+
+def decode_archive(raw):
+    if len(raw) < HEADER.size:
+        raise ValueError("Invalid .sadz file: truncated header")
+    magic, version, codec_id = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC:
+        raise ValueError("Invalid .sadz file: bad magic")
+    if version > VERSION:
+        raise ValueError(f"Unsupported .sadz version {version}")
+    if codec_id not in CODEC_IDS:
+        raise ValueError(f"Invalid .sadz file: unknown codec {codec_id}")
+    decompress = CODECS[CODEC_IDS[codec_id]][2]
+    data = json.loads(decompress(raw[HEADER.size:]))
+    blocks = data.pop("blocks", {})
+    expand_records(data.get("shapes", []), blocks)
+    expand_records(data.get("connectors", []), blocks)
+    return data
+
+
+def read_archive(path):
+    """Read a .sadz file into the same plain data json.load gives for .json"""
+    with open(path, 'rb') as f:
+        return decode_archive(f.read())
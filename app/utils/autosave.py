@@ -0,0 +1,243 @@
+import os
+import time
+import uuid
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import Qt, QObject, QTimer
+from config import (AUTOSAVE_FILE, AUTOSAVE_INTERVAL_MS, AUTOSAVE_MIN_INTERVAL_MS, AUTOSAVE_EDIT_THRESHOLD,
+                    AUTOSAVE_BATCH_MS, AUTOSAVE_MAX_RECORDS, AUTOSAVE_RETRY_MS, JOURNAL_COMPACT_RECORDS)
+from utils.diagram_saver import DiagramSaveWorker
+from utils.diagram_journal import discard_journal
+from errorLogging import getLogger
+from datetime import datetime
+
+# Crash recovery. Edits are written to AUTOSAVE_FILE (a normal diagram
+# snapshot) plus its journal, using the same records as an explicit save.
+# The file only outlives a session that crashed, so finding one on startup
+# means there is something to recover.
+
+
+def has_recovery(path=AUTOSAVE_FILE):
+    return os.path.exists(path)
+
+
+def discard_recovery(path=AUTOSAVE_FILE):
+    discard_journal(path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class AutosaveJob:
+    """Records being serialized for one autosave, a slice at a time"""
+
+    def __init__(self, snapshot, shapes, connectors, items):
+        self.snapshot = snapshot
+        self.shapes = shapes # lists as they were when the job started
+        self.connectors = connectors
+        self.items = items # (kind, index, item) left to serialize
+        self.position = 0
+        self.records = []
+        self.shape_index = {shape: i for i, shape in enumerate(shapes)}
+
+
+class AutosaveManager(QObject):
+    """Writes pending edits to the recovery file in the background.
+
+    Serialization runs on the GUI thread in AUTOSAVE_BATCH_MS slices and the
+    write happens on a DiagramSaveWorker, so a big diagram never stalls the
+    event loop for long. Nothing runs while a mouse button is held down."""
+
+    def __init__(self, main_window, path=AUTOSAVE_FILE):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.path = path
+        self.logger = getLogger("autosave")
+        self.snapshot_id = None
+        self.journal_records = 0
+        self.saved_shapes = []
+        self.saved_connectors = []
+        self.dirty_items = set()
+        self.job = None
+        self.worker = None
+        self.enabled = True
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.autosave)
+        self.slice_timer = QTimer(self)
+        self.slice_timer.setInterval(0)
+        self.slice_timer.timeout.connect(self.serialize_slice)
+        self.idle_timer = QTimer(self) # picks up structural edits (adds/deletes) that don't mark items dirty
+        self.idle_timer.setInterval(AUTOSAVE_INTERVAL_MS)
+        self.idle_timer.timeout.connect(self.schedule)
+        self.idle_timer.start()
+
+    def mark_dirty(self, item):
+        if item in self.dirty_items:
+            return
+        self.dirty_items.add(item)
+        if not self.timer.isActive():
+            self.timer.start(AUTOSAVE_INTERVAL_MS)
+        elif len(self.dirty_items) >= AUTOSAVE_EDIT_THRESHOLD and self.timer.remainingTime() > AUTOSAVE_MIN_INTERVAL_MS:
+            self.timer.start(AUTOSAVE_MIN_INTERVAL_MS)
+
+    def schedule(self):
+        if not self.timer.isActive() and (self.dirty_items or self.structure_changed()):
+            self.timer.start(AUTOSAVE_MIN_INTERVAL_MS)
+
+    def structure_changed(self):
+        return self.main_window.shapes != self.saved_shapes or self.connectors() != self.saved_connectors
+
+    def connectors(self):
+        return getattr(self.main_window, 'connectors', [])
+
+    def busy(self):
+        loader = self.main_window.file_manager.loader
+        return self.job is not None or self.worker is not None or (loader is not None and loader.active)
+
+    def autosave(self):
+        if not self.enabled:
+            return
+        if self.busy() or QApplication.mouseButtons() != Qt.MouseButton.NoButton:
+            # mid-drag or still writing the last one, try again shortly
+            self.timer.start(AUTOSAVE_RETRY_MS)
+            return
+        if not self.dirty_items and not self.structure_changed():
+            return
+        shapes = list(self.main_window.shapes)
+        connectors = list(self.connectors())
+        if self.needs_snapshot(shapes, connectors):
+            items = [("shape", i, shape) for i, shape in enumerate(shapes)]
+            items += [("connector", i, conn) for i, conn in enumerate(connectors)]
+            self.job = AutosaveJob(True, shapes, connectors, items)
+            self.dirty_items.clear()
+        else:
+            self.job = AutosaveJob(False, shapes, connectors, self.delta_items(shapes, connectors))
+        self.slice_timer.start()
+
+    def needs_snapshot(self, shapes, connectors):
+        if self.snapshot_id is None or self.journal_records >= JOURNAL_COMPACT_RECORDS:
+            return True
+        return shapes[:len(self.saved_shapes)] != self.saved_shapes or \
+            connectors[:len(self.saved_connectors)] != self.saved_connectors
+
+    def delta_items(self, shapes, connectors):
+        # at most AUTOSAVE_MAX_RECORDS records per autosave, the rest stay
+        # dirty and go out with the next one
+        shape_index = {shape: i for i, shape in enumerate(shapes)}
+        connector_index = {conn: i for i, conn in enumerate(connectors)}
+        new_items = shapes[len(self.saved_shapes):] + connectors[len(self.saved_connectors):]
+        new_set = set(new_items)
+        items = []
+        for item in new_items + [item for item in self.dirty_items if item not in new_set]:
+            if len(items) >= AUTOSAVE_MAX_RECORDS:
+                self.dirty_items.add(item)
+                continue
+            if item in shape_index:
+                items.append(("shape", shape_index[item], item))
+            elif item in connector_index:
+                items.append(("connector", connector_index[item], item))
+            self.dirty_items.discard(item)
+        return items
+
+    def serialize_slice(self):
+        job = self.job
+        file_manager = self.main_window.file_manager
+        deadline = time.perf_counter() + AUTOSAVE_BATCH_MS / 1000.0
+        while job.position < len(job.items) and time.perf_counter() < deadline:
+            kind, i, item = job.items[job.position]
+            job.position += 1
+            try:
+                if kind == "shape":
+                    job.records.append((kind, i, file_manager.serialize_shape(item)))
+                else:
+                    job.records.append((kind, i, file_manager.serialize_connector(item, job.shape_index)))
+            except Exception as e:
+                self.logger.debug(f"Autosave skipped {kind} {i}: {e}")
+        if job.position < len(job.items):
+            return
+        self.slice_timer.stop()
+        self.job = None
+        if self.main_window.shapes[:len(job.shapes)] != job.shapes or \
+                self.connectors()[:len(job.connectors)] != job.connectors:
+            # items were removed while we were serializing, indexes are stale
+            self.logger.debug("Diagram changed during autosave, retrying")
+            self.snapshot_id = None
+            self.timer.start(AUTOSAVE_RETRY_MS)
+            return
+        self.start_worker(job)
+
+    def start_worker(self, job):
+        metadata = {
+            "modified_at": str(datetime.now()),
+            "shape_count": len(job.shapes),
+            "connectors_count": len(job.connectors),
+            "source_path": self.main_window.file_manager.current_path,
+        }
+        if job.snapshot:
+            self.snapshot_id = uuid.uuid4().hex
+            self.journal_records = 0
+            data = {
+                "shapes": [record for kind, i, record in job.records if kind == "shape"],
+                "connectors": [record for kind, i, record in job.records if kind == "connector"],
+                "metadata": dict(metadata, version="1.1", snapshot_id=self.snapshot_id),
+            }
+            worker = DiagramSaveWorker(self.path, snapshot=data, parent=self)
+        else:
+            records = [{"op": kind, "index": i, "data": record} for kind, i, record in job.records]
+            records.append({"op": "metadata", "data": metadata})
+            fresh = self.journal_records == 0
+            self.journal_records += len(records)
+            worker = DiagramSaveWorker(self.path, journal=(self.snapshot_id, records, fresh), parent=self)
+        self.saved_shapes = job.shapes
+        self.saved_connectors = job.connectors
+        self.worker = worker
+        worker.failed.connect(self.on_failed)
+        worker.finished.connect(lambda: self.on_worker_done(worker))
+        worker.start()
+
+    def on_failed(self, message):
+        self.logger.warning(f"Autosave to {self.path} failed: {message}")
+        self.snapshot_id = None # write everything next time
+
+    def on_worker_done(self, worker):
+        if worker is not self.worker:
+            return
+        worker.deleteLater()
+        self.worker = None
+        if self.dirty_items:
+            self.timer.start(AUTOSAVE_MIN_INTERVAL_MS)
+
+    def reset(self, discard=True):
+        """Current diagram matches what's on disk (loaded or explicitly saved)"""
+        self.wait()
+        self.job = None
+        self.slice_timer.stop()
+        self.timer.stop()
+        self.snapshot_id = None
+        self.journal_records = 0
+        self.saved_shapes = list(self.main_window.shapes)
+        self.saved_connectors = list(self.connectors())
+        self.dirty_items.clear()
+        if discard:
+            discard_recovery(self.path)
+
+    def on_saved(self):
+        # an explicit save with nothing newer pending makes the recovery file redundant
+        if self.busy() or self.dirty_items or self.structure_changed():
+            return
+        self.reset()
+
+    def wait(self):
+        if self.worker is not None:
+            self.worker.wait()
+            self.on_worker_done(self.worker)
+
+    def shutdown(self):
+        """Clean exit, nothing to recover next time"""
+        self.enabled = False
+        self.timer.stop()
+        self.idle_timer.stop()
+        self.slice_timer.stop()
+        self.job = None
+        self.wait()
+        discard_recovery(self.path)
@@ -0,0 +1,133 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from PyQt6.QtCore import QRectF
+from PyQt6.QtGui import QColor
+from PyQt6.QtWidgets import QGraphicsScene
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EXPORT_DPI, EXPORT_SCALE, EXPORT_THREADS, EXPORT_FORMATS, EXPORT_PADDING, CONTENT_MARGIN
+from models.diagram_model import load_diagram_model
+from models.shape_item import ShapeItem
+from models.connector_item import ConnectorItem, ConnectorManager
+from utils.diagram_export import record_scene, copy_picture, write_recording, in_order
+from utils.spatial_index import SpatialIndex
+from errorLogging import getLogger
+
+# Batch export: every diagram in a job is loaded into a scratch scene (never
+# the editor's), recorded once into a QPicture and written to each format
+# from that recording on a thread pool. The next diagram is loaded while the
+# last one's files are still being written. Used by the editor's Batch
+# Export action and by export.py for headless runs.
+
+logger = getLogger("batch_export")
+
+
+@dataclass
+class ExportJob:
+    diagrams: List[str]
+    formats: List[str] = field(default_factory=lambda: list(EXPORT_FORMATS))
+    output_dir: Optional[str] = None # default: next to each diagram
+    scale: float = EXPORT_SCALE
+    dpi: int = EXPORT_DPI
+    threads: int = EXPORT_THREADS
+
+
+def output_path_for(path, extension, output_dir, base_dir):
+    # the diagram's own extension stays in the name, d.json and d.sadb mustn't write the same d.png
+    if output_dir is None:
+        return path + "." + extension
+    relative = os.path.relpath(os.path.abspath(path), base_dir)
+    return os.path.join(output_dir, relative + "." + extension)
+
+
+def build_scene(path):
+    """Scene with the diagram's shapes and connectors, and the rect to export"""
+    shapes, connectors = load_diagram_model(path)
+    scene = QGraphicsScene()
+    index = SpatialIndex() # no editor here, the shapes are indexed by hand so elbows route like they do in it
+    manager = ConnectorManager(scene, index)
+    items = {}
+    for model in shapes:
+        shape = ShapeItem(model.item_type, model.x, model.y, model.w, model.h)
+        shape.label = model.label
+        if model.color is not None:
+            shape.color = QColor(model.color)
+        scene.addItem(shape)
+        bounds = shape.sceneBoundingRect()
+        index.insert(shape, bounds.left(), bounds.top(), bounds.right(), bounds.bottom())
+        items[model] = shape
+    for model in connectors:
+        conn = ConnectorItem(items[model.start_shape], items[model.end_shape], model.connector_type)
+        conn.metadata = model.metadata
+        manager.add_connector(conn)
+        conn.refresh_decorations()
+        scene.addItem(conn)
+    rect = QRectF()
+    for shape in items.values():
+        rect = rect.united(shape.sceneBoundingRect())
+    margin = CONTENT_MARGIN + EXPORT_PADDING # same framing as the editor's export
+    return scene, rect.adjusted(-margin, -margin, margin, margin)
+
+
+def record_diagram(path):
+    """(QPicture, size) of a saved diagram"""
+    scene, rect = build_scene(path)
+    picture = record_scene(scene, rect)
+    scene.clear()
+    return picture, rect.size()
+
+
+def run_export_job(job, progress: Optional[Callable[[int, int], None]] = None):
+    """Export every diagram in the job to every format, returns a summary dict
+    per diagram. Loading and recording happen on the calling thread (the GUI
+    thread when there is one), progress(done, total) is called there too"""
+    diagrams, seen = [], set()
+    for path in job.diagrams: # once each, two writers on the same output race
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            diagrams.append(path)
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in diagrams]) if diagrams else "."
+    results = {path: {"diagram": path, "ok": True, "outputs": [], "errors": []} for path in diagrams}
+    total = len(diagrams) * len(job.formats)
+    done = 0
+
+    def tasks():
+        nonlocal done
+        for path in diagrams:
+            try:
+                picture, size = record_diagram(path)
+            except Exception as e:
+                logger.error(f"Couldn't load {path} for export: {e}")
+                results[path].update(ok=False)
+                results[path]["errors"].append(str(e))
+                done += len(job.formats)
+                continue
+            for extension in job.formats:
+                output = output_path_for(path, extension, job.output_dir, base_dir)
+                # each format plays its own copy, they run at the same time
+                yield path, output, copy_picture(picture), size
+
+    def work(task):
+        path, output, picture, size = task
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            write_recording(output, picture, size, job.scale, job.dpi, threads=1) # the pool is already busy
+            return path, output, None
+        except Exception as e:
+            return path, output, f"{output}: {e}"
+
+    with ThreadPoolExecutor(max_workers=max(1, job.threads)) as pool:
+        for path, output, error in in_order(pool, work, tasks(), 2 * max(1, job.threads)):
+            if error is None:
+                results[path]["outputs"].append(output)
+            else:
+                logger.error(f"Export failed, {error}")
+                results[path].update(ok=False)
+                results[path]["errors"].append(error)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+    return [results[path] for path in diagrams]
@@ -0,0 +1,271 @@
+import heapq
+from bisect import bisect_left, bisect_right
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ROUTER_MARGIN, ROUTER_CORRIDOR, ROUTER_BEND_PENALTY, ROUTER_MAX_OBSTACLES, ROUTER_MAX_STEPS
+from utils.spatial_index import SpatialIndex
+
+# Orthogonal routes for elbow connectors that go around shapes instead of
+# through them. Only the shapes near the connector count: the route is
+# searched inside a corridor (both shapes plus ROUTER_CORRIDOR around them),
+# on a sparse grid made of the obstacles' edges, with A* where every bend
+# costs ROUTER_BEND_PENALTY on top of the length. Routing runs on the GUI
+# thread while shapes are dragged, so a route searches at most
+# ROUTER_MAX_STEPS states and falls back to a plain elbow past that.
+#
+# Routes are cached per connector. A cached route only goes stale when one of
+# its own shapes moves (the cache key), or when a shape moves into its
+# corridor or out of where it was an obstacle, so dragging a shape only
+# re-routes the connectors it gets in the way of.
+#
+# Qt-free like the spatial index, rects are (left, top, right, bottom) and
+# points (x, y) in scene coordinates.
+
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1)) # right, down, left, up
+SIDES = {"right": 0, "bottom": 1, "left": 2, "top": 3}
+
+
+def port_direction(x, y, direction, rect):
+    """Index into DIRECTIONS a connection point leaves its shape in, "auto" points away from the centre"""
+    if direction in SIDES:
+        return SIDES[direction]
+    left, top, right, bottom = rect
+    dx = (x - (left + right) / 2) / max(right - left, 1)
+    dy = (y - (top + bottom) / 2) / max(bottom - top, 1)
+    if abs(dx) > abs(dy):
+        return 0 if dx > 0 else 2
+    return 1 if dy > 0 else 3
+
+
+def inflate(rect, margin):
+    return (rect[0] - margin, rect[1] - margin, rect[2] + margin, rect[3] + margin)
+
+
+def stub(x, y, d, obstacle):
+    """Where a route leaving (x, y) in direction d clears its own shape's obstacle"""
+    if d == 0:
+        return (obstacle[2], y)
+    if d == 1:
+        return (x, obstacle[3])
+    if d == 2:
+        return (obstacle[0], y)
+    return (x, obstacle[1])
+
+
+def strictly_inside(point, rect):
+    return rect[0] < point[0] < rect[2] and rect[1] < point[1] < rect[3]
+
+
+def pick_ports(start_ports, end_ports, start_obstacle, end_obstacle, bend_penalty):
+    """Best (start port, end port) pair, by distance between their stubs and
+    whether they face each other"""
+    best = None
+    for sx, sy, sd in start_ports:
+        s = stub(sx, sy, sd, start_obstacle)
+        for ex, ey, ed in end_ports:
+            e = stub(ex, ey, ed, end_obstacle)
+            dx, dy = e[0] - s[0], e[1] - s[1]
+            score = abs(dx) + abs(dy)
+            # leaving away from the other end costs a U-turn
+            if DIRECTIONS[sd][0] * dx + DIRECTIONS[sd][1] * dy < 0:
+                score += 2 * bend_penalty
+            if DIRECTIONS[ed][0] * -dx + DIRECTIONS[ed][1] * -dy < 0:
+                score += 2 * bend_penalty
+            if best is None or score < best[0]:
+                best = (score, (sx, sy, sd), (ex, ey, ed))
+    return best[1], best[2]
+
+
+def find_route(start, start_dir, end, end_dir, obstacles, box, bend_penalty=ROUTER_BEND_PENALTY, max_steps=ROUTER_MAX_STEPS):
+    """(points, steps): orthogonal points from start to end avoiding the
+    obstacles, None if there's no way round or none was found in max_steps
+    searched states, and how many states were searched.
+    start leaves in start_dir, end is entered against end_dir (its outward direction)"""
+    left, top, right, bottom = box
+    xs = {left, right, start[0], end[0], (start[0] + end[0]) / 2}
+    ys = {top, bottom, start[1], end[1], (start[1] + end[1]) / 2}
+    for l, t, r, b in obstacles:
+        xs.update(min(max(v, left), right) for v in (l, r))
+        ys.update(min(max(v, top), bottom) for v in (t, b))
+    xs, ys = sorted(xs), sorted(ys)
+    nx, ny = len(xs), len(ys)
+
+    # gaps between neighbouring grid lines that run through an obstacle. Every
+    # obstacle edge is a grid line, so a gap is either all inside or all outside
+    h_blocked = bytearray(nx * ny) # gap from (i, j) to (i + 1, j)
+    v_blocked = bytearray(nx * ny) # gap from (i, j) to (i, j + 1)
+    for l, t, r, b in obstacles:
+        i0, i1 = bisect_left(xs, l), bisect_left(xs, r)
+        j0, j1 = bisect_left(ys, t), bisect_left(ys, b)
+        for j in range(bisect_right(ys, t), j1): # rows strictly inside
+            row = j * nx
+            for i in range(i0, i1):
+                h_blocked[row + i] = 1
+        for i in range(bisect_right(xs, l), i1): # columns strictly inside
+            for j in range(j0, j1):
+                v_blocked[j * nx + i] = 1
+
+    si, sj = xs.index(start[0]), ys.index(start[1])
+    gi, gj = xs.index(end[0]), ys.index(end[1])
+    enter_dir = (end_dir + 2) % 4 # the last segment runs into the end
+
+    def steps(i, j):
+        if i + 1 < nx and not h_blocked[j * nx + i]:
+            yield 0, i + 1, j, xs[i + 1] - xs[i]
+        if j + 1 < ny and not v_blocked[j * nx + i]:
+            yield 1, i, j + 1, ys[j + 1] - ys[j]
+        if i > 0 and not h_blocked[j * nx + i - 1]:
+            yield 2, i - 1, j, xs[i] - xs[i - 1]
+        if j > 0 and not v_blocked[(j - 1) * nx + i]:
+            yield 3, i, j - 1, ys[j] - ys[j - 1]
+
+    def estimate(i, j):
+        x, y = xs[i], ys[j]
+        # off both of the end's lines there's at least one bend to go
+        bends = bend_penalty if x != end[0] and y != end[1] else 0
+        return abs(x - end[0]) + abs(y - end[1]) + bends
+
+    first = (si, sj, start_dir)
+    cost = {first: 0}
+    came_from = {}
+    heap = [(estimate(si, sj), 0, first)] # (f, -g, state), ties go to the state furthest along
+    best, best_state = None, None
+    steps_taken = 0
+    while heap and (best is None or heap[0][0] < best) and steps_taken < max_steps:
+        f, g, state = heapq.heappop(heap)
+        g = -g
+        if g > cost.get(state, g):
+            continue
+        steps_taken += 1
+        i, j, d = state
+        if i == gi and j == gj:
+            total = g + (bend_penalty if d != enter_dir else 0)
+            if best is None or total < best:
+                best, best_state = total, state
+            continue
+        for nd, ni, nj, length in steps(i, j):
+            if nd == (d + 2) % 4:
+                continue # doubling back is never shorter
+            ng = g + length + (bend_penalty if nd != d else 0)
+            next_state = (ni, nj, nd)
+            if ng < cost.get(next_state, ng + 1):
+                cost[next_state] = ng
+                came_from[next_state] = state
+                heapq.heappush(heap, (ng + estimate(ni, nj), -ng, next_state))
+    if best_state is None:
+        return None, steps_taken
+
+    points = []
+    state = best_state
+    while True:
+        i, j, d = state
+        points.append((xs[i], ys[j]))
+        if state == first:
+            break
+        state = came_from[state]
+    points.reverse()
+    return simplify(points), steps_taken # out of steps after reaching the end, still a way round
+
+
+def simplify(points):
+    """Drop the points in the middle of straight runs"""
+    result = [points[0]]
+    for k in range(1, len(points) - 1):
+        a, b, c = result[-1], points[k], points[k + 1]
+        if (a[0] == b[0] == c[0]) or (a[1] == b[1] == c[1]):
+            continue
+        result.append(b)
+    if len(points) > 1:
+        result.append(points[-1])
+    return result
+
+
+class ConnectorRouter:
+    """Routes and caches elbow connectors around the shapes in a spatial index"""
+
+    def __init__(self, index, outline=None, margin=ROUTER_MARGIN, corridor=ROUTER_CORRIDOR, bend_penalty=ROUTER_BEND_PENALTY):
+        self.index = index # shapes, the obstacles
+        # shape -> rect routes keep clear of, the index's bounds by default. Those
+        # can be roomier than the shape (the editor's include resize handles)
+        self.outline = outline or index.bounds_of
+        self.margin = margin
+        self.corridor = corridor
+        self.bend_penalty = bend_penalty
+        self.routes = {} # connector -> (key, points)
+        self.corridors = SpatialIndex() # connector -> the area its route was searched in
+        self.obstacles_of = {} # connector -> shapes its route had to go around
+        self.blocked_by = {} # shape -> connectors whose route it was an obstacle for
+
+    def route(self, connector, start, end):
+        """Points for a connector from start to end, each (shape, rect, ports) where
+        ports are (x, y, direction) connection points. None if there's no way
+        round, the caller draws a plain elbow then"""
+        key = (start[1], end[1])
+        cached = self.routes.get(connector)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        self.forget(connector)
+
+        start_obstacle = inflate(start[1], self.margin)
+        end_obstacle = inflate(end[1], self.margin)
+        start_ports = [(x, y, port_direction(x, y, d, start[1])) for x, y, d in start[2]]
+        end_ports = [(x, y, port_direction(x, y, d, end[1])) for x, y, d in end[2]]
+        (sx, sy, sd), (ex, ey, ed) = pick_ports(start_ports, end_ports, start_obstacle, end_obstacle, self.bend_penalty)
+        s, e = stub(sx, sy, sd, start_obstacle), stub(ex, ey, ed, end_obstacle)
+
+        points, box, shapes = None, None, []
+        steps_left = ROUTER_MAX_STEPS # for both tries together
+        for reach in (self.corridor, 4 * self.corridor): # wider the second time, for a way round a big cluster
+            box = (min(start_obstacle[0], end_obstacle[0]) - reach, min(start_obstacle[1], end_obstacle[1]) - reach,
+                   max(start_obstacle[2], end_obstacle[2]) + reach, max(start_obstacle[3], end_obstacle[3]) + reach)
+            shapes = self.index.query(*box)
+            if len(shapes) > ROUTER_MAX_OBSTACLES:
+                break # too crowded to search, the caller falls back to a plain elbow
+            obstacles = []
+            for shape in shapes:
+                rect = inflate(self.outline(shape), self.margin)
+                if not (strictly_inside(s, rect) or strictly_inside(e, rect)):
+                    obstacles.append(rect) # shapes overlapping the ends would wall them in, those are routed through
+            points, steps_taken = find_route(s, sd, e, ed, obstacles, box, self.bend_penalty, steps_left)
+            if points is not None:
+                points = simplify([(sx, sy)] + points + [(ex, ey)])
+                break
+            steps_left -= steps_taken
+            if steps_left <= 0:
+                break # too slow to find, a plain elbow it is
+
+        # remember the route even when there's none, so it's not searched again until something moves
+        self.routes[connector] = (key, points)
+        self.corridors.insert(connector, *box)
+        self.obstacles_of[connector] = shapes
+        for shape in shapes:
+            self.blocked_by.setdefault(shape, set()).add(connector)
+        return points
+
+    def invalidate(self, shape):
+        """A shape moved, was resized, added or removed. Drops the routes it can
+        change and returns their connectors, they need routing again"""
+        stale = set(self.blocked_by.get(shape, ())) # it was in the way
+        bounds = self.index.bounds_of(shape)
+        if bounds is not None: # not indexed any more when it's being removed
+            stale.update(self.corridors.query(*bounds)) # it's in the way now
+        for connector in stale:
+            self.forget(connector)
+        return stale
+
+    def forget(self, connector):
+        if self.routes.pop(connector, None) is None:
+            return
+        self.corridors.remove(connector)
+        for shape in self.obstacles_of.pop(connector, ()):
+            connectors = self.blocked_by.get(shape)
+            if connectors is not None:
+                connectors.discard(connector)
+                if not connectors:
+                    del self.blocked_by[shape]
+
+    def clear(self):
+        self.routes.clear()
+        self.corridors.clear()
+        self.obstacles_of.clear()
+        self.blocked_by.clear()
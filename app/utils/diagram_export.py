@@ -0,0 +1,238 @@
+import struct
+import zlib
+import sys, os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QRectF, QBuffer, QByteArray, QIODevice
+from PyQt6.QtGui import QColor, QImage, QPainter, QPicture, QPdfWriter, QPageSize
+from PyQt6.QtSvg import QSvgGenerator
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import EXPORT_DPI, EXPORT_SCALE, EXPORT_TILE_PIXELS, EXPORT_THREADS, EXPORT_PNG_LEVEL, EXPORT_PDF_RESOLUTION
+from errorLogging import getLogger
+
+# Raster export in horizontal bands. The scene can only be painted on the GUI
+# thread, so each band is recorded there into a QPicture (a list of paint
+# commands, cheap next to rasterizing them). Worker threads play the bands
+# into small QImages and deflate their rows, and the PNG is written band by
+# band in order. Memory stays at a few bands however big the diagram is.
+#
+# Recordings are in diagram units, (0, 0) being the export rect's top left.
+# A recording of the whole diagram can be written to any format from any
+# thread (see write_recording), so one recording serves a whole batch export.
+
+logger = getLogger("diagram_export")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+ADLER_BASE = 65521
+
+
+def record_scene(scene, source, target=None):
+    """QPicture of the source rect (scene coordinates) at one unit per scene unit"""
+    picture = QPicture()
+    painter = QPainter(picture)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    scene.render(painter, target or QRectF(0, 0, source.width(), source.height()), source)
+    painter.end()
+    return picture
+
+
+def raster_size(source, scale=EXPORT_SCALE, dpi=EXPORT_DPI):
+    """(pixels per diagram unit, width, height) of a raster export.
+    96 dpi is one pixel per unit, 192 doubles the pixels for print"""
+    zoom = scale * dpi / 96
+    return zoom, max(1, round(source.width() * zoom)), max(1, round(source.height() * zoom))
+
+
+def band_rows(width):
+    return max(1, EXPORT_TILE_PIXELS // width)
+
+
+def scene_bands(scene, source, zoom, width, height):
+    """(top row, row count, picture) for each band, recorded as it's asked for"""
+    rows = band_rows(width)
+    for top in range(0, height, rows):
+        count = min(rows, height - top)
+        # record just this strip of the scene, the scene's index skips the rest
+        strip = QRectF(0, top / zoom, source.width(), count / zoom)
+        picture = record_scene(scene, strip.translated(source.topLeft()), strip)
+        yield top, count, picture
+
+
+def play(painter, picture):
+    """Draw a recording at one painter unit per diagram unit. drawPicture on its
+    own scales by device dpi / recording dpi (0.75 on a 72 dpi SVG)"""
+    device = painter.device()
+    painter.scale(picture.logicalDpiX() / device.logicalDpiX(), picture.logicalDpiY() / device.logicalDpiY())
+    painter.drawPicture(0, 0, picture)
+
+
+def copy_picture(picture):
+    """Copy for another thread, playing a picture moves its read position"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    picture.save(buffer) # picture.data() comes back cut short at the first NUL byte
+    buffer.close()
+    copy = QPicture()
+    copy.setData(data.data())
+    return copy
+
+
+def picture_bands(picture, width, height):
+    """Bands that each play a copy of the same recording, clipped to their rows"""
+    rows = band_rows(width)
+    for top in range(0, height, rows):
+        yield top, min(rows, height - top), copy_picture(picture)
+
+
+def render_band(band, zoom, width, background=QColor("white")):
+    top, count, picture = band
+    image = QImage(width, count, QImage.Format.Format_RGB888)
+    image.fill(background)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    painter.setClipRect(0, 0, width, count)
+    painter.translate(0, -top)
+    painter.scale(zoom, zoom)
+    play(painter, picture)
+    painter.end()
+    return image
+
+
+def in_order(pool, work, jobs, window):
+    """Results of work(job) in job order, with at most window jobs in flight"""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(work, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def adler32_combine(first, second, second_length):
+    a1, b1 = first & 0xffff, first >> 16
+    a2, b2 = second & 0xffff, second >> 16
+    rem = second_length % ADLER_BASE
+    a = (a1 + a2 - 1) % ADLER_BASE
+    b = (b1 + b2 + rem * a1 - rem) % ADLER_BASE
+    return (b << 16) | a
+
+
+def deflate_rows(image, level):
+    """Band as PNG scanlines, deflated on its own so bands compress in parallel.
+    Returns (compressed, adler32 of the scanlines, scanline byte count)"""
+    row_bytes = image.width() * 3
+    stride = image.bytesPerLine()
+    bits = image.constBits().asstring(image.sizeInBytes())
+    raw = b"".join(b"\x00" + bits[y * stride:y * stride + row_bytes] for y in range(image.height()))
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -15) # raw deflate, the writer adds the zlib framing
+    compressed = deflate.compress(raw) + deflate.flush(zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(raw), len(raw)
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(path, bands, zoom, width, height, dpi=EXPORT_DPI, threads=EXPORT_THREADS, level=EXPORT_PNG_LEVEL):
+    """Render bands on a thread pool and stream them into a PNG"""
+    def work(band):
+        return deflate_rows(render_band(band, zoom, width), level)
+
+    pixels_per_metre = round(dpi / 0.0254)
+    checksum = 1
+    try:
+        with open(path, "wb") as f, ThreadPoolExecutor(max_workers=threads) as pool:
+            f.write(PNG_SIGNATURE)
+            f.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+            f.write(png_chunk(b"pHYs", struct.pack(">IIB", pixels_per_metre, pixels_per_metre, 1)))
+            f.write(png_chunk(b"IDAT", b"\x78\x9c"))
+            for compressed, adler, length in in_order(pool, work, bands, 2 * threads):
+                f.write(png_chunk(b"IDAT", compressed))
+                checksum = adler32_combine(checksum, adler, length)
+            # empty final block, then the checksum of every scanline
+            f.write(png_chunk(b"IDAT", b"\x03\x00" + struct.pack(">I", checksum)))
+            f.write(png_chunk(b"IEND", b""))
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path) # don't leave half an image behind
+        raise
+
+
+def write_image(path, bands, zoom, width, height, dpi=EXPORT_DPI, threads=EXPORT_THREADS, image_format="JPG"):
+    """Render bands on a thread pool into one image, for formats Qt can't stream"""
+    image = QImage(width, height, QImage.Format.Format_RGB888)
+    if image.isNull():
+        raise MemoryError(f"{width}x{height} is too big for a {image_format} image, export as PNG instead")
+    image.setDotsPerMeterX(round(dpi / 0.0254))
+    image.setDotsPerMeterY(round(dpi / 0.0254))
+    def work(band):
+        return band[0], render_band(band, zoom, width)
+
+    painter = QPainter(image)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for top, band_image in in_order(pool, work, bands, 2 * threads):
+            painter.drawImage(0, top, band_image)
+    painter.end()
+    if not image.save(path, image_format):
+        raise IOError(f"Couldn't write {path}")
+
+
+def export_raster(scene, source, path, scale=EXPORT_SCALE, dpi=EXPORT_DPI):
+    """Export the source rect of the scene as PNG (streamed) or JPEG"""
+    zoom, width, height = raster_size(source, scale, dpi)
+    logger.info(f"Exporting {width}x{height} px to {path}")
+    bands = scene_bands(scene, source, zoom, width, height)
+    if path.lower().endswith(".png"):
+        write_png(path, bands, zoom, width, height, dpi)
+    else:
+        write_image(path, bands, zoom, width, height, dpi)
+
+
+def write_svg(path, picture, size):
+    generator = QSvgGenerator()
+    generator.setFileName(path)
+    generator.setSize(size.toSize())
+    generator.setViewBox(QRectF(0, 0, size.width(), size.height()))
+    generator.setResolution(picture.logicalDpiX()) # font sizes are written for this dpi, 72 by default shrinks text
+    painter = QPainter(generator)
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    play(painter, picture)
+    if not painter.end():
+        raise IOError(f"Couldn't write {path}")
+
+
+def write_pdf(path, picture, size):
+    """One A4 page, the diagram scaled to fit and centred"""
+    writer = QPdfWriter(path)
+    writer.setPageSize(QPageSize(QPageSize.PageSizeId.A4))
+    writer.setResolution(EXPORT_PDF_RESOLUTION)
+    painter = QPainter(writer)
+    if not painter.isActive():
+        raise IOError(f"Couldn't write {path}")
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+    zoom = min(writer.width() / size.width(), writer.height() / size.height())
+    painter.translate((writer.width() - size.width() * zoom) / 2, (writer.height() - size.height() * zoom) / 2)
+    painter.scale(zoom, zoom)
+    play(painter, picture)
+    painter.end()
+
+
+def write_recording(path, picture, size, scale=EXPORT_SCALE, dpi=EXPORT_DPI, threads=EXPORT_THREADS):
+    """Write a recording in the format path's extension names. Safe off the GUI
+    thread, as long as no other thread is playing the same picture"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".svg":
+        write_svg(path, picture, size)
+    elif extension == ".pdf":
+        write_pdf(path, picture, size)
+    elif extension in (".png", ".jpg", ".jpeg"):
+        zoom, width, height = raster_size(QRectF(0, 0, size.width(), size.height()), scale, dpi)
+        bands = picture_bands(picture, width, height)
+        if extension == ".png":
+            write_png(path, bands, zoom, width, height, dpi, threads)
+        else:
+            write_image(path, bands, zoom, width, height, dpi, threads)
+    else:
+        raise ValueError(f"Can't export to {extension or path}")
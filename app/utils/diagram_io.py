@@ -0,0 +1,183 @@
+import json
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from errorLogging import getLogger
+from utils.sadb_format import read_sadb, encode_sadb, is_sadb_file
+from utils.archive_format import read_archive, encode_archive, is_archive_file
+from config import ARCHIVE_CODEC, ARCHIVE_LEVEL
+from utils.diagram_journal import read_journal, apply_journal, snapshot_id_of
+
+# Plain-data diagram reading. Nothing in here touches QGraphicsItems so it is
+# safe to call from worker threads (and from headless tools).
+
+logger = getLogger("diagram_io")
+
+DIAGRAM_FILE_FILTER = "JSON Files (*.json);;SADB Binary (*.sadb);;Compressed Archive (*.sadz)"
+WRITE_CHUNK_SIZE = 1 << 20
+
+
+DIAGRAM_EXTENSIONS = (".json", ".sadb", ".sadz")
+REPORT_SUFFIX = ".threats.json" # analyze.py reports, <diagram file>.threats.json, never diagrams themselves
+
+
+def find_diagram_files(paths, exclude=()):
+    """Diagram files given directly or found under directories (dotfiles,
+    e.g. the autosave, and names ending in an exclude suffix are skipped).
+    Each file is listed once, however many of the paths lead to it"""
+    exclude = tuple(suffix.lower() for suffix in exclude)
+    found = []
+    seen = set()
+    def add(path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            found.append(path)
+
+    for path in paths:
+        if os.path.isfile(path):
+            add(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                lower = name.lower()
+                if name.startswith('.') or lower.endswith(exclude):
+                    continue
+                if lower.endswith(DIAGRAM_EXTENSIONS):
+                    add(os.path.join(root, name))
+    return found
+
+
+def is_binary_path(path):
+    return os.path.splitext(path)[1].lower() == ".sadb"
+
+
+def is_archive_path(path):
+    return os.path.splitext(path)[1].lower() == ".sadz"
+
+
+def read_diagram(path, with_journal=True):
+    """Read a saved diagram file (plus any pending journal) into plain python data"""
+    if is_binary_path(path) or is_sadb_file(path):
+        data = read_sadb(path)
+    elif is_archive_path(path) or is_archive_file(path):
+        data = read_archive(path)
+    else:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON file: {e}")
+    validate_diagram_data(data)
+    if with_journal:
+        journal = read_journal(path, snapshot_id_of(data))
+        if journal:
+            logger.debug(f"Replaying {journal.records} journal records for {path}")
+            apply_journal(data, journal)
+    return data
+
+
+def encode_diagram(path, data):
+    """Encode diagram data to bytes in the format picked by the file extension"""
+    if is_binary_path(path):
+        return encode_sadb(data)
+    if is_archive_path(path):
+        return encode_archive(data, ARCHIVE_CODEC, ARCHIVE_LEVEL)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def write_diagram(path, data, progress=None):
+    """Write diagram data, replacing the file atomically"""
+    write_bytes_atomic(path, encode_diagram(path, data), progress)
+
+
+def write_bytes_atomic(path, payload, progress=None, chunk_size=WRITE_CHUNK_SIZE):
+    # write next to the target then os.replace, so a crash mid-write leaves
+    # the previous file intact instead of a truncated one
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            view = memoryview(payload)
+            for start in range(0, len(view), chunk_size):
+                f.write(view[start:start + chunk_size])
+                if progress:
+                    progress(min(start + chunk_size, len(view)), len(view))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def snapshot_metadata(metadata):
+    # metadata is a dict of sections; the panel replaces whole sections and
+    # only ever edits leaf values in place, so copying two levels deep is
+    # enough to hand the save worker something the GUI won't mutate
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in metadata.items()}
+
+
+def pack_metadata(metadata):
+    """Compact utf-8 JSON blob for metadata that may never be looked at"""
+    return json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def unpack_metadata(raw):
+    return json.loads(raw)
+
+
+def validate_diagram_data(data):
+    if not isinstance(data, dict):
+        raise ValueError("Invalid file format: not a JSON object")
+    if "shapes" not in data:
+        raise ValueError("Invalid file format: missing 'shapes' key")
+
+
+def normalize_shape(shape_data):
+    """Fill in defaults for a shape record (older files used w/h and colour)"""
+    return {
+        "id": shape_data.get("id"),
+        "type": shape_data.get("type", "rect"),
+        "x": shape_data["x"],
+        "y": shape_data["y"],
+        "width": shape_data.get("width", shape_data.get("w", 100)),
+        "height": shape_data.get("height", shape_data.get("h", 60)),
+        "label": shape_data.get("label"),
+        "color": shape_data.get("color", shape_data.get("colour")),
+        "metadata": shape_data.get("metadata"),
+        "shape_category": shape_data.get("shape_category"),
+        "shape_subtype": shape_data.get("shape_subtype"),
+    }
+
+
+def normalize_connector(conn_data):
+    """Connectors are [start, end] index pairs, index records (pre 1.1) or
+    records naming their endpoints by shape id"""
+    if isinstance(conn_data, list) and len(conn_data) >= 2:
+        return {"id": None, "start": conn_data[0], "end": conn_data[1], "start_id": None, "end_id": None,
+                "type": "line", "metadata": {}}
+    if "start_id" in conn_data:
+        start, end = None, None
+    else:
+        start, end = conn_data["start"], conn_data["end"]
+    return {
+        "id": conn_data.get("id"),
+        "start": start,
+        "end": end,
+        "start_id": conn_data.get("start_id"),
+        "end_id": conn_data.get("end_id"),
+        "type": conn_data.get("type", "line"),
+        "metadata": conn_data.get("metadata", {}),
+    }
+
+
+def resolve_endpoints(conn_data, shapes_by_index, shapes_by_id):
+    """(start, end) shapes for a normalized connector, None where unknown"""
+    if conn_data["start_id"] is not None:
+        return shapes_by_id.get(conn_data["start_id"]), shapes_by_id.get(conn_data["end_id"])
+    # pre-1.1 files store list positions
+    return shapes_by_index.get(conn_data["start"]), shapes_by_index.get(conn_data["end"])
@@ -0,0 +1,97 @@
+import json
+import os
+
+# Append-only change journal kept next to a saved diagram (<diagram>.journal).
+#
+# The first line names the snapshot it applies to, every following line is one
+# changed record:
+#   {"journal": 1, "snapshot_id": "..."}
+#   {"op": "shape", "index": 3, "data": {...}}
+#   {"op": "connector", "index": 0, "data": {...}}
+#   {"op": "metadata", "data": {...}}
+# Later records win. A journal whose snapshot_id doesn't match the diagram is
+# stale (the snapshot was rewritten without it) and is ignored.
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = ".journal"
+
+
+def journal_path(path):
+    return path + JOURNAL_SUFFIX
+
+
+class Journal:
+    def __init__(self):
+        self.shapes = {}
+        self.connectors = {}
+        self.metadata = {}
+        self.records = 0
+
+    def __bool__(self):
+        return self.records > 0
+
+
+def append_journal(path, snapshot_id, records, fresh=False):
+    """Append records; fresh=True starts a new journal (dropping any stale one)"""
+    jpath = journal_path(path)
+    lines = []
+    if fresh or not os.path.exists(jpath):
+        lines.append(json.dumps({"journal": JOURNAL_VERSION, "snapshot_id": snapshot_id}))
+    lines.extend(json.dumps(record, ensure_ascii=False, separators=(',', ':')) for record in records)
+    with open(jpath, "w" if fresh else "a", encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_journal(path, snapshot_id):
+    journal = Journal()
+    jpath = journal_path(path)
+    if snapshot_id is None or not os.path.exists(jpath):
+        return journal
+    with open(jpath, "r", encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline())
+        except json.JSONDecodeError:
+            return journal
+        if header.get("snapshot_id") != snapshot_id:
+            return journal
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break # torn write at the tail, everything before it is good
+            op = record.get("op")
+            if op == "shape":
+                journal.shapes[record["index"]] = record["data"]
+            elif op == "connector":
+                journal.connectors[record["index"]] = record["data"]
+            elif op == "metadata":
+                journal.metadata.update(record["data"])
+            journal.records += 1
+    return journal
+
+
+def apply_journal(data, journal):
+    """Apply journal records on top of snapshot data in place"""
+    for key, overrides in (("shapes", journal.shapes), ("connectors", journal.connectors)):
+        rows = data.setdefault(key, [])
+        for i in sorted(overrides):
+            if i < len(rows):
+                rows[i] = overrides[i]
+            elif i == len(rows):
+                rows.append(overrides[i])
+    if journal.metadata:
+        data.setdefault("metadata", {}).update(journal.metadata)
+    return data
+
+
+def discard_journal(path):
+    jpath = journal_path(path)
+    if os.path.exists(jpath):
+        os.remove(jpath)
+
+
+def snapshot_id_of(data):
+    metadata = data.get("metadata")
+    return metadata.get("snapshot_id") if isinstance(metadata, dict) else None
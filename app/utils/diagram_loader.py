@@ -0,0 +1,235 @@
+import time
+from collections import deque
+from PyQt6.QtWidgets import QProgressDialog
+from PyQt6.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
+from config import LOAD_CHUNK_SIZE, LOAD_BATCH_MS
+from utils.diagram_io import read_diagram, normalize_shape, normalize_connector, is_binary_path, pack_metadata
+from utils.sadb_format import SadbReader, is_sadb_file
+from utils.diagram_journal import Journal, read_journal, apply_journal, snapshot_id_of
+from models.shape_item import new_element_id
+from errorLogging import getLogger
+
+
+class LazyRows:
+    def __init__(self, getter, count, overrides=None):
+        self.overrides = overrides or {}
+        self.getter = getter
+        self.count = max([count] + [i + 1 for i in self.overrides])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return [self.overrides[i] if i in self.overrides else self.getter(i)
+                for i in range(*index.indices(self.count))]
+
+
+def normalize_packed_shape(record):
+    # shape metadata crosses over to the GUI as a packed blob, the ShapeItem
+    # only decodes it if someone looks at it
+    shape_data = normalize_shape(record)
+    metadata = shape_data.pop("metadata")
+    shape_data["metadata"] = None
+    shape_data["metadata_raw"] = pack_metadata(metadata) if metadata is not None else None
+    return shape_data
+
+
+class DiagramParseWorker(QThread):
+    """Parses a diagram file off the GUI thread and hands it over in chunks"""
+    parsed = pyqtSignal(int, int)  # shape count, connector count
+    document = pyqtSignal(dict)  # document level metadata
+    shapes_ready = pyqtSignal(list)
+    connectors_ready = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, chunk_size=LOAD_CHUNK_SIZE, read=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.read = read # path -> diagram data, for sources that aren't files
+        self.logger = getLogger("diagram_loader")
+
+    def run(self):
+        try:
+            if self.read is not None:
+                data, journal = self.read(self.path), Journal()
+            elif is_binary_path(self.path) or is_sadb_file(self.path):
+                self.run_binary()
+                return
+            else:
+                data = read_diagram(self.path, with_journal=False)
+                journal = read_journal(self.path, snapshot_id_of(data))
+                apply_journal(data, journal)
+        except Exception as e:
+            self.logger.error(f"Failed to parse {self.path}: {e}")
+            self.failed.emit(str(e))
+            return
+        shapes = data.get("shapes", [])
+        connectors = data.get("connectors", [])
+        self.document.emit(dict(data.get("metadata") or {}, journal_records=journal.records))
+        self.parsed.emit(len(shapes), len(connectors))
+        self.emit_chunks(shapes, normalize_packed_shape, self.shapes_ready)
+        self.emit_chunks(connectors, normalize_connector, self.connectors_ready)
+
+    def run_binary(self):
+        # rows come straight out of the mapped file, nothing is decoded
+        # until the chunk it belongs to is about to be sent
+        with SadbReader(self.path) as reader:
+            metadata = reader.value(reader.doc_off).get("metadata") or {}
+            journal = read_journal(self.path, snapshot_id_of({"metadata": metadata}))
+            metadata.update(journal.metadata)
+            shapes = LazyRows(reader.shape, reader.shape_count, journal.shapes)
+            connectors = LazyRows(reader.connector, reader.connector_count, journal.connectors)
+            self.document.emit(dict(metadata, journal_records=journal.records))
+            self.parsed.emit(len(shapes), len(connectors))
+            self.emit_chunks(shapes, normalize_packed_shape, self.shapes_ready)
+            self.emit_chunks(connectors, normalize_connector, self.connectors_ready)
+
+    def emit_chunks(self, records, normalize, signal):
+        for start in range(0, len(records), self.chunk_size):
+            if self.isInterruptionRequested():
+                return
+            chunk = []
+            for i, record in enumerate(records[start:start + self.chunk_size], start):
+                try:
+                    chunk.append((i, normalize(record)))
+                except Exception as e:
+                    self.logger.error(f"Skipping malformed record {i}: {e}")
+            signal.emit(chunk)
+
+
+class DiagramLoader(QObject):
+    """Builds scene items from parsed chunks in small timed batches so the
+    GUI keeps painting (and the user can cancel) while a big model loads"""
+    finished = pyqtSignal(list, list)  # loaded shapes, loaded connectors
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, main_window, path, build_shape, build_connector, batch_ms=LOAD_BATCH_MS, read=None):
+        super().__init__(main_window)
+        self.main_window = main_window
+        self.path = path
+        self.read = read
+        self.build_shape = build_shape
+        self.build_connector = build_connector
+        self.batch_ms = batch_ms
+        self.logger = getLogger("diagram_loader")
+
+        self.pending = deque()
+        self.document = {}
+        self.shapes = []
+        self.shapes_by_index = {}
+        self.shapes_by_id = {}
+        self.connectors = []
+        self.total = 0
+        self.done = 0
+        self.parsing_finished = False
+        self.active = False
+        self.disposed = False
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.process_batch)
+        self.progress = None
+        self.worker = None
+
+    def start(self):
+        self.active = True
+        self.progress = QProgressDialog("Loading diagram...", "Cancel", 0, 0, self.main_window)
+        self.progress.setWindowTitle("Loading")
+        self.progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress.setMinimumDuration(500)
+        self.progress.canceled.connect(self.cancel)
+
+        self.worker = DiagramParseWorker(self.path, read=self.read, parent=self)
+        self.worker.parsed.connect(self.on_parsed)
+        self.worker.document.connect(self.document.update)
+        self.worker.shapes_ready.connect(lambda chunk: self.queue("shape", chunk))
+        self.worker.connectors_ready.connect(lambda chunk: self.queue("connector", chunk))
+        self.worker.failed.connect(self.on_failed)
+        self.worker.finished.connect(self.on_parsing_finished)
+        self.worker.start()
+
+    def on_parsed(self, shape_count, connector_count):
+        self.total = shape_count + connector_count
+        self.progress.setMaximum(max(self.total, 1))
+        self.progress.setLabelText(f"Loading {shape_count} shapes and {connector_count} connectors...")
+
+    def queue(self, kind, chunk):
+        if not self.active:
+            return
+        self.pending.extend((kind, i, record) for i, record in chunk)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def on_parsing_finished(self):
+        self.parsing_finished = True
+        if self.disposed:
+            self.deleteLater()
+        elif self.active and not self.pending:
+            self.finish()
+
+    def process_batch(self):
+        # worker emits every shape chunk before any connector chunk, so by the
+        # time a connector is popped all the shapes it can reference exist
+        deadline = time.perf_counter() + self.batch_ms / 1000.0
+        while self.pending and time.perf_counter() < deadline:
+            kind, i, record = self.pending.popleft()
+            try:
+                if kind == "shape":
+                    shape = self.build_shape(record)
+                    self.shapes.append(shape)
+                    self.shapes_by_index[i] = shape
+                    if shape.element_id in self.shapes_by_id:
+                        self.logger.warning(f"Duplicate shape id {shape.element_id}, assigning a new one")
+                        shape.element_id = new_element_id()
+                    self.shapes_by_id[shape.element_id] = shape
+                else:
+                    conn = self.build_connector(record, self.shapes_by_index, self.shapes_by_id)
+                    if conn is not None:
+                        self.connectors.append(conn)
+            except Exception as e:
+                self.logger.error(f"Failed to load {kind} {i}: {e}")
+            self.done += 1
+        self.progress.setValue(min(self.done, self.progress.maximum()))
+        if not self.pending:
+            self.timer.stop()
+            if self.parsing_finished:
+                self.finish()
+
+    def finish(self):
+        if not self.active:
+            return
+        self.active = False
+        self.timer.stop()
+        self.progress.reset()
+        self.logger.info(f"Loaded {len(self.shapes)} shapes and {len(self.connectors)} connectors from {self.path}")
+        self.finished.emit(self.shapes, self.connectors)
+
+    def cancel(self):
+        if not self.active:
+            return
+        self.active = False
+        self.timer.stop()
+        self.pending.clear()
+        self.worker.requestInterruption()
+        self.logger.info(f"Loading of {self.path} cancelled by user")
+        self.cancelled.emit()
+
+    def on_failed(self, message):
+        if not self.active:
+            return
+        self.active = False
+        self.timer.stop()
+        self.progress.reset()
+        self.failed.emit(message)
+
+    def dispose(self):
+        """deleteLater once the load is over. A cancelled load's worker can still
+        be parsing, the loader (its parent) goes when the worker has stopped"""
+        self.disposed = True
+        if self.progress is not None:
+            self.progress.deleteLater() # parented to the window, not to us
+            self.progress = None
+        if self.worker is None or self.parsing_finished:
+            self.deleteLater()
@@ -0,0 +1,71 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from utils.diagram_io import encode_diagram, write_bytes_atomic
+from utils.diagram_journal import append_journal, discard_journal
+from utils.diagram_store import DiagramStore
+from errorLogging import getLogger
+
+
+class DiagramSaveWorker(QThread):
+    """Encodes and writes a snapshot taken on the GUI thread.
+
+    The job only holds plain python values, so the user can keep editing
+    while it runs. Snapshots go through a temp file + os.replace; journal
+    records are appended (a torn tail is dropped on read)."""
+    progress = pyqtSignal(int)  # percent
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, snapshot=None, journal=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.snapshot = snapshot  # full diagram data
+        self.journal = journal  # (snapshot_id, records, fresh)
+        self.logger = getLogger("diagram_saver")
+
+    def run(self):
+        try:
+            self.progress.emit(0)
+            if self.snapshot is not None:
+                payload = encode_diagram(self.path, self.snapshot)
+                self.progress.emit(30)
+                write_bytes_atomic(self.path, payload, self.report_write)
+                discard_journal(self.path)
+            else:
+                snapshot_id, records, fresh = self.journal
+                append_journal(self.path, snapshot_id, records, fresh=fresh)
+            self.progress.emit(100)
+        except Exception as e:
+            self.logger.error(f"Background save of {self.path} failed: {e}")
+            self.failed.emit(str(e))
+            return
+        self.saved.emit(self.path)
+
+    def report_write(self, written, total):
+        self.progress.emit(30 + int(70 * written / max(total, 1)))
+
+
+class DiagramStoreSaveWorker(QThread):
+    """Writes a snapshot into the diagram repository; same signals as
+    DiagramSaveWorker. The sqlite connection lives on this thread."""
+    progress = pyqtSignal(int)
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, store_path, name, snapshot, parent=None):
+        super().__init__(parent)
+        self.store_path = store_path
+        self.path = name
+        self.snapshot = snapshot
+        self.logger = getLogger("diagram_saver")
+
+    def run(self):
+        try:
+            self.progress.emit(0)
+            with DiagramStore(self.store_path) as store:
+                store.save_diagram(self.path, self.snapshot)
+            self.progress.emit(100)
+        except Exception as e:
+            self.logger.error(f"Saving {self.path} to {self.store_path} failed: {e}")
+            self.failed.emit(str(e))
+            return
+        self.saved.emit(self.path)
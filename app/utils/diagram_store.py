@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import STORE_PATH
+from utils.diagram_io import read_diagram, normalize_shape, normalize_connector, find_diagram_files, REPORT_SUFFIX
+from errorLogging import getLogger
+
+# SQLite diagram repository. Each diagram is stored as rows in shapes and
+# connectors, and every scalar metadata value of every shape is also
+# flattened into shape_fields (section, key, value) so questions like "which
+# diagrams have an internet facing datastore with Restricted data" are a
+# couple of index lookups instead of opening every file.
+#
+# Qt-free like diagram_io; one DiagramStore (connection) per thread.
+
+logger = getLogger("diagram_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagrams (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    saved_at TEXT NOT NULL,
+    shape_count INTEGER NOT NULL,
+    connector_count INTEGER NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shapes (
+    diagram_id INTEGER NOT NULL REFERENCES diagrams(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    element_id TEXT,
+    type TEXT,
+    x REAL, y REAL, width REAL, height REAL,
+    label TEXT,
+    color TEXT,
+    shape_category TEXT,
+    shape_subtype TEXT,
+    metadata TEXT,
+    PRIMARY KEY (diagram_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS connectors (
+    diagram_id INTEGER NOT NULL REFERENCES diagrams(id) ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    element_id TEXT,
+    start_id TEXT,
+    end_id TEXT,
+    start_idx INTEGER,
+    end_idx INTEGER,
+    type TEXT,
+    metadata TEXT,
+    PRIMARY KEY (diagram_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS shape_fields (
+    diagram_id INTEGER NOT NULL REFERENCES diagrams(id) ON DELETE CASCADE,
+    shape_idx INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS shapes_subtype ON shapes (shape_subtype, diagram_id);
+CREATE INDEX IF NOT EXISTS shapes_type ON shapes (type, diagram_id);
+CREATE INDEX IF NOT EXISTS shapes_element ON shapes (element_id);
+CREATE INDEX IF NOT EXISTS connectors_start ON connectors (diagram_id, start_id);
+CREATE INDEX IF NOT EXISTS connectors_end ON connectors (diagram_id, end_id);
+CREATE INDEX IF NOT EXISTS shape_fields_value ON shape_fields (section, key, value, diagram_id, shape_idx);
+CREATE INDEX IF NOT EXISTS shape_fields_shape ON shape_fields (diagram_id, shape_idx);
+"""
+FIELDS_VERSION = 1 # PRAGMA user_version, bumped when shape_fields rows change form
+
+
+def dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def flatten_metadata(metadata):
+    """(section, key, value) for every scalar in a shape's metadata; list
+    items get a row each, top level scalars have section ''"""
+    for name, value in metadata.items():
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield from field_values(name, key, item)
+        else:
+            yield from field_values("", name, value)
+
+
+def field_values(section, key, value):
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, (str, int, float)) or item is None:
+                yield section, key, stored_value(item)
+    elif isinstance(value, (str, int, float)) or value is None:
+        yield section, key, stored_value(value)
+
+
+def stored_value(value):
+    """Value as shape_fields holds it, bools as 'true'/'false' (sqlite would make them 0/1)"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def diagram_name(path):
+    """Name a diagram file is stored under, the whole file name so d.json and d.sadb don't replace each other"""
+    return os.path.basename(path)
+
+
+def parse_field(spec):
+    """'trust.network_zone=Internet' -> (('trust', 'network_zone'), ('Internet',)),
+    the value with every form the text can stand for: 'True' also matches a
+    stored true, '1' a stored 1 or true"""
+    path, sep, value = spec.partition("=")
+    if not sep:
+        raise ValueError(f"Expected section.key=value, got {spec!r}")
+    section, dot, key = path.rpartition(".")
+    values = [value]
+    if value.lower() in ("true", "false"):
+        values.append(value.lower())
+    else:
+        for number in (int, float):
+            try:
+                values.append(number(value))
+                break
+            except ValueError:
+                pass
+        if value in ("1", "0"):
+            values.append("true" if value == "1" else "false")
+    return (section, key), tuple(values)
+
+
+class DiagramStore:
+    """Connection to a diagram repository database"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL") # readers don't block a save
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.upgrade_fields()
+
+    def upgrade_fields(self):
+        """Rebuild shape_fields from the shapes' metadata if it was written by an older version"""
+        version, = self.conn.execute("PRAGMA user_version").fetchone()
+        if version >= FIELDS_VERSION:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM shape_fields")
+            field_rows = []
+            for diagram_id, idx, metadata in self.conn.execute("SELECT diagram_id, idx, metadata FROM shapes"):
+                field_rows.extend((diagram_id, idx, section, key, value)
+                                  for section, key, value in flatten_metadata(json.loads(metadata)))
+            self.conn.executemany("INSERT INTO shape_fields VALUES (?, ?, ?, ?, ?)", field_rows)
+            self.conn.execute(f"PRAGMA user_version = {FIELDS_VERSION}")
+
+    def close(self):
+        self.conn.execute("PRAGMA optimize") # keeps the planner's index stats current
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def save_diagram(self, name, data):
+        """Store diagram data (the dict a .json file holds), replacing any diagram of that name"""
+        shapes = data.get("shapes", [])
+        connectors = data.get("connectors", [])
+        with self.conn:
+            self.conn.execute("DELETE FROM diagrams WHERE name = ?", (name,))
+            diagram_id = self.conn.execute(
+                "INSERT INTO diagrams (name, saved_at, shape_count, connector_count, metadata) VALUES (?, ?, ?, ?, ?)",
+                (name, datetime.now().isoformat(), len(shapes), len(connectors), dumps(data.get("metadata") or {}))
+            ).lastrowid
+            shape_rows, field_rows = [], []
+            for i, record in enumerate(shapes):
+                shape = normalize_shape(record)
+                metadata = shape["metadata"] or {}
+                shape_rows.append((diagram_id, i, shape["id"], shape["type"], shape["x"], shape["y"],
+                                   shape["width"], shape["height"], shape["label"], shape["color"],
+                                   shape["shape_category"], shape["shape_subtype"], dumps(metadata)))
+                field_rows.extend((diagram_id, i, section, key, value)
+                                  for section, key, value in flatten_metadata(metadata))
+            self.conn.executemany("INSERT INTO shapes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", shape_rows)
+            self.conn.executemany("INSERT INTO shape_fields VALUES (?, ?, ?, ?, ?)", field_rows)
+            connector_rows = []
+            for i, record in enumerate(connectors):
+                conn = normalize_connector(record)
+                connector_rows.append((diagram_id, i, conn["id"], conn["start_id"], conn["end_id"],
+                                       conn["start"], conn["end"], conn["type"], dumps(conn["metadata"])))
+            self.conn.executemany("INSERT INTO connectors VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", connector_rows)
+        logger.info(f"Stored diagram {name!r}: {len(shapes)} shapes, {len(connectors)} connectors")
+        return diagram_id
+
+    def import_file(self, path, name=None):
+        name = name or diagram_name(path)
+        return self.save_diagram(name, read_diagram(path))
+
+    def load_diagram(self, name):
+        """Diagram data in the same shape read_diagram returns"""
+        row = self.conn.execute("SELECT id, metadata FROM diagrams WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise KeyError(f"No diagram named {name!r} in {self.path}")
+        diagram_id, metadata = row
+        shapes = []
+        for (element_id, type_, x, y, width, height, label, color, category, subtype,
+             shape_metadata) in self.conn.execute(
+                "SELECT element_id, type, x, y, width, height, label, color, shape_category, shape_subtype, metadata "
+                "FROM shapes WHERE diagram_id = ? ORDER BY idx", (diagram_id,)):
+            shapes.append({"id": element_id, "type": type_, "x": x, "y": y, "width": width, "height": height,
+                           "label": label, "color": color, "metadata": json.loads(shape_metadata),
+                           "shape_category": category, "shape_subtype": subtype})
+        connectors = []
+        for element_id, start_id, end_id, start_idx, end_idx, type_, conn_metadata in self.conn.execute(
+                "SELECT element_id, start_id, end_id, start_idx, end_idx, type, metadata "
+                "FROM connectors WHERE diagram_id = ? ORDER BY idx", (diagram_id,)):
+            conn = {"id": element_id}
+            if start_id is not None:
+                conn.update(start_id=start_id, end_id=end_id)
+            else:
+                conn.update(start=start_idx, end=end_idx)
+            conn.update(type=type_, metadata=json.loads(conn_metadata))
+            connectors.append(conn)
+        return {"shapes": shapes, "connectors": connectors, "metadata": json.loads(metadata)}
+
+    def delete_diagram(self, name):
+        with self.conn:
+            self.conn.execute("DELETE FROM diagrams WHERE name = ?", (name,))
+
+    def list_diagrams(self):
+        """(name, saved_at, shape_count, connector_count) for every stored diagram"""
+        return self.conn.execute(
+            "SELECT name, saved_at, shape_count, connector_count FROM diagrams ORDER BY name").fetchall()
+
+    def shape_query(self, select, shape_type=None, fields=None):
+        # one join per field criterion, each one an index seek on
+        # shape_fields_value; sqlite starts from whichever is most selective
+        sql = [f"SELECT {select} FROM shapes s JOIN diagrams d ON d.id = s.diagram_id"]
+        params = []
+        for n, ((section, key), value) in enumerate((fields or {}).items()):
+            values = [stored_value(v) for v in value] if isinstance(value, tuple) else [stored_value(value)]
+            sql.append(f"JOIN shape_fields f{n} ON f{n}.diagram_id = s.diagram_id AND f{n}.shape_idx = s.idx "
+                       f"AND f{n}.section = ? AND f{n}.key = ? AND f{n}.value IN ({', '.join('?' * len(values))})")
+            params += [section, key, *values]
+        if shape_type is not None:
+            sql.append("WHERE (s.shape_subtype = ? OR s.type = ?)")
+            params += [shape_type, shape_type]
+        return self.conn.execute(" ".join(sql), params)
+
+    def find_shapes(self, shape_type=None, fields=None):
+        """Shapes matching a type (subtype or type) and metadata values, as
+        (diagram name, element id, label) across all stored diagrams.
+
+        fields maps (section, key) to a value, or a tuple of values any of which matches, e.g.
+        {("trust", "network_zone"): "Internet", ("security", "encrypted"): True}"""
+        return self.shape_query("d.name, s.element_id, s.label", shape_type, fields).fetchall()
+
+    def find_diagrams(self, shape_type=None, fields=None):
+        """Names of diagrams containing at least one shape matching find_shapes criteria"""
+        rows = self.shape_query("DISTINCT d.name", shape_type, fields).fetchall()
+        return sorted(name for name, in rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import diagrams into and query an SADB diagram repository.")
+    parser.add_argument("--db", default=STORE_PATH, help=f"repository database (default: {STORE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_cmd = commands.add_parser("import", help="store diagram files (name = file name, extension included)")
+    import_cmd.add_argument("paths", nargs="+")
+    commands.add_parser("list", help="list stored diagrams")
+    query_cmd = commands.add_parser("query", help="diagrams with a shape matching all criteria")
+    query_cmd.add_argument("--type", dest="shape_type", help="shape subtype or type, e.g. datastore")
+    query_cmd.add_argument("--field", action="append", default=[], help="section.key=value, repeatable")
+    query_cmd.add_argument("--shapes", action="store_true", help="list the matching shapes, not just diagrams")
+    args = parser.parse_args(argv)
+
+    with DiagramStore(args.db) as store:
+        if args.command == "import":
+            imported = {} # name -> path, a second file of the same name would replace the first
+            for path in find_diagram_files(args.paths, exclude=(REPORT_SUFFIX,)):
+                name = diagram_name(path)
+                if name in imported:
+                    print(f"Skipped {path}: {imported[name]} was already imported as {name!r}", file=sys.stderr)
+                    continue
+                try:
+                    store.import_file(path, name)
+                    imported[name] = path
+                except Exception as e:
+                    print(f"Failed to import {path}: {e}", file=sys.stderr)
+        elif args.command == "list":
+            for name, saved_at, shape_count, connector_count in store.list_diagrams():
+                print(f"{name}\t{saved_at}\t{shape_count} shapes\t{connector_count} connectors")
+        else:
+            fields = dict(parse_field(spec) for spec in args.field)
+            if args.shapes:
+                for name, element_id, label in store.find_shapes(args.shape_type, fields):
+                    print(f"{name}\t{element_id}\t{label}")
+            else:
+                for name in store.find_diagrams(args.shape_type, fields):
+                    print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
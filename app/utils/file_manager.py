@@ -1,25 +1,53 @@
 import json
 import sys
 import os
-from PyQt6.QtWidgets import QFileDialog, QMessageBox
+import uuid
+from PyQt6.QtWidgets import QFileDialog, QMessageBox, QInputDialog
 from PyQt6.QtGui import QColor
-from config import SAVE_DIR
+from config import SAVE_DIR, JOURNAL_COMPACT_RECORDS, AUTOSAVE_FILE, STORE_PATH
 from models.shape_item import ShapeItem
 from models.connector_item import ConnectorItem
+from utils.diagram_loader import DiagramLoader
+from utils.diagram_io import DIAGRAM_FILE_FILTER, resolve_endpoints, snapshot_metadata
+from utils.diagram_saver import DiagramSaveWorker, DiagramStoreSaveWorker
+from utils.diagram_store import DiagramStore, diagram_name
+from utils.autosave import AutosaveManager
 from errorLogging import getLogger, FileOperationHandler, validate_file_path, gui_safe_execute
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from errorLogging import getLogger, FileOperationHandler, validate_file_path, gui_safe_execute, PerformanceMonitor, erorrHandler
 from datetime import datetime
 
 
+def read_stored_diagram(name):
+    # runs on the parse worker, which needs its own sqlite connection
+    with DiagramStore(STORE_PATH) as store:
+        return store.load_diagram(name)
+
+
 class FileManager:
     def __init__(self, main_window):
         self.main_window = main_window
         self.logger = getLogger("file_manager")
+        self.loader = None
+        self.current_path = None
+        self.snapshot_id = None
+        self.journal_records = 0
+        self.saved_shapes = []
+        self.saved_connectors = []
+        self.dirty_items = set()
+        self.save_worker = None
+        self.pending_save = None
+        self.autosave = AutosaveManager(main_window)
     @gui_safe_execute
     def save_diagram(self, *args, **kwargs): # savin'
+        if not self.current_path:
+            return self.save_diagram_as()
+        self.write_diagram_file(self.current_path)
+
+    @gui_safe_execute
+    def save_diagram_as(self, *args, **kwargs):
         self.logger.info("Starting diagram savin!")
-        path, _ = QFileDialog.getSaveFileName(self.main_window, "Save Diagram", SAVE_DIR, "JSON Files (*.json)")
+        path, _ = QFileDialog.getSaveFileName(self.main_window, "Save Diagram", SAVE_DIR, DIAGRAM_FILE_FILTER)
         if not path:
             self.logger.info("Cancelled!")
             return
@@ -29,163 +57,360 @@ class FileManager:
              self.logger.error(f"Invalid save path: {e}")
              QMessageBox.warning(self.main_window, "Invalid Path", str(e))
              return
-        
+        self.write_diagram_file(path, full=True)
+
+    def write_diagram_file(self, path, full=False):
+        if self.save_worker is not None:
+             # coalesce with the save in flight, the follow-up picks up the latest state
+             pending_full = self.pending_save[1] if self.pending_save else False
+             self.pending_save = (path, full or pending_full)
+             self.logger.debug(f"Save already running, queued follow-up save to {path}")
+             return
         with FileOperationHandler("save diagram", path):
-             with PerformanceMonitor("diagram serialization", self.logger):
-                  data = {
-                       "shapes": [],
-                       "connectors": [],
-                       "metadata": {
-                            "version": "1.0",
-                            "created_at": str(datetime.now()),
-                            "shape_count": len(self.main_window.shapes),
-                            "connectors_count": len(getattr(self.main_window, 'connectors', []))
-                       }
-                  }
-
-                  for i, shape in enumerate(self.main_window.shapes):
-                       try:
-                            rect = shape.sceneBoundingRect()
-                            shape_data = {
-                                 "type": getattr(shape, 'item_type', 'rect'),
-                                 "x": rect.x(),
-                                 "y": rect.y(),
-                                 "width":rect.width() ,
-                                 "height": rect.height(),
-                                 "label": getattr(shape,'label', ''),
-                                 "colour": shape.colour.name() if hasattr(shape, 'color') else '#ffffff',
-                                 "metadata": getattr(shape, 'metadata', {}),
-                                 "shape_category": getattr(shape, 'shape_category', ''),
-                                 "shape_subtype": getattr(shape, 'shape_subtype', ''),
-                            }
-                            data["shapes"].append(shape_data)
-                            self.logger.debug(f"Serialized shape {i}: {shape_data['type']}")
-                       except Exception as e:
-                            self.logger.error(f"Failed to serialize shape {i}: {e}")
-                            continue
-                  connectors = getattr(self.main_window, 'connectors', []) # something something cereal
-                  for i, conn in enumerate(self.main_window.connectors):
-                       try:
-                            start_idx = self.main_window.shapes.index(conn.start_shape)
-                            end_idx = self.main_window.shapes.index(conn.end_shape)
-                            data["connectors"].append({
-                                 "start": start_idx,
-                                 "end": end_idx,
-                                 "type": getattr(conn, 'connector_type', 'line'),
-                                 "metadata": getattr(conn, 'metadata', {})
-                            })
-                       except ValueError as e:
-                            self.logger.error(f"Failed to serialize connector {i}: shape not found in list")
-                            continue
-                       except Exception as e:
-                            self.logger.error(f"Failed to serialize connector {i}: {e}")
-                            continue
-        with open(path, "w", encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+             # only the snapshot is taken here; encoding and writing happen on the worker
+             with PerformanceMonitor("diagram snapshot", self.logger):
+                  if full or path != self.current_path or self.snapshot_id is None or self.needs_snapshot():
+                       worker = self.snapshot_job(path)
+                  else:
+                       worker = self.journal_job(path)
+             if worker is None:
+                  self.show_save_status("No changes to save", 3000)
+                  return
+             self.start_save_worker(worker)
+
+    def start_save_worker(self, worker):
+        self.save_worker = worker
+        worker.progress.connect(self.on_save_progress)
+        worker.saved.connect(self.on_save_finished)
+        worker.failed.connect(self.on_save_failed)
+        worker.finished.connect(lambda: self.on_save_worker_done(worker))
+        self.show_save_status(f"Saving {os.path.basename(worker.path)}...")
+        worker.start()
+
+    def on_save_progress(self, percent):
+        progress = getattr(self.main_window, 'save_progress', None)
+        if progress is not None:
+             progress.setVisible(True)
+             progress.setValue(percent)
+
+    def on_save_finished(self, path):
         self.logger.info(f"Diagram saved successfully to {path}")
-        QMessageBox.information(self.main_window, "Success", f"Diagram saved to {path}")  
+        self.show_save_status(f"Saved to {path}", 5000)
+        self.autosave.on_saved()
+
+    def on_save_failed(self, message):
+        # the dirty flags were cleared when the snapshot was taken, so make
+        # sure the next save rewrites everything
+        self.snapshot_id = None
+        self.show_save_status("Save failed", 5000)
+        QMessageBox.warning(self.main_window, "Save Failed", f"Could not save diagram:\n{message}")
+
+    def on_save_worker_done(self, worker):
+        if worker is not self.save_worker:
+             return # already handled by wait_for_save
+        progress = getattr(self.main_window, 'save_progress', None)
+        if progress is not None:
+             progress.setVisible(False)
+        self.save_worker.deleteLater()
+        self.save_worker = None
+        if self.pending_save is not None:
+             path, full = self.pending_save
+             self.pending_save = None
+             self.write_diagram_file(path, full)
+
+    def show_save_status(self, message, timeout=0):
+        if hasattr(self.main_window, 'statusBar'):
+             self.main_window.statusBar().showMessage(message, timeout)
+
+    def wait_for_save(self):
+        while self.save_worker is not None:
+             self.save_worker.wait()
+             self.on_save_worker_done(self.save_worker)
+
+    def mark_dirty(self, item):
+        self.dirty_items.add(item)
+        self.autosave.mark_dirty(item)
+
+    def needs_snapshot(self):
+        # anything other than edits and appends since the last save (deletes,
+        # reordering) can't be expressed as journal records
+        shapes = self.main_window.shapes
+        connectors = getattr(self.main_window, 'connectors', [])
+        if shapes[:len(self.saved_shapes)] != self.saved_shapes:
+             return True
+        if connectors[:len(self.saved_connectors)] != self.saved_connectors:
+             return True
+        return self.journal_records >= JOURNAL_COMPACT_RECORDS
+
+    def snapshot_job(self, path):
+        data = self.serialize_diagram()
+        snapshot_id = uuid.uuid4().hex
+        data["metadata"]["snapshot_id"] = snapshot_id
+        self.journal_records = 0
+        self.mark_saved(path, snapshot_id)
+        self.logger.debug(f"Snapshot of {len(data['shapes'])} shapes queued for {path}")
+        return DiagramSaveWorker(path, snapshot=data, parent=self.main_window)
+
+    def journal_job(self, path):
+        shapes = self.main_window.shapes
+        connectors = getattr(self.main_window, 'connectors', [])
+        shape_index = {shape: i for i, shape in enumerate(shapes)}
+        records = []
+        new_shapes = range(len(self.saved_shapes), len(shapes))
+        changed = sorted(i for i in (shape_index.get(item) for item in self.dirty_items) if i is not None)
+        for i in sorted(set(changed) | set(new_shapes)):
+             records.append({"op": "shape", "index": i, "data": self.serialize_shape(shapes[i])})
+        connector_index = {conn: i for i, conn in enumerate(connectors)}
+        new_connectors = range(len(self.saved_connectors), len(connectors))
+        changed = [i for i in (connector_index.get(item) for item in self.dirty_items) if i is not None]
+        for i in sorted(set(changed) | set(new_connectors)):
+             records.append({"op": "connector", "index": i, "data": self.serialize_connector(connectors[i], shape_index)})
+        if not records:
+             self.logger.debug("Nothing changed since last save")
+             return None
+        records.append({"op": "metadata", "data": {
+             "modified_at": str(datetime.now()),
+             "shape_count": len(shapes),
+             "connectors_count": len(connectors),
+        }})
+        fresh = self.journal_records == 0
+        self.journal_records += len(records)
+        touched = list(self.dirty_items) + shapes[len(self.saved_shapes):] + connectors[len(self.saved_connectors):]
+        self.mark_saved(path, self.snapshot_id, touched)
+        self.logger.debug(f"{len(records)} journal records queued for {path}")
+        return DiagramSaveWorker(path, journal=(self.snapshot_id, records, fresh), parent=self.main_window)
+
+    def mark_saved(self, path, snapshot_id, touched=None):
+        self.current_path = path
+        self.snapshot_id = snapshot_id
+        self.saved_shapes = list(self.main_window.shapes)
+        self.saved_connectors = list(getattr(self.main_window, 'connectors', []))
+        for item in (self.saved_shapes + self.saved_connectors) if touched is None else touched:
+             item.dirty = False
+        self.dirty_items.clear()
+
+    def serialize_diagram(self):
+        data = {
+             "shapes": [],
+             "connectors": [],
+             "metadata": {
+                  "version": "1.1",
+                  "created_at": str(datetime.now()),
+                  "shape_count": len(self.main_window.shapes),
+                  "connectors_count": len(getattr(self.main_window, 'connectors', []))
+             }
+        }
+
+        serialized = set()
+        for i, shape in enumerate(self.main_window.shapes):
+             try:
+                  shape_data = self.serialize_shape(shape)
+                  serialized.add(shape)
+                  data["shapes"].append(shape_data)
+                  self.logger.debug(f"Serialized shape {i}: {shape_data['type']}")
+             except Exception as e:
+                  self.logger.error(f"Failed to serialize shape {i}: {e}")
+                  continue
+        for i, conn in enumerate(getattr(self.main_window, 'connectors', [])): # something something cereal
+             try:
+                  data["connectors"].append(self.serialize_connector(conn, serialized))
+             except KeyError as e:
+                  self.logger.error(f"Failed to serialize connector {i}: shape not found in list")
+                  continue
+             except Exception as e:
+                  self.logger.error(f"Failed to serialize connector {i}: {e}")
+                  continue
+        return data
+
+    def serialize_shape(self, shape):
+        return {
+             "id": shape.element_id,
+             "type": getattr(shape, 'item_type', 'rect'),
+             "x": shape.pos().x(),
+             "y": shape.pos().y(),
+             "width": shape.w,
+             "height": shape.h,
+             "label": getattr(shape,'label', ''),
+             "color": shape.color.name() if hasattr(shape, 'color') else '#ffffff',
+             "metadata": shape.metadata_snapshot(),
+             "shape_category": getattr(shape, 'shape_category', ''),
+             "shape_subtype": getattr(shape, 'shape_subtype', ''),
+        }
+
+    def serialize_connector(self, conn, live_shapes):
+        # endpoints are written by id; live_shapes (any set/dict of the shapes
+        # being saved) only guards against dangling connectors
+        if conn.start_shape not in live_shapes or conn.end_shape not in live_shapes:
+             raise KeyError(conn.element_id)
+        return {
+             "id": conn.element_id,
+             "start_id": conn.start_shape.element_id,
+             "end_id": conn.end_shape.element_id,
+             "type": getattr(conn, 'connector_type', 'line'),
+             "metadata": snapshot_metadata(getattr(conn, 'metadata', {}))
+        }
+
     @gui_safe_execute
     def load_diagram(self, *args, **kwargs): #loadin'
         self.logger.info("Starting to load!")
         path, _=QFileDialog.getOpenFileName(
-             self.main_window, "Load Diagram", SAVE_DIR, "JSON Files (*.json)"
+             self.main_window, "Load Diagram", SAVE_DIR, DIAGRAM_FILE_FILTER
         )
         if not path:
              self.logger.info("Load operation cancelled by user")
              return
-        with FileOperationHandler("load diagram", path):
-             try:
-                  validate_file_path(path, "read")
-             except Exception as e:
-                  self.logger.error(f"Cannot read file: {e}")
-                  return
-             with PerformanceMonitor("diagram loading", self.logger):
-                  with erorrHandler("clearing existing diagram", self.logger):
-                       self.main_window.scene.clear()
-                       self.main_window.shapes.clear()
-                       if hasattr(self.main_window, 'connectors'):
-                            self.main_window.connectors.clear()
-                    
-                  try:
-                       with open(path, 'r', encoding='utf-8') as f:
-                         data=json.load(f)
-                  except json.JSONDecodeError as e:
-                       raise ValueError(f"Invalid JSON file: {e}")
-                  if not isinstance(data, dict):
-                       raise ValueError("Invalid file format: not a JSON object")
-
-                  if "shapes" not in data:
-                       raise ValueError ("Invalid file format: missing 'shapes' key")
-                  loaded_shapes = []
-                  for i, shape_data in enumerate(data["shapes"]):
-                       try: 
-                            width=shape_data.get("width", shape_data.get("w", 100))
-                            height=shape_data.get("height", shape_data.get("h", 60))
-                            shape=ShapeItem(
-                                 shape_data.get("type", "rect"),
-                                 shape_data["x"], shape_data["y"],
-                                 width, height
-                            )
-                            if "label" in shape_data:
-                                 shape.label = shape_data["label"]
-                            if "color" in shape_data:
-                                 shape.color = QColor(shape_data["color"])
-                            if "metadata" in shape_data:
-                                 shape.metadata = shape_data["metadata"]
-                            if "shape_category" in shape_data:
-                                 shape.shape_category = shape_data["shape_category"]
-                            if "shape_subtype" in shape_data:
-                                 shape.shape_subtype = shape_data["shape_subtype"]
-                            self.main_window.scene.addItem(shape)
-                            loaded_shapes.append(shape)
-                            self.logger.debug(f"Loaded shape {i}: {shape_data.get('type', 'rect')}")
-                       except Exception as e:
-                            self.logger.error(f"Failed to load shape {i}: {e}")
-                            continue
-                  self.main_window.shapes = loaded_shapes
-                  if "connectors" in data:
-                       loaded_connectors = []
-                       for i, conn_data in enumerate(data["connectors"]):
-                            try:
-                                 if isinstance(conn_data, list) and len(conn_data) >=2:
-                                      start_idx, end_idx = conn_data
-                                      conn_type = "line"
-                                      metadata = {}
-                                 else:
-                                      start_idx = conn_data["start"]
-                                      end_idx = conn_data["end"]
-                                      conn_type = conn_data.get("type", "line")
-                                      metadata = conn_data.get("metadata", {})
-                                 if 0 <= start_idx < len(loaded_shapes) and 0 <= end_idx < len(loaded_shapes):
-                                      conn = ConnectorItem(
-                                           loaded_shapes[start_idx],
-                                           loaded_shapes[end_idx],
-                                           conn_type
-                                      )
-                                      conn.metadata = metadata
-                                      self.main_window.scene.addItem(conn)
-                                      loaded_connectors.append(conn)
-                                      self.logger.debug(f"Loaded connector {i}")
-                                 else:
-                                      self.logger.warning(f"Connector {i} references invalid shape indices: {start_idx}, {end_idx}")
-                            except Exception as e:
-                                 self.logger.error(f"Failed to load connector {i}: {e}")
-                                 continue
-                            if not hasattr(self.main_window, 'connectors'):
-                                 self.main_window.connectors = []
-                            self.main_window.connectors = loaded_connectors
-
-                            if loaded_shapes and hasattr(self.main_window, 'update_metadata'):
-                                 self.main_window.update_metadata(None)
-                            self.logger.info(f"Diagram loaded successfully from {path}!")
-                            shapes_count = len(data.get("connectors", []))
-                            connectors_count = len(data.get("connectors", []))
-                            QMessageBox.information(
-                                 self.main_window,
-                                 "Success",
-                                 f"Diagram loaded from {os.path.basename(path)}\n"
-                                 f"Loaded {shapes_count} shapes and {connectors_count} connectors"
-                            )
+        try:
+             validate_file_path(path, "read")
+        except Exception as e:
+             self.logger.error(f"Cannot read file: {e}")
+             QMessageBox.warning(self.main_window, "Invalid Path", str(e))
+             return
+        self.load_diagram_file(path)
+
+    @gui_safe_execute
+    def recover_diagram(self, *args, **kwargs):
+        self.logger.info("Recovering autosaved diagram")
+        self.load_diagram_file(AUTOSAVE_FILE, source="recovery")
+
+    @gui_safe_execute
+    def save_to_store(self, *args, **kwargs):
+        default = diagram_name(self.current_path) if self.current_path else ""
+        name, ok = QInputDialog.getText(self.main_window, "Save to Repository", "Diagram name:", text=default)
+        if not ok or not name.strip():
+             return
+        self.wait_for_save() # one writer at a time
+        with PerformanceMonitor("diagram snapshot", self.logger):
+             data = self.serialize_diagram()
+        self.start_save_worker(DiagramStoreSaveWorker(STORE_PATH, name.strip(), data, parent=self.main_window))
+
+    @gui_safe_execute
+    def load_from_store(self, *args, **kwargs):
+        with DiagramStore(STORE_PATH) as store:
+             names = [name for name, *_ in store.list_diagrams()]
+        if not names:
+             QMessageBox.information(self.main_window, "Repository", "No diagrams stored yet")
+             return
+        name, ok = QInputDialog.getItem(self.main_window, "Load from Repository", "Diagram:", names, 0, False)
+        if ok:
+             self.load_diagram_file(name, source="store")
+
+    def query_store(self, shape_type=None, fields=None):
+        """Names of stored diagrams with a shape of shape_type whose metadata
+        matches fields ({(section, key): value}), see DiagramStore.find_diagrams"""
+        with DiagramStore(STORE_PATH) as store:
+             return store.find_diagrams(shape_type, fields)
+
+    def load_diagram_file(self, path, source="file"):
+        if self.loader is not None and self.loader.active:
+             self.loader.cancel()
+        with erorrHandler("clearing existing diagram", self.logger):
+             self.clear_diagram()
+        # parsing happens on a worker thread, items are added in timed batches
+        read = read_stored_diagram if source == "store" else None
+        loader = DiagramLoader(self.main_window, path, self.build_shape, self.build_connector, read=read)
+        loader.finished.connect(lambda shapes, connectors: self.on_load_finished(path, shapes, connectors, source))
+        loader.cancelled.connect(self.on_load_cancelled)
+        loader.failed.connect(lambda message: self.on_load_failed(path, message))
+        # connected last so the handlers above can still read self.loader
+        for signal in (loader.finished, loader.cancelled, loader.failed):
+             signal.connect(lambda *args: self.on_loader_done(loader))
+        self.loader = loader
+        loader.start()
+
+    def clear_diagram(self):
+        self.current_path = None
+        self.snapshot_id = None
+        self.journal_records = 0
+        self.saved_shapes = []
+        self.saved_connectors = []
+        self.dirty_items.clear()
+        self.main_window.connector_manager.clear()
+        self.main_window.scene.clear()
+        self.main_window.spatial_index.clear() # scene.clear() deletes items without telling them
+        self.main_window.shapes.clear()
+        if hasattr(self.main_window, 'connectors'):
+             self.main_window.connectors.clear()
+        self.autosave.reset(discard=False)
+
+    def build_shape(self, shape_data):
+        shape=ShapeItem(
+             shape_data["type"],
+             shape_data["x"], shape_data["y"],
+             shape_data["width"], shape_data["height"]
+        )
+        if shape_data["id"] is not None:
+             shape.element_id = shape_data["id"]
+        if shape_data["label"] is not None:
+             shape.label = shape_data["label"]
+        if shape_data["color"] is not None:
+             shape.color = QColor(shape_data["color"])
+        if shape_data.get("metadata_raw") is not None:
+             shape.set_packed_metadata(shape_data["metadata_raw"])
+        elif shape_data["metadata"] is not None:
+             shape.metadata = shape_data["metadata"]
+        if shape_data["shape_category"] is not None:
+             shape.shape_category = shape_data["shape_category"]
+        if shape_data["shape_subtype"] is not None:
+             shape.shape_subtype = shape_data["shape_subtype"]
+        self.main_window.scene.addItem(shape)
+        self.main_window.shapes.append(shape)
+        return shape
+
+    def build_connector(self, conn_data, shapes_by_index, shapes_by_id):
+        start, end = resolve_endpoints(conn_data, shapes_by_index, shapes_by_id)
+        if start is None or end is None:
+             self.logger.warning(f"Connector references unknown shapes: {conn_data}")
+             return None
+        conn = ConnectorItem(start, end, conn_data["type"])
+        if conn_data["id"] is not None:
+             conn.element_id = conn_data["id"]
+        conn.metadata = conn_data["metadata"]
+        conn.refresh_decorations() # label and data flow come from the metadata
+        self.main_window.scene.addItem(conn)
+        self.main_window.connectors.append(conn)
+        self.main_window.connector_manager.add_connector(conn) # so it follows its shapes when they move
+        return conn
+
+    def on_load_finished(self, path, shapes, connectors, source="file"):
+        if source == "recovery":
+             # saving goes back to the file the user was working on, and since
+             # that file is older than what we just loaded it gets rewritten in full
+             source_path = self.loader.document.get("source_path")
+             self.mark_saved(source_path, None)
+             self.autosave.reset(discard=False) # keep the recovery file until the next autosave replaces it
+             message = f"Recovered {len(shapes)} shapes and {len(connectors)} connectors"
+             if source_path:
+                  message += f"\nSave to write them back to {os.path.basename(source_path)}"
+        elif source == "store":
+             self.mark_saved(None, None) # not backed by a file, Save asks where to put it
+             self.autosave.reset()
+             message = (f"Diagram {path} loaded from the repository\n"
+                        f"Loaded {len(shapes)} shapes and {len(connectors)} connectors")
+        else:
+             # whatever came out of the file (journal included) is the saved state
+             self.journal_records = self.loader.document.get("journal_records", 0)
+             self.mark_saved(path, self.loader.document.get("snapshot_id"))
+             self.autosave.reset()
+             message = (f"Diagram loaded from {os.path.basename(path)}\n"
+                        f"Loaded {len(shapes)} shapes and {len(connectors)} connectors")
+        if hasattr(self.main_window, 'update_metadata'):
+             self.main_window.update_metadata(None)
+        self.logger.info(f"Diagram loaded successfully from {path}!")
+        QMessageBox.information(self.main_window, "Success", message)
+
+    def on_load_cancelled(self):
+        with erorrHandler("clearing partially loaded diagram", self.logger):
+             self.clear_diagram()
+
+    def on_load_failed(self, path, message):
+        self.logger.error(f"Failed to load diagram {path}: {message}")
+        QMessageBox.warning(self.main_window, "Load Failed", f"Could not load {os.path.basename(path)}:\n{message}")
+
+    def on_loader_done(self, loader):
+        if loader is self.loader:
+             self.loader = None
+        loader.dispose()
+
     def export_metadata_report(self, file_path):
           with FileOperationHandler("export metadata report", file_path):
                report_data = {
@@ -198,14 +423,14 @@ class FileManager:
           }
                for i, shape in enumerate(self.main_window.shapes):
                     shape_report = {
-                         "id": i,
+                         "id": shape.element_id,
                          "type": getattr(shape, 'item_type', 'unknown'),
                          "label": getattr(shape, 'label', ''),
                          "position": {
                               "x": shape.sceneBoundingRect().x(),
                               "y": shape.sceneBoundingRect().y(),
                          },
-                         "metadata": getattr(shape, 'metadata', {})
+                         "metadata": shape.read_metadata()
                     }
                     report_data["shapes"].append(shape_report)
                with open(file_path, 'w', encoding='utf-8') as f:
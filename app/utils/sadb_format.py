@@ -0,0 +1,361 @@
+import mmap
+import struct
+
+# .sadb binary diagram format
+#
+#   header     fixed size, see HEADER
+#   strings    u32 offsets[n + 1] followed by one utf-8 blob. Every string in
+#              the document (metadata keys, enum values, labels...) is stored
+#              once and referenced by index.
+#   shapes     fixed-width SHAPE rows, geometry as f64
+#   connectors fixed-width CONNECTOR rows (endpoint ids, or legacy indexes)
+#   values     tagged encoding of everything that isn't a fixed column
+#              (metadata dicts, unknown keys, the document metadata)
+#
+# Anything that doesn't fit a column ends up in the row's "extras" value, so
+# whatever json.load gave us comes back out of read_sadb unchanged.
+
+MAGIC = b"SADB"
+VERSION = 2 # 2: element ids, connectors by endpoint id
+
+HEADER = struct.Struct("<4sHHIIIQQQQQ")
+CONNECTOR_V1 = struct.Struct("<qqIIQQ")
+
+DOC_HAS_CONNECTORS = 1 << 0
+
+NO_STRING = 0xFFFFFFFF
+NO_VALUE = 0xFFFFFFFFFFFFFFFF
+
+# row flags
+RAW_RECORD = 1 << 0 # the whole record is the extras value
+PAIR_RECORD = 1 << 1 # connector stored as a [start, end] list
+NUM_PRESENT = 1 << 2 # + numeric field index
+NUM_IS_INT = 1 << 6 # + numeric field index
+HAS_METADATA = 1 << 10
+
+
+class RowLayout:
+    """Fixed-width row: f64 numeric columns, string-index columns, then
+    flags, metadata value offset and extras value offset"""
+
+    def __init__(self, num_fields, str_fields, key_order):
+        self.num_fields = num_fields
+        self.str_fields = str_fields
+        self.key_order = key_order # field order when rebuilding the dict
+        self.struct = struct.Struct("<" + "d" * len(num_fields) + "I" * len(str_fields) + "IQQ")
+        self.size = self.struct.size
+
+
+SHAPE = RowLayout(
+    ("x", "y", "width", "height"),
+    ("id", "type", "label", "color", "shape_category", "shape_subtype"),
+    ("id", "type", "x", "y", "width", "height", "label", "color", "metadata", "shape_category", "shape_subtype"),
+)
+CONNECTOR = RowLayout(
+    ("start", "end"),
+    ("id", "start_id", "end_id", "type"),
+    ("id", "start", "end", "start_id", "end_id", "type", "metadata"),
+)
+SHAPE_V1 = RowLayout(
+    ("x", "y", "width", "height"),
+    ("type", "label", "color", "shape_category", "shape_subtype"),
+    ("type", "x", "y", "width", "height", "label", "color", "metadata", "shape_category", "shape_subtype"),
+)
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_LIST, T_DICT, T_BIGINT = range(9)
+U8 = struct.Struct("<B")
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+
+
+def is_sadb_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = []
+        self.string_index = {}
+        self.values = bytearray()
+
+    def intern(self, text):
+        idx = self.string_index.get(text)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(text)
+            self.string_index[text] = idx
+        return idx
+
+    def add_value(self, value):
+        offset = len(self.values)
+        self.encode(value)
+        return offset
+
+    def encode(self, value):
+        out = self.values
+        if value is None:
+            out += U8.pack(T_NONE)
+        elif value is False:
+            out += U8.pack(T_FALSE)
+        elif value is True:
+            out += U8.pack(T_TRUE)
+        elif isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                out += U8.pack(T_INT) + I64.pack(value)
+            else:
+                out += U8.pack(T_BIGINT) + U32.pack(self.intern(str(value)))
+        elif isinstance(value, float):
+            out += U8.pack(T_FLOAT) + F64.pack(value)
+        elif isinstance(value, str):
+            out += U8.pack(T_STR) + U32.pack(self.intern(value))
+        elif isinstance(value, (list, tuple)):
+            out += U8.pack(T_LIST) + U32.pack(len(value))
+            for item in value:
+                self.encode(item)
+        elif isinstance(value, dict):
+            out += U8.pack(T_DICT) + U32.pack(len(value))
+            for key, item in value.items():
+                out += U32.pack(self.intern(str(key)))
+                self.encode(item)
+        else:
+            raise TypeError(f"Cannot store {type(value).__name__} in a .sadb file")
+
+    def row(self, layout, record):
+        if not isinstance(record, dict):
+            return self.raw_row(layout, record)
+        flags = 0
+        nums = []
+        for i, field in enumerate(layout.num_fields):
+            value = record.get(field)
+            if field in record and isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and (not isinstance(value, int) or abs(value) < (1 << 53)):
+                flags |= NUM_PRESENT << i
+                if isinstance(value, int):
+                    flags |= NUM_IS_INT << i
+                nums.append(float(value))
+            else:
+                nums.append(0.0)
+        strs = []
+        for field in layout.str_fields:
+            value = record.get(field)
+            strs.append(self.intern(value) if isinstance(value, str) else NO_STRING)
+        metadata = NO_VALUE
+        if "metadata" in record:
+            flags |= HAS_METADATA
+            metadata = self.add_value(record["metadata"])
+        extras = {}
+        for key, value in record.items():
+            if key == "metadata":
+                continue
+            if key in layout.num_fields and flags & (NUM_PRESENT << layout.num_fields.index(key)):
+                continue
+            if key in layout.str_fields and isinstance(value, str):
+                continue
+            extras[key] = value
+        extras_off = self.add_value(extras) if extras else NO_VALUE
+        return layout.struct.pack(*nums, *strs, flags, metadata, extras_off)
+
+    def raw_row(self, layout, record, flags=RAW_RECORD, nums=None):
+        nums = nums or [0.0] * len(layout.num_fields)
+        extras = self.add_value(record) if flags & RAW_RECORD else NO_VALUE
+        return layout.struct.pack(*nums, *[NO_STRING] * len(layout.str_fields), flags, NO_VALUE, extras)
+
+    def shape_row(self, shape):
+        return self.row(SHAPE, shape)
+
+    def connector_row(self, conn):
+        if isinstance(conn, list) and len(conn) == 2 and all(type(v) is int and abs(v) < (1 << 53) for v in conn):
+            return self.raw_row(CONNECTOR, conn, PAIR_RECORD, [float(v) for v in conn])
+        return self.row(CONNECTOR, conn)
+
+
+def encode_sadb(data):
+    """Encode diagram data (as produced for the JSON format) into .sadb bytes"""
+    enc = _Encoder()
+    shapes = data.get("shapes", [])
+    connectors = data.get("connectors", [])
+    shape_rows = b"".join(enc.shape_row(s) for s in shapes)
+    connector_rows = b"".join(enc.connector_row(c) for c in connectors)
+    doc = enc.add_value({k: v for k, v in data.items() if k not in ("shapes", "connectors")})
+
+    encoded = [s.encode('utf-8') for s in enc.strings]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+    string_section = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+
+    strings_off = HEADER.size
+    shapes_off = strings_off + len(string_section)
+    connectors_off = shapes_off + len(shape_rows)
+    values_off = connectors_off + len(connector_rows)
+    doc_flags = DOC_HAS_CONNECTORS if "connectors" in data else 0
+    header = HEADER.pack(MAGIC, VERSION, doc_flags, len(enc.strings), len(shapes), len(connectors),
+                         strings_off, shapes_off, connectors_off, values_off, doc)
+    return b"".join((header, string_section, shape_rows, connector_rows, bytes(enc.values)))
+
+
+def write_sadb(path, data):
+    payload = encode_sadb(data)
+    with open(path, 'wb') as f:
+        f.write(payload)
+
+
+class SadbReader:
+    """Memory-mapped view of a .sadb file; records are decoded on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Invalid .sadb file: empty file")
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError("Invalid .sadb file: truncated header")
+        (magic, self.version, self.doc_flags, self.string_count, self.shape_count, self.connector_count,
+         self.strings_off, self.shapes_off, self.connectors_off, self.values_off,
+         self.doc_off) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Invalid .sadb file: bad magic")
+        if self.version > VERSION:
+            self.close()
+            raise ValueError(f"Unsupported .sadb version {self.version}")
+        self._blob_off = self.strings_off + 4 * (self.string_count + 1)
+        self._strings = [None] * self.string_count
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def string(self, idx):
+        text = self._strings[idx]
+        if text is None:
+            start, end = struct.unpack_from("<II", self._map, self.strings_off + 4 * idx)
+            text = self._map[self._blob_off + start:self._blob_off + end].decode('utf-8')
+            self._strings[idx] = text
+        return text
+
+    def value(self, offset):
+        value, _ = self._decode(self.values_off + offset)
+        return value
+
+    def _decode(self, pos):
+        buf = self._map
+        tag = buf[pos]
+        pos += 1
+        if tag == T_NONE:
+            return None, pos
+        if tag == T_FALSE:
+            return False, pos
+        if tag == T_TRUE:
+            return True, pos
+        if tag == T_INT:
+            return I64.unpack_from(buf, pos)[0], pos + 8
+        if tag == T_FLOAT:
+            return F64.unpack_from(buf, pos)[0], pos + 8
+        if tag == T_STR:
+            return self.string(U32.unpack_from(buf, pos)[0]), pos + 4
+        if tag == T_BIGINT:
+            return int(self.string(U32.unpack_from(buf, pos)[0])), pos + 4
+        if tag == T_LIST:
+            count = U32.unpack_from(buf, pos)[0]
+            pos += 4
+            items = []
+            for _ in range(count):
+                item, pos = self._decode(pos)
+                items.append(item)
+            return items, pos
+        if tag == T_DICT:
+            count = U32.unpack_from(buf, pos)[0]
+            pos += 4
+            items = {}
+            for _ in range(count):
+                key = self.string(U32.unpack_from(buf, pos)[0])
+                items[key], pos = self._decode(pos + 4)
+            return items, pos
+        raise ValueError(f"Invalid .sadb file: unknown value tag {tag} at {pos - 1}")
+
+    def row(self, layout, offset):
+        row = layout.struct.unpack_from(self._map, offset)
+        n_num, n_str = len(layout.num_fields), len(layout.str_fields)
+        nums, strs = row[:n_num], row[n_num:n_num + n_str]
+        flags, metadata, extras = row[n_num + n_str:]
+        if flags & RAW_RECORD:
+            return self.value(extras)
+        if flags & PAIR_RECORD:
+            return [int(v) for v in nums]
+        fields = {}
+        for j, field in enumerate(layout.num_fields):
+            if flags & (NUM_PRESENT << j):
+                fields[field] = int(nums[j]) if flags & (NUM_IS_INT << j) else nums[j]
+        for field, idx in zip(layout.str_fields, strs):
+            if idx != NO_STRING:
+                fields[field] = self.string(idx)
+        if flags & HAS_METADATA:
+            fields["metadata"] = self.value(metadata)
+        if extras != NO_VALUE:
+            fields.update(self.value(extras))
+        # known columns first in their usual order (None values live in the
+        # extras), then whatever else the record carried
+        record = {key: fields.pop(key) for key in layout.key_order if key in fields}
+        record.update(fields)
+        return record
+
+    def shape(self, i):
+        layout = SHAPE if self.version >= 2 else SHAPE_V1
+        return self.row(layout, self.shapes_off + i * layout.size)
+
+    def connector(self, i):
+        if self.version >= 2:
+            return self.row(CONNECTOR, self.connectors_off + i * CONNECTOR.size)
+        start, end, type_idx, flags, metadata, extras = CONNECTOR_V1.unpack_from(
+            self._map, self.connectors_off + i * CONNECTOR_V1.size)
+        if flags & PAIR_RECORD:
+            return [start, end]
+        if flags & RAW_RECORD:
+            return self.value(extras)
+        conn = {"start": start, "end": end}
+        if type_idx != NO_STRING:
+            conn["type"] = self.string(type_idx)
+        if flags & HAS_METADATA:
+            conn["metadata"] = self.value(metadata)
+        if extras != NO_VALUE:
+            conn.update(self.value(extras))
+        return conn
+
+    def iter_shapes(self):
+        for i in range(self.shape_count):
+            yield self.shape(i)
+
+    def iter_connectors(self):
+        for i in range(self.connector_count):
+            yield self.connector(i)
+
+    def document(self):
+        data = {"shapes": list(self.iter_shapes())}
+        if self.doc_flags & DOC_HAS_CONNECTORS:
+            data["connectors"] = list(self.iter_connectors())
+        data.update(self.value(self.doc_off))
+        return data
+
+
+def read_sadb(path):
+    """Read a .sadb file into the same plain data json.load gives for .json"""
+    with SadbReader(path) as reader:
+        return reader.document()
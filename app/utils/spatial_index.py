@@ -0,0 +1,178 @@
+import math
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import SPATIAL_INDEX_CELL_SIZE
+
+# Uniform grid over item bounds in scene coordinates. Every item is listed in
+# each cell its bounds touch, so a click or a rubber band only looks at the
+# items in the cells it covers instead of every item in the scene.
+#
+# Qt-free, bounds are plain (left, top, right, bottom) floats. Items keep
+# their entry until removed, moving or resizing just re-inserts.
+#
+# The index also keeps the bounds of everything in it. Growing is a compare
+# per insert; when an item on the edge moves in or goes away the bounds are
+# rebuilt from the outermost occupied cells only, never from every item.
+
+
+class SpatialIndex:
+    def __init__(self, cell_size=SPATIAL_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> set of items
+        self.entries = {} # item -> (bounds, cell range)
+        self.order = {} # item -> insertion number, ties in stacking order go to the newest
+        self.counter = 0
+        self.extent = None # (left, top, right, bottom) of all items, None when empty
+        self.extent_stale = False
+        self.changed = None # called with no arguments when the bounds may have changed
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def cell_range(self, left, top, right, bottom):
+        size = self.cell_size
+        return (math.floor(left / size), math.floor(top / size),
+                math.floor(right / size), math.floor(bottom / size))
+
+    def insert(self, item, left, top, right, bottom):
+        """Add item, or move it if it's already indexed"""
+        cells = self.cell_range(left, top, right, bottom)
+        entry = self.entries.get(item)
+        bounds = (left, top, right, bottom)
+        if entry is not None:
+            self.shrink_from(entry[0], bounds)
+            self.grow_to(bounds)
+            if entry[1] == cells:
+                # still in the same cells, only the bounds changed
+                self.entries[item] = (bounds, cells)
+                return
+            self.unlink(item, entry[1])
+        else:
+            self.counter += 1
+            self.order[item] = self.counter
+            self.grow_to(bounds)
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(item)
+        self.entries[item] = (bounds, cells)
+
+    def remove(self, item):
+        entry = self.entries.pop(item, None)
+        if entry is None:
+            return
+        self.order.pop(item, None)
+        self.unlink(item, entry[1])
+        self.shrink_from(entry[0])
+
+    def unlink(self, item, cells):
+        x0, y0, x1, y1 = cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket is not None:
+                    bucket.discard(item)
+                    if not bucket:
+                        del self.cells[(cx, cy)]
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self.order.clear()
+        self.extent = None
+        self.extent_stale = False
+        self.notify()
+
+    def notify(self):
+        if self.changed is not None:
+            self.changed()
+
+    def grow_to(self, bounds):
+        if self.extent_stale:
+            return # rebuilt on the next bounds() anyway
+        if self.extent is None:
+            self.extent = bounds
+        else:
+            l, t, r, b = self.extent
+            if bounds[0] >= l and bounds[1] >= t and bounds[2] <= r and bounds[3] <= b:
+                return
+            self.extent = (min(l, bounds[0]), min(t, bounds[1]), max(r, bounds[2]), max(b, bounds[3]))
+        self.notify()
+
+    def shrink_from(self, bounds, replacement=None):
+        # an item leaving the edge might take the edge with it, unless it
+        # still reaches that edge from where it is now (dragging outwards)
+        if self.extent_stale or self.extent is None:
+            return
+        l, t, r, b = self.extent
+        new = replacement or (math.inf, math.inf, -math.inf, -math.inf)
+        if (bounds[0] <= l < new[0]) or (bounds[1] <= t < new[1]) or \
+                (bounds[2] >= r > new[2]) or (bounds[3] >= b > new[3]):
+            self.extent_stale = True
+            self.notify()
+
+    def bounds(self):
+        """(left, top, right, bottom) around every item, or None if empty"""
+        if self.extent_stale:
+            self.extent_stale = False
+            self.extent = self.edge_bounds()
+        return self.extent
+
+    def edge_bounds(self):
+        if not self.cells:
+            return None
+        xs = [cx for cx, cy in self.cells]
+        ys = [cy for cx, cy in self.cells]
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+        # the item with the smallest left starts in the leftmost occupied
+        # column and so on, so only the outermost cells need looking at
+        left = top = math.inf
+        right = bottom = -math.inf
+        edge_cells = [bucket for (cx, cy), bucket in self.cells.items()
+                      if cx == x0 or cy == y0 or cx == x1 or cy == y1]
+        for bucket in edge_cells:
+            for item in bucket:
+                l, t, r, b = self.entries[item][0]
+                left, top, right, bottom = min(left, l), min(top, t), max(right, r), max(bottom, b)
+        return (left, top, right, bottom)
+
+    def bounds_of(self, item):
+        """(left, top, right, bottom) an item was indexed with, None if it isn't"""
+        entry = self.entries.get(item)
+        return entry[0] if entry is not None else None
+
+    def query(self, left, top, right, bottom):
+        """Items whose bounds intersect the rect"""
+        x0, y0, x1, y1 = self.cell_range(left, top, right, bottom)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            # huge rect, walking the occupied cells is cheaper than the empty ones
+            buckets = [bucket for (cx, cy), bucket in self.cells.items()
+                       if x0 <= cx <= x1 and y0 <= cy <= y1]
+        else:
+            buckets = [self.cells[key] for key in
+                       ((cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1))
+                       if key in self.cells]
+        found = set()
+        for bucket in buckets:
+            found.update(bucket)
+        result = []
+        for item in found:
+            l, t, r, b = self.entries[item][0]
+            if l <= right and r >= left and t <= bottom and b >= top:
+                result.append(item)
+        return result
+
+    def query_point(self, x, y):
+        """Items whose bounds contain the point, newest first"""
+        size = self.cell_size
+        bucket = self.cells.get((math.floor(x / size), math.floor(y / size)), ())
+        hits = []
+        for item in bucket:
+            l, t, r, b = self.entries[item][0]
+            if l <= x <= r and t <= y <= b:
+                hits.append(item)
+        hits.sort(key=self.order.__getitem__, reverse=True)
+        return hits